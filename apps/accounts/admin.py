@@ -19,6 +19,7 @@ class UserAdmin(BaseUserAdmin):
         (_('Permissions'), {
             'fields': ('role', 'support_level', 'is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions'),
         }),
+        (_('Notifications'), {'fields': ('notification_mode', 'notification_interval')}),
         (_('Microsoft OAuth'), {'fields': ('microsoft_id', 'microsoft_token')}),
         (_('Important dates'), {'fields': ('last_login', 'created_at')}),
     )
@@ -60,6 +60,43 @@ class ProfileForm(forms.ModelForm):
         return email
 
 
+class NotificationPreferencesForm(forms.ModelForm):
+    """Form for the new-ticket notification preferences of agents"""
+
+    class Meta:
+        model = User
+        fields = ['notification_mode', 'notification_interval']
+        widgets = {
+            'notification_mode': forms.Select(attrs={'class': 'form-control'}),
+            'notification_interval': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 5,
+                'max': 240,
+            }),
+        }
+        labels = {
+            'notification_mode': 'Benachrichtigung bei neuen Tickets',
+            'notification_interval': 'Intervall in Minuten',
+        }
+        help_texts = {
+            'notification_interval': 'Nur für "Alle N Minuten": neue Tickets werden in diesem Abstand gesammelt versendet.',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['notification_mode'].choices = [
+            ('immediate', 'Sofort (eine Email pro Ticket)'),
+            ('interval', 'Alle N Minuten (Zusammenfassung)'),
+            ('hourly', 'Stündliche Zusammenfassung'),
+        ]
+
+    def clean_notification_interval(self):
+        interval = self.cleaned_data.get('notification_interval')
+        if interval is None or not 5 <= interval <= 240:
+            raise forms.ValidationError('Das Intervall muss zwischen 5 und 240 Minuten liegen.')
+        return interval
+
+
 class PasswordChangeForm(forms.Form):
     """Form for changing user password with current password validation"""
 
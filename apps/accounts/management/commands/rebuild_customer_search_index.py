@@ -0,0 +1,45 @@
+"""
+Rebuild the customer autocomplete tokens (apps.accounts.search).
+
+Only needed after bulk imports or raw updates that bypass User.save().
+
+Usage:
+    python manage.py rebuild_customer_search_index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.accounts.models import User, UserSearchToken
+from apps.accounts.search import user_tokens, invalidate_search_cache
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search tokens used by the customer autocomplete'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of tokens inserted per query (default: 5000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = 0
+        tokens = 0
+
+        with transaction.atomic():
+            UserSearchToken.objects.all().delete()
+
+            batch = []
+            for user in User.objects.values('id', 'first_name', 'last_name', 'email').iterator():
+                users += 1
+                for token in user_tokens(user['first_name'], user['last_name'], user['email']):
+                    batch.append(UserSearchToken(user_id=user['id'], token=token))
+                if len(batch) >= batch_size:
+                    UserSearchToken.objects.bulk_create(batch)
+                    tokens += len(batch)
+                    batch = []
+
+            UserSearchToken.objects.bulk_create(batch)
+            tokens += len(batch)
+
+        invalidate_search_cache()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {tokens} tokens for {users} users.'))
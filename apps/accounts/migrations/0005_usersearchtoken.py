@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from apps.accounts.search import user_tokens
+
+
+def build_search_tokens(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    UserSearchToken = apps.get_model('accounts', 'UserSearchToken')
+
+    batch = []
+    for user in User.objects.values('id', 'first_name', 'last_name', 'email').iterator():
+        for token in user_tokens(user['first_name'], user['last_name'], user['email']):
+            batch.append(UserSearchToken(user_id=user['id'], token=token))
+        if len(batch) >= 5000:
+            UserSearchToken.objects.bulk_create(batch)
+            batch = []
+    UserSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_merge_20251022_1153'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100, verbose_name='token')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'user search token',
+                'verbose_name_plural': 'user search tokens',
+                'indexes': [models.Index(fields=['token', 'user'], name='usersearchtoken_prefix_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchtoken',
+            constraint=models.UniqueConstraint(fields=('user', 'token'), name='usersearchtoken_unique'),
+        ),
+        migrations.RunPython(build_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_usersearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_interval',
+            field=models.PositiveSmallIntegerField(default=15, help_text='Digest window for the "every N minutes" mode', verbose_name='notification interval (minutes)'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='notification_mode',
+            field=models.CharField(choices=[('immediate', 'Immediately'), ('interval', 'Every N minutes'), ('hourly', 'Hourly digest')], default='immediate', max_length=20, verbose_name='notification mode'),
+        ),
+    ]
@@ -1,9 +1,16 @@
-from django.db import models
+import re
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+SYSTEM_USERNAME = 'system'
+SYSTEM_EMAIL = 'system@helpdesk.invalid'
+
+
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication"""
 
@@ -34,6 +41,81 @@ class UserManager(BaseUserManager):
 
         return self.create_user(email, username, password, **extra_fields)
 
+    def system_user(self):
+        """
+        The account automatic notes are attributed to (e.g. the ticket
+        classification). It is inactive and has no usable password, so it
+        can neither log in nor receive notifications.
+        """
+        user, created = self.get_or_create(username=SYSTEM_USERNAME, defaults={
+            'email': SYSTEM_EMAIL,
+            'first_name': 'Helpdesk',
+            'last_name': 'System',
+            'role': 'admin',
+            'is_active': False,
+        })
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        return user
+
+    @staticmethod
+    def _next_free(base, taken):
+        """Return base, or base1, base2, ... - the first value not in taken"""
+        if base not in taken:
+            return base
+        pattern = re.compile(rf'^{re.escape(base)}(\d+)$')
+        used = {int(match.group(1)) for match in map(pattern.match, taken) if match}
+        counter = 1
+        while counter in used:
+            counter += 1
+        return f'{base}{counter}'
+
+    def create_customer(self, first_name, last_name, email=None, password=None,
+                        max_attempts=5, **extra_fields):
+        """
+        Create a customer, generating a unique email/username if needed.
+
+        Without ``email`` the address ``first.last@example.com`` is used, with a
+        numeric suffix (``first.last1@...``) if taken. The username is the local
+        part of the email, suffixed the same way. All colliding usernames and
+        emails are fetched with one query and the next free suffix is computed
+        in memory. A concurrent insert of the same name (unique violation) is
+        resolved by recomputing and retrying.
+        """
+        extra_fields.setdefault('role', 'customer')
+        generate_email = not email
+        base_local = f'{first_name.lower()}.{last_name.lower()}'
+
+        for attempt in range(max_attempts):
+            if generate_email:
+                email_prefix = base_local
+            else:
+                email = self.normalize_email(email)
+                email_prefix = email.split('@')[0]
+
+            rows = self.filter(
+                Q(username__startswith=email_prefix) | Q(email__startswith=email_prefix)
+            ).values_list('username', 'email')
+            taken_usernames = {username for username, _ in rows}
+            taken_locals = {address.split('@')[0] for _, address in rows if address.endswith('@example.com')}
+
+            if generate_email:
+                email = f"{self._next_free(base_local, taken_locals)}@example.com"
+            username = self._next_free(email.split('@')[0], taken_usernames)
+
+            try:
+                with transaction.atomic():
+                    return self.create_user(email, username, password,
+                                            first_name=first_name, last_name=last_name,
+                                            **extra_fields)
+            except IntegrityError:
+                if not generate_email and self.filter(email=email).exists():
+                    # The given address was registered concurrently - nothing to generate
+                    raise
+                if attempt == max_attempts - 1:
+                    raise
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom user model with role-based access control"""
@@ -64,6 +146,18 @@ class User(AbstractBaseUser, PermissionsMixin):
                                        null=True, blank=True,
                                        help_text=_('Support level for agents (1-3). Only applicable for support_agent role.'))
 
+    # New-ticket email notifications (agents), see apps.tickets.digest
+    NOTIFICATION_MODE_CHOICES = [
+        ('immediate', _('Immediately')),
+        ('interval', _('Every N minutes')),
+        ('hourly', _('Hourly digest')),
+    ]
+    notification_mode = models.CharField(_('notification mode'), max_length=20,
+                                         choices=NOTIFICATION_MODE_CHOICES, default='immediate')
+    notification_interval = models.PositiveSmallIntegerField(
+        _('notification interval (minutes)'), default=15,
+        help_text=_('Digest window for the "every N minutes" mode'))
+
     # Microsoft OAuth2 integration
     microsoft_id = models.CharField(_('Microsoft ID'), max_length=100,
                                    unique=True, null=True, blank=True)
@@ -98,6 +192,26 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.username
 
+    # Fields that affect the customer autocomplete (see apps.accounts.search)
+    SEARCH_FIELDS = {'first_name', 'last_name', 'email', 'role', 'is_active'}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_FIELDS.intersection(update_fields):
+            from .search import rebuild_user_tokens
+            rebuild_user_tokens(self)
+
+    @property
+    def digest_minutes(self):
+        """Digest window in minutes, 0 for immediate notifications"""
+        if self.notification_mode == 'hourly':
+            return 60
+        if self.notification_mode == 'interval':
+            return max(self.notification_interval or 1, 1)
+        return 0
+
     @property
     def full_name(self):
         """Return the user's full name"""
@@ -182,3 +296,26 @@ class User(AbstractBaseUser, PermissionsMixin):
             data['microsoft_id'] = self.microsoft_id
 
         return data
+
+
+class UserSearchToken(models.Model):
+    """Normalized search token of a user for prefix autocomplete"""
+
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='search_tokens',
+                             verbose_name=_('user'))
+    token = models.CharField(_('token'), max_length=100)
+
+    class Meta:
+        verbose_name = _('user search token')
+        verbose_name_plural = _('user search tokens')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'token'], name='usersearchtoken_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['token', 'user'], name='usersearchtoken_prefix_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.token} ({self.user_id})'
@@ -0,0 +1,136 @@
+"""
+Prefix autocomplete for customers (agent ticket form).
+
+Every user gets a set of normalized search tokens (name parts, email and
+email local-part pieces) in ``UserSearchToken``. A query token matches by
+prefix using a plain B-tree range scan (``token >= 'mue' AND token < 'muf'``),
+which works with the default indexes on SQLite, MySQL and PostgreSQL -
+unlike the leading-wildcard ``icontains`` lookups it replaces.
+
+Repeated prefixes are answered from a short-lived cache that is invalidated
+whenever a user's tokens change.
+"""
+import hashlib
+import re
+import unicodedata
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+SEARCH_CACHE_PREFIX = 'customer_search'
+SEARCH_CACHE_TIMEOUT = 60  # seconds
+MAX_QUERY_TOKENS = 5
+TOKEN_MAX_LENGTH = 100
+
+# Stored name/email parts are split on punctuation, queries only on whitespace,
+# so "max.mu" and "anna@ex" still prefix-match the full email token
+_SPLIT_RE = re.compile(r'[\s._\-+@,;]+')
+_QUERY_SPLIT_RE = re.compile(r'[\s,;]+')
+
+
+def normalize(value):
+    """Lowercase and strip accents, so 'Müller' and 'muller' match"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return value.lower().replace('ß', 'ss').strip()
+
+
+def query_tokens(query):
+    """Split a search query into normalized tokens (longest first)"""
+    tokens = {token for token in _QUERY_SPLIT_RE.split(normalize(query)) if token}
+    return sorted(tokens, key=len, reverse=True)[:MAX_QUERY_TOKENS]
+
+
+def user_tokens(first_name, last_name, email):
+    """Return the set of search tokens for a user"""
+    tokens = set()
+    for value in (first_name, last_name):
+        tokens.update(token for token in _SPLIT_RE.split(normalize(value)) if token)
+
+    email = normalize(email)
+    if email:
+        tokens.add(email)
+        local_part, _, domain = email.partition('@')
+        tokens.update(token for token in _SPLIT_RE.split(local_part) if token)
+        if domain:
+            tokens.add(domain)
+
+    return {token[:TOKEN_MAX_LENGTH] for token in tokens}
+
+
+def _prefix_range(prefix):
+    """Return the half-open range [prefix, upper) covering all strings starting with prefix"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix_filter(prefix):
+    lower, upper = _prefix_range(prefix)
+    return {'token__gte': lower, 'token__lt': upper}
+
+
+def rebuild_user_tokens(user):
+    """Replace the stored search tokens of ``user``"""
+    from .models import UserSearchToken
+
+    tokens = user_tokens(user.first_name, user.last_name, user.email)
+    existing = set(UserSearchToken.objects.filter(user=user).values_list('token', flat=True))
+    if existing != tokens:
+        UserSearchToken.objects.filter(user=user).exclude(token__in=tokens).delete()
+        UserSearchToken.objects.bulk_create(
+            [UserSearchToken(user=user, token=token) for token in tokens - existing]
+        )
+
+    # Role or active state may have changed as well
+    invalidate_search_cache()
+
+
+def invalidate_search_cache():
+    """Invalidate all cached search results"""
+    try:
+        cache.incr(f'{SEARCH_CACHE_PREFIX}:version')
+    except ValueError:
+        cache.set(f'{SEARCH_CACHE_PREFIX}:version', 1, None)
+
+
+def _cache_key(tokens, limit):
+    version = cache.get_or_set(f'{SEARCH_CACHE_PREFIX}:version', 1, None)
+    digest = hashlib.md5(' '.join(sorted(tokens)).encode('utf-8')).hexdigest()
+    return f'{SEARCH_CACHE_PREFIX}:{version}:{limit}:{digest}'
+
+
+def search_customers(query, limit=10):
+    """
+    Return up to ``limit`` active customers matching all tokens of ``query`` by prefix.
+
+    Results are ``values()`` rows (id, first_name, last_name, email, phone),
+    most recently registered customers first.
+    """
+    from .models import User, UserSearchToken
+
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+
+    key = _cache_key(tokens, limit)
+    results = cache.get(key)
+    if results is not None:
+        return results
+
+    # The longest token is the most selective one and drives the lookup
+    customers = User.objects.filter(
+        role='customer',
+        is_active=True,
+        id__in=UserSearchToken.objects.filter(**_prefix_filter(tokens[0])).values('user_id'),
+    )
+    for token in tokens[1:]:
+        customers = customers.filter(Exists(
+            UserSearchToken.objects.filter(user_id=OuterRef('pk'), **_prefix_filter(token))
+        ))
+
+    results = list(
+        customers
+        .order_by('-created_at')
+        .values('id', 'first_name', 'last_name', 'email', 'phone')[:limit]
+    )
+    cache.set(key, results, SEARCH_CACHE_TIMEOUT)
+    return results
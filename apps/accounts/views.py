@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.views.decorators.http import require_http_methods
 from .models import User
-from .forms import ProfileForm, PasswordChangeForm as ProfilePasswordChangeForm
+from .forms import ProfileForm, NotificationPreferencesForm, PasswordChangeForm as ProfilePasswordChangeForm
 
 
 def register(request):
@@ -69,10 +69,13 @@ def register(request):
 @login_required
 def profile_edit(request):
     """
-    User profile edit view - allows users to change their personal data and password
+    User profile edit view - allows users to change their personal data, password
+    and (agents) notification preferences
     """
+    notification_form = NotificationPreferencesForm(instance=request.user)
+
     if request.method == 'POST':
-        action = request.POST.get('action')  # 'profile' or 'password'
+        action = request.POST.get('action')  # 'profile', 'password' or 'notifications'
 
         if action == 'profile':
             # Handle profile updates
@@ -107,6 +110,24 @@ def profile_edit(request):
                 for field, errors in password_form.errors.items():
                     for error in errors:
                         messages.error(request, f'{field}: {error}')
+
+        elif action == 'notifications' and request.user.role in ['support_agent', 'admin']:
+            # Handle notification preferences
+            profile_form = ProfileForm(instance=request.user)
+            password_form = ProfilePasswordChangeForm(request.user)
+            notification_form = NotificationPreferencesForm(request.POST, instance=request.user)
+
+            if notification_form.is_valid():
+                notification_form.save()
+                messages.success(request, 'Ihre Benachrichtigungseinstellungen wurden gespeichert!')
+                return redirect('accounts:profile_edit')
+            else:
+                for field, errors in notification_form.errors.items():
+                    for error in errors:
+                        messages.error(request, f'{field}: {error}')
+        else:
+            profile_form = ProfileForm(instance=request.user)
+            password_form = ProfilePasswordChangeForm(request.user)
     else:
         profile_form = ProfileForm(instance=request.user)
         password_form = ProfilePasswordChangeForm(request.user)
@@ -114,6 +135,7 @@ def profile_edit(request):
     context = {
         'profile_form': profile_form,
         'password_form': password_form,
+        'notification_form': notification_form,
         'user': request.user,
     }
     return render(request, 'accounts/profile_edit.html', context)
@@ -9,7 +9,6 @@ class KnowledgeArticleAdmin(admin.ModelAdmin):
                    'is_featured', 'views', 'published_at']
     list_filter = ['status', 'is_public', 'is_featured', 'category', 'published_at']
     search_fields = ['title', 'content', 'keywords']
-    prepopulated_fields = {'slug': ('title',)}
     date_hierarchy = 'published_at'
 
     fieldsets = (
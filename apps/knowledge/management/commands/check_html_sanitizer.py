@@ -0,0 +1,75 @@
+"""
+Check the article HTML sanitizer against known XSS payloads.
+
+Every payload is run through ``sanitize_html()``; the output must not contain
+a script, an event handler or any of the payload URLs (all of them unsafe).
+Harmless markup must survive unchanged.
+
+Usage:
+    python manage.py check_html_sanitizer
+"""
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.knowledge.text import sanitize_html
+
+PAYLOADS = [
+    '<script>alert(1)</script>',
+    '<img alt="x" onerror="alert(1)">',
+    '<a href="javascript:alert(1)">x</a>',
+    '<a href="JaVaScRiPt:alert(1)">x</a>',
+    '<a href=" javascript:alert(1)">x</a>',
+    '<a href="java&#9;script:alert(1)">x</a>',
+    '<a href="java&#10;script:alert(1)">x</a>',
+    '<a href="java&#13;script:alert(1)">x</a>',
+    '<a href="java&#0;script:alert(1)">x</a>',
+    '<a href="&#1;javascript:alert(1)">x</a>',
+    '<a href="javascript&colon;alert(1)">x</a>',
+    '<a href="&#106;&#97;&#118;&#97;&#115;&#99;&#114;&#105;&#112;&#116;&#58;alert(1)">x</a>',
+    '<a href="vbscript:msgbox(1)">x</a>',
+    '<a href="data:text/html;base64,PHNjcmlwdD5hbGVydCgxKTwvc2NyaXB0Pg==">x</a>',
+    '<img src="data:image/svg+xml,<svg onload=alert(1)>">',
+    '<a href="javas\tcript:alert(1)">x</a>',
+    '<p style="background:url(javascript:alert(1))">x</p>',
+    '<svg><script>alert(1)</script></svg>',
+    '<iframe src="https://example.com"></iframe>',
+]
+
+SAFE = [
+    '<a href="https://example.com/a?b=c#d">x</a>',
+    '<a href="mailto:support@example.com">x</a>',
+    '<a href="/knowledge/1/">x</a>',
+    '<a href="anleitung.html?time=10:30">x</a>',
+    '<a href="#abschnitt">x</a>',
+]
+
+# None of the payload URLs is safe, so any href/src left over is a failure
+_UNSAFE_RE = re.compile(r'<script|<iframe|\son\w+=|\s(href|src)=|url\(', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = 'Check that the article HTML sanitizer removes known XSS payloads'
+
+    def handle(self, *args, **options):
+        self.failed = False
+
+        for payload in PAYLOADS:
+            self._check(f'Blocked: {payload}', lambda: not _UNSAFE_RE.search(sanitize_html(payload)))
+        for html in SAFE:
+            self._check(f'Kept: {html}', lambda: sanitize_html(html) == html)
+
+        if self.failed:
+            raise CommandError('Sanitizer checks failed')
+
+    def _check(self, name, func):
+        try:
+            ok = func()
+        except Exception as e:
+            ok = False
+            name = f'{name} ({e.__class__.__name__}: {e})'
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f'PASS  {name}'))
+        else:
+            self.failed = True
+            self.stdout.write(self.style.ERROR(f'FAIL  {name}'))
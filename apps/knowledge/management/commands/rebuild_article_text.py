@@ -0,0 +1,51 @@
+"""
+Recompute the derived text fields of knowledge articles.
+
+Sanitized HTML, plain text and search text are generated on save; run this
+after bulk imports/raw updates or when the processing rules in
+apps.knowledge.text change. Only changed articles are written; their
+updated_at is bumped so cached article bodies and ETags are renewed.
+
+Usage:
+    python manage.py rebuild_article_text
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.knowledge.models import KnowledgeArticle
+
+
+class Command(BaseCommand):
+    help = 'Recompute sanitized HTML, plain text and search text of all knowledge articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of articles updated per query (default: 200)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        derived = ['content_sanitized', 'content_text', 'search_text']
+        # updated_at is the key of the cached article body and of the ETag:
+        # bump it, or the old HTML would keep being served
+        fields = derived + ['updated_at']
+        batch = []
+        checked = changed = 0
+
+        articles = KnowledgeArticle.objects.only('id', 'title', 'excerpt', 'keywords', 'content', *derived)
+        for article in articles.iterator():
+            checked += 1
+            before = [getattr(article, field) for field in derived]
+            article.update_derived_text()
+            if [getattr(article, field) for field in derived] == before:
+                continue
+            article.updated_at = timezone.now()
+            batch.append(article)
+            if len(batch) >= batch_size:
+                KnowledgeArticle.objects.bulk_update(batch, fields)
+                changed += len(batch)
+                batch = []
+
+        KnowledgeArticle.objects.bulk_update(batch, fields)
+        changed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {checked} articles, {changed} changed.'))
@@ -0,0 +1,28 @@
+"""
+Recompute the related-articles graph (apps.knowledge.related).
+
+Saving an article updates its neighbour lists; run this after imports
+or periodically (e.g. nightly via cron/Celery beat).
+
+Usage:
+    python manage.py rebuild_related_articles --top-n 10
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.knowledge.related import rebuild_related_articles, TOP_N
+
+
+class Command(BaseCommand):
+    help = 'Recompute the TF-IDF based related articles for all published knowledge articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=TOP_N,
+                            help=f'Number of neighbours stored per article (default: {TOP_N})')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_related_articles(top_n=options['top_n'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Related articles computed for {count} articles in {elapsed:.2f}s.'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0003_alter_knowledgearticle_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='similarity score')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='computed at')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='knowledge.knowledgearticle', verbose_name='article')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledge.knowledgearticle', verbose_name='related article')),
+            ],
+            options={
+                'verbose_name': 'related article',
+                'verbose_name_plural': 'related articles',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['article', '-score'], name='relatedarticle_lookup_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedarticle',
+            constraint=models.UniqueConstraint(fields=('article', 'related'), name='relatedarticle_unique'),
+        ),
+    ]
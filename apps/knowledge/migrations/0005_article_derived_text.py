@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:32
+
+from django.db import migrations, models
+
+from apps.knowledge.text import process_content, search_text
+
+
+def build_derived_text(apps, schema_editor):
+    KnowledgeArticle = apps.get_model('knowledge', 'KnowledgeArticle')
+
+    for article in KnowledgeArticle.objects.all().iterator():
+        article.content_sanitized, article.content_text = process_content(article.content)
+        article.search_text = search_text(article.title, article.excerpt, article.keywords, article.content_text)
+        article.save(update_fields=['content_sanitized', 'content_text', 'search_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0004_relatedarticle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgearticle',
+            name='content_sanitized',
+            field=models.TextField(blank=True, editable=False, verbose_name='sanitized content'),
+        ),
+        migrations.AddField(
+            model_name='knowledgearticle',
+            name='content_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='plain text content'),
+        ),
+        migrations.AddField(
+            model_name='knowledgearticle',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='search text'),
+        ),
+        migrations.RunPython(build_derived_text, migrations.RunPython.noop),
+    ]
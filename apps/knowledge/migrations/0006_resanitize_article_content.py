@@ -0,0 +1,29 @@
+# Re-sanitize stored article HTML: URLs with control characters or whitespace
+# inside the scheme ("java&#9;script:") passed the previous sanitizer
+
+from django.db import migrations
+from django.utils import timezone
+
+from apps.knowledge.text import process_content
+
+
+def resanitize(apps, schema_editor):
+    KnowledgeArticle = apps.get_model('knowledge', 'KnowledgeArticle')
+
+    for pk, content, sanitized in KnowledgeArticle.objects.values_list('pk', 'content', 'content_sanitized').iterator():
+        content_sanitized, _ = process_content(content)
+        if content_sanitized != sanitized:
+            # updated_at renews the cached article body and the ETag
+            KnowledgeArticle.objects.filter(pk=pk).update(content_sanitized=content_sanitized,
+                                                          updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0005_article_derived_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(resanitize, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+import re
+
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.utils.text import slugify
+from django.utils.text import slugify, Truncator
 
 
 class KnowledgeArticle(models.Model):
@@ -17,6 +19,11 @@ class KnowledgeArticle(models.Model):
     title = models.CharField(_('title'), max_length=200, db_index=True)
     slug = models.SlugField(_('slug'), max_length=220, unique=True, blank=True)
     content = models.TextField(_('content'))
+
+    # Derived from content on save (see apps.knowledge.text)
+    content_sanitized = models.TextField(_('sanitized content'), blank=True, editable=False)
+    content_text = models.TextField(_('plain text content'), blank=True, editable=False)
+    search_text = models.TextField(_('search text'), blank=True, editable=False)
     excerpt = models.TextField(_('excerpt'), blank=True,
                               help_text='Short summary of the article')
 
@@ -63,22 +70,97 @@ class KnowledgeArticle(models.Model):
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            self.slug = base_slug
+    @classmethod
+    def allocate_slug(cls, title, exclude_pk=None):
+        """
+        Return a unique slug for ``title`` using a single query.
+
+        All existing ``<base>`` / ``<base>-<n>`` slugs are fetched at once and
+        the lowest free counter is picked in memory.
+        """
+        base_slug = slugify(title)[:200] or 'artikel'
+
+        existing = cls.objects.filter(slug__startswith=base_slug)
+        if exclude_pk:
+            existing = existing.exclude(pk=exclude_pk)
+        taken = set(existing.values_list('slug', flat=True))
+
+        if base_slug not in taken:
+            return base_slug
 
-            # Ensure slug is unique by appending counter if needed
-            counter = 1
-            while KnowledgeArticle.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-                self.slug = f"{base_slug}-{counter}"
-                counter += 1
+        pattern = re.compile(rf'^{re.escape(base_slug)}-(\d+)$')
+        used = {int(match.group(1)) for match in map(pattern.match, taken) if match}
+        counter = 1
+        while counter in used:
+            counter += 1
+        return f"{base_slug}-{counter}"
+
+    # Fields that feed the related-articles graph (see apps.knowledge.related)
+    SIMILARITY_FIELDS = {'title', 'content', 'keywords', 'status'}
+
+    # Fields the derived text representations are built from
+    TEXT_FIELDS = {'title', 'content', 'excerpt', 'keywords'}
+
+    # Fields that invalidate cached AI answers built from this article (see apps.tickets.ai_cache)
+    AI_CACHE_FIELDS = TEXT_FIELDS | {'status', 'is_public'}
+
+    def update_derived_text(self):
+        """Compute sanitized HTML, plain text and search text from content"""
+        from .text import process_content, search_text
+
+        self.content_sanitized, self.content_text = process_content(self.content)
+        self.search_text = search_text(self.title, self.excerpt, self.keywords, self.content_text)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.TEXT_FIELDS.intersection(update_fields):
+            self.update_derived_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'content_sanitized', 'content_text', 'search_text'}
 
         # Set published_at when status changes to published
         if self.status == 'published' and not self.published_at:
             self.published_at = timezone.now()
 
-        super().save(*args, **kwargs)
+        if self.slug:
+            super().save(*args, **kwargs)
+        else:
+            self._save_with_unique_slug(*args, **kwargs)
+
+        if update_fields is None or self.SIMILARITY_FIELDS.intersection(update_fields):
+            from .related import schedule_update
+            schedule_update(self.pk)
+
+        if update_fields is None or self.AI_CACHE_FIELDS.intersection(update_fields):
+            from apps.tickets.ai_cache import invalidate_article
+            invalidate_article(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from apps.tickets.ai_cache import invalidate_article
+        invalidate_article(self.pk)
+        return super().delete(*args, **kwargs)
+
+    def _save_with_unique_slug(self, *args, **kwargs):
+        # Allocate a unique slug; a concurrent save of the same title hits the
+        # unique constraint and simply gets the next free counter
+        attempts = 5
+        for attempt in range(attempts):
+            self.slug = self.allocate_slug(self.title, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+                self.slug = ''
+
+    @property
+    def snippet(self):
+        """Excerpt, or the beginning of the plain text content if no excerpt was written"""
+        if self.excerpt:
+            return self.excerpt
+        return Truncator(self.content_text).words(40)
 
     @property
     def helpfulness_ratio(self):
@@ -90,16 +172,18 @@ class KnowledgeArticle(models.Model):
 
     def increment_views(self):
         """Increment view counter"""
+        # Atomic UPDATE that leaves updated_at (cache/ETag key) untouched
+        KnowledgeArticle.objects.filter(pk=self.pk).update(views=models.F('views') + 1)
         self.views += 1
-        self.save(update_fields=['views'])
 
     def vote_helpful(self, helpful=True):
         """Record a helpfulness vote"""
         if helpful:
+            KnowledgeArticle.objects.filter(pk=self.pk).update(helpful_count=models.F('helpful_count') + 1)
             self.helpful_count += 1
         else:
+            KnowledgeArticle.objects.filter(pk=self.pk).update(not_helpful_count=models.F('not_helpful_count') + 1)
             self.not_helpful_count += 1
-        self.save(update_fields=['helpful_count', 'not_helpful_count'])
 
     def to_dict(self, include_content=False):
         """Convert article to dictionary"""
@@ -126,3 +210,32 @@ class KnowledgeArticle(models.Model):
             data['keywords'] = self.keywords
 
         return data
+
+
+class RelatedArticle(models.Model):
+    """Precomputed content similarity between two knowledge articles"""
+
+    article = models.ForeignKey(KnowledgeArticle,
+                                on_delete=models.CASCADE,
+                                related_name='related_links',
+                                verbose_name=_('article'))
+    related = models.ForeignKey(KnowledgeArticle,
+                                on_delete=models.CASCADE,
+                                related_name='+',
+                                verbose_name=_('related article'))
+    score = models.FloatField(_('similarity score'))
+    computed_at = models.DateTimeField(_('computed at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('related article')
+        verbose_name_plural = _('related articles')
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'related'], name='relatedarticle_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['article', '-score'], name='relatedarticle_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.article_id} -> {self.related_id} ({self.score:.2f})'
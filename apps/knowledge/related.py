@@ -0,0 +1,228 @@
+"""
+Related-articles engine for the knowledge base.
+
+Published articles are turned into TF-IDF vectors (title and keywords weighted
+higher than the body) and compared by cosine similarity with NumPy. The top-N
+neighbours of every article are stored in ``RelatedArticle`` so that
+``kb_detail`` only needs one indexed lookup.
+
+- ``rebuild_related_articles()`` recomputes the whole graph (batch job,
+  ``manage.py rebuild_related_articles``)
+- ``update_related_articles(article_id)`` is called after an article changed.
+  It rebuilds the full TF-IDF matrix of all published articles (the same
+  cost as a rebuild); only the stored neighbour lists it writes are limited
+  to those affected by that article. ``schedule_update`` runs it after the
+  commit, in a Celery worker with ``RELATED_ARTICLES_ASYNC``.
+"""
+import logging
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+
+from .models import KnowledgeArticle, RelatedArticle
+
+logger = logging.getLogger(__name__)
+
+TOP_N = 10
+MIN_SCORE = 0.05
+MAX_FEATURES = 5000
+TITLE_WEIGHT = 3
+KEYWORD_WEIGHT = 2
+CHUNK_SIZE = 512
+
+STOPWORDS = {
+    'aber', 'als', 'am', 'an', 'auch', 'auf', 'aus', 'bei', 'bin', 'bis', 'bitte', 'da', 'damit',
+    'dann', 'das', 'dass', 'dem', 'den', 'der', 'des', 'die', 'dies', 'diese', 'dieser', 'doch',
+    'du', 'durch', 'ein', 'eine', 'einem', 'einen', 'einer', 'es', 'für', 'hat', 'haben', 'ich',
+    'ihr', 'ihre', 'im', 'in', 'ist', 'ja', 'kann', 'können', 'man', 'mit', 'nach', 'nicht',
+    'noch', 'nur', 'oder', 'sich', 'sie', 'sind', 'so', 'und', 'uns', 'unter', 'vom', 'von',
+    'vor', 'wenn', 'wie', 'wir', 'wird', 'zu', 'zum', 'zur',
+    'the', 'and', 'for', 'you', 'your', 'with', 'this', 'that', 'are', 'from', 'not',
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, numbers and one-letter words"""
+    return [
+        token for token in _TOKEN_RE.findall((text or '').lower())
+        if len(token) > 1 and not token.isdigit() and token not in STOPWORDS
+    ]
+
+
+def article_terms(title, keywords, content_text):
+    """Term counts of an article, title and keywords weighted higher than the body"""
+    terms = Counter(tokenize(content_text))
+    for token in tokenize(title):
+        terms[token] += TITLE_WEIGHT
+    for token in tokenize((keywords or '').replace(',', ' ')):
+        terms[token] += KEYWORD_WEIGHT
+    return terms
+
+
+def build_tfidf_matrix(documents, max_features=MAX_FEATURES):
+    """
+    Build an L2-normalized TF-IDF matrix (documents x terms) from term counters.
+
+    Only the ``max_features`` terms with the highest document frequency are
+    kept (terms occurring in a single document cannot relate two articles).
+    """
+    document_frequency = Counter()
+    for terms in documents:
+        document_frequency.update(terms.keys())
+
+    vocabulary = [term for term, df in document_frequency.most_common(max_features) if df > 1]
+    index = {term: i for i, term in enumerate(vocabulary)}
+
+    matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(documents):
+        for term, count in terms.items():
+            column = index.get(term)
+            if column is not None:
+                matrix[row, column] = 1.0 + math.log(count)  # sublinear TF
+
+    n_documents = len(documents)
+    idf = np.array(
+        [math.log((1 + n_documents) / (1 + document_frequency[term])) + 1.0 for term in vocabulary],
+        dtype=np.float32
+    )
+    matrix *= idf
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_neighbours(matrix, rows, top_n=TOP_N, min_score=MIN_SCORE):
+    """
+    Return ``{row: [(column, score), ...]}`` with the best matches of each row.
+
+    Similarities are computed chunk-wise (``rows x all``) to bound memory.
+    """
+    result = {}
+    rows = list(rows)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        similarities = matrix[chunk] @ matrix.T
+        similarities[np.arange(len(chunk)), chunk] = -1.0  # never relate an article to itself
+
+        k = min(top_n, similarities.shape[1] - 1)
+        if k <= 0:
+            result.update({row: [] for row in chunk})
+            continue
+
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        for i, row in enumerate(chunk):
+            scores = similarities[i, candidates[i]]
+            order = np.argsort(-scores)
+            result[row] = [
+                (int(candidates[i][j]), float(scores[j]))
+                for j in order if scores[j] >= min_score
+            ]
+    return result
+
+
+def _load_published():
+    articles = list(
+        KnowledgeArticle.objects
+        .filter(status='published')
+        .values_list('id', 'title', 'keywords', 'content_text')
+    )
+    ids = [article[0] for article in articles]
+    matrix = build_tfidf_matrix([article_terms(*article[1:]) for article in articles])
+    return ids, matrix
+
+
+def _write_links(ids, neighbours):
+    """Replace the stored neighbour lists of the given matrix rows"""
+    article_ids = [ids[row] for row in neighbours]
+    RelatedArticle.objects.filter(article_id__in=article_ids).delete()
+    RelatedArticle.objects.bulk_create([
+        RelatedArticle(article_id=ids[row], related_id=ids[column], score=score)
+        for row, links in neighbours.items()
+        for column, score in links
+    ], batch_size=1000)
+
+
+def rebuild_related_articles(top_n=TOP_N):
+    """Recompute the related-articles graph for all published articles"""
+    ids, matrix = _load_published()
+    neighbours = top_neighbours(matrix, range(len(ids)), top_n=top_n)
+
+    with transaction.atomic():
+        RelatedArticle.objects.exclude(article_id__in=ids).delete()
+        _write_links(ids, neighbours)
+
+    return len(ids)
+
+
+def update_related_articles(article_id, top_n=TOP_N):
+    """
+    Update the graph after ``article_id`` was created, edited or unpublished.
+
+    The matrix of all published articles is recomputed; only the article's
+    own neighbour list and the lists it enters or leaves are rewritten.
+    """
+    ids, matrix = _load_published()
+    position = {pk: row for row, pk in enumerate(ids)}
+
+    # Articles that currently list the changed article as neighbour
+    affected = set(
+        RelatedArticle.objects.filter(related_id=article_id).values_list('article_id', flat=True)
+    )
+
+    row = position.get(article_id)
+    if row is not None:
+        affected.add(article_id)
+
+        # Articles the changed article would enter now: better than their current worst link
+        scores = matrix @ matrix[row]
+        stored = {}
+        for pk, score in RelatedArticle.objects.filter(article_id__in=ids).values_list('article_id', 'score'):
+            count, worst = stored.get(pk, (0, 1.0))
+            stored[pk] = (count + 1, min(worst, score))
+
+        for other_row, pk in enumerate(ids):
+            if pk == article_id or scores[other_row] < MIN_SCORE:
+                continue
+            count, worst = stored.get(pk, (0, 1.0))
+            if count < top_n or scores[other_row] > worst:
+                affected.add(pk)
+
+    rows = [position[pk] for pk in affected if pk in position]
+    neighbours = top_neighbours(matrix, rows, top_n=top_n) if rows else {}
+
+    with transaction.atomic():
+        if row is None:
+            # Unpublished or deleted: drop its own list as well
+            RelatedArticle.objects.filter(article_id=article_id).delete()
+        _write_links(ids, neighbours)
+
+    return len(rows)
+
+
+def schedule_update(article_id):
+    """
+    Update the graph for ``article_id`` once the current transaction commits:
+    in a Celery worker with ``RELATED_ARTICLES_ASYNC``, otherwise in-process
+    (a worker-less install must not block on an unreachable broker).
+    """
+    from django.conf import settings
+
+    def update():
+        try:
+            if settings.RELATED_ARTICLES_ASYNC:
+                from .tasks import update_related_articles as task
+                task.delay(article_id)
+            else:
+                update_related_articles(article_id)
+        except Exception as e:
+            # Never break saving an article because of the related-articles graph;
+            # the nightly rebuild (tasks.rebuild_related_articles) repairs it
+            logger.exception(f"Failed to update related articles for {article_id}: {e}")
+
+    transaction.on_commit(update)
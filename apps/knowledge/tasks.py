@@ -0,0 +1,20 @@
+"""
+Celery tasks for the knowledge base (loaded by ``app.autodiscover_tasks()``).
+"""
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def update_related_articles(article_id):
+    """Update the related-articles graph after an article changed (see apps.knowledge.related)"""
+    from .related import update_related_articles as update
+
+    return update(article_id)
+
+
+@shared_task(ignore_result=True)
+def rebuild_related_articles():
+    """Recompute the whole related-articles graph; schedule e.g. nightly to repair missed updates"""
+    from .related import rebuild_related_articles as rebuild
+
+    return rebuild()
@@ -0,0 +1,175 @@
+"""
+HTML processing for knowledge article content.
+
+Article content is rich HTML from the editor. It is processed once when the
+article is saved (see ``KnowledgeArticle.save``):
+
+- ``sanitize_html()``: allowlist-based cleanup used for rendering
+- ``html_to_text()``: plain text for AI prompts and snippets
+- ``search_text()``: normalized text used by the knowledge base search
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+
+from apps.accounts.search import normalize as normalize_token
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'col', 'colgroup', 'div', 'em',
+    'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'kbd', 'li',
+    'ol', 'p', 'pre', 's', 'small', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td',
+    'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'style', 'title'},
+    'a': {'href', 'target'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_URL_SCHEMES = {'http', 'https', 'mailto', 'tel'}
+
+# Content of these tags is dropped completely
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript'}
+VOID_TAGS = {'br', 'col', 'hr', 'img'}
+IMPLICIT_CLOSE_TAGS = {'li', 'p', 'td', 'th', 'tr'}
+BLOCK_TAGS = {
+    'blockquote', 'br', 'div', 'figcaption', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'li',
+    'p', 'pre', 'table', 'tr',
+}
+
+_WHITESPACE_RE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+# Browsers ignore control characters and whitespace in URLs ("java&#9;script:")
+_URL_IGNORED_RE = re.compile(r'[\x00-\x20]+')
+_URL_PATH_START_RE = re.compile(r'[/?#]')
+
+
+def _is_safe_url(url):
+    url = _URL_IGNORED_RE.sub('', url)
+    # A colon before the first /, ? or # makes everything before it the scheme
+    head = _URL_PATH_START_RE.split(url, 1)[0]
+    if ':' not in head:
+        return True
+    return head.split(':', 1)[0].lower() in ALLOWED_URL_SCHEMES
+
+
+class _ContentParser(HTMLParser):
+    """Single pass over the HTML producing sanitized HTML and plain text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.drop_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.drop_depth += 1
+            return
+        if self.drop_depth:
+            return
+
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        elif tag == 'td' or tag == 'th':
+            self.text.append(' ')
+
+        if tag not in ALLOWED_TAGS:
+            return
+
+        # Implicitly closed elements (<li>One<li>Two)
+        if tag in IMPLICIT_CLOSE_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set()) | ALLOWED_ATTRIBUTES['*']
+        rendered = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not _is_safe_url(value):
+                continue
+            if name == 'style' and ('expression' in value.lower() or 'url(' in value.lower()):
+                continue
+            rendered.append(f' {name}="{escape(value, quote=True)}"')
+        if tag == 'a' and any(name == 'target' for name, _ in attrs):
+            rendered.append(' rel="noopener noreferrer"')
+
+        self.html.append(f"<{tag}{''.join(rendered)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.drop_depth = max(self.drop_depth - 1, 0)
+            return
+        if self.drop_depth:
+            return
+
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+
+        if tag in self.open_tags:
+            # Close everything opened after this tag as well (keeps the output well-formed)
+            while self.open_tags:
+                open_tag = self.open_tags.pop()
+                self.html.append(f'</{open_tag}>')
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data):
+        if self.drop_depth:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def _parse(html):
+    parser = _ContentParser()
+    parser.feed(html or '')
+    parser.close()
+    return parser
+
+
+def _clean_text(parts):
+    text = _WHITESPACE_RE.sub(' ', ''.join(parts).replace('\xa0', ' '))
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return _BLANK_LINES_RE.sub('\n\n', text).strip()
+
+
+def process_content(html):
+    """Return ``(sanitized_html, plain_text)`` for article content"""
+    parser = _parse(html)
+    return ''.join(parser.html), _clean_text(parser.text)
+
+
+def sanitize_html(html):
+    """Remove scripts, event handlers, unsafe URLs and unknown tags from HTML"""
+    return process_content(html)[0]
+
+
+def html_to_text(html):
+    """Extract readable plain text (paragraphs separated by blank lines)"""
+    return process_content(html)[1]
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace"""
+    return ' '.join(normalize_token(text).split())
+
+
+def search_text(*parts):
+    """Normalized search representation of the given text parts"""
+    return normalize(' '.join(part for part in parts if part))
@@ -1,33 +1,39 @@
+import hashlib
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.http import HttpResponseForbidden
-from django.db.models import Q
-from .models import KnowledgeArticle
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .models import KnowledgeArticle, RelatedArticle
+from .text import normalize
 from apps.tickets.models import Category
+from helpdesk.replicas import read_only_view
 
 
 @login_required
+@read_only_view
 def kb_list(request):
     """List all published knowledge base articles"""
     search_query = request.GET.get('q', '')
     category_id = request.GET.get('category', '')
 
-    # Base query - only published articles
-    articles = KnowledgeArticle.objects.filter(status='published')
+    # Base query - only published articles (without the full HTML bodies)
+    articles = KnowledgeArticle.objects.filter(
+        status='published'
+    ).select_related('author').defer('content', 'content_sanitized', 'search_text')
 
     # Customers only see public articles
     if request.user.role == 'customer':
         articles = articles.filter(is_public=True)
 
-    # Search functionality
+    # Search functionality - every word has to occur in the precomputed
+    # search text (title, excerpt, keywords and plain text content)
     if search_query:
-        articles = articles.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(excerpt__icontains=search_query) |
-            Q(keywords__icontains=search_query)
-        )
+        for term in normalize(search_query).split()[:10]:
+            articles = articles.filter(search_text__contains=term)
 
     # Filter by category
     if category_id:
@@ -49,6 +55,56 @@ def kb_list(request):
     return render(request, 'knowledge/list.html', context)
 
 
+def _related_articles(request, article, limit=3):
+    """Related articles shown on the detail page, visible to the current user"""
+    # Get related articles from the precomputed similarity graph
+    related_links = RelatedArticle.objects.filter(
+        article=article,
+        related__status='published'
+    ).select_related('related')
+
+    if request.user.role == 'customer':
+        related_links = related_links.filter(related__is_public=True)
+
+    related = [link.related for link in related_links[:limit]]
+
+    # Fallback until the graph has been computed for this article
+    if not related:
+        related = KnowledgeArticle.objects.filter(
+            status='published',
+            category=article.category
+        ).exclude(id=article.id)
+
+        if request.user.role == 'customer':
+            related = related.filter(is_public=True)
+
+        related = list(related[:limit])
+
+    return related
+
+
+def _article_etag(request, article, related):
+    """
+    ETag of the rendered detail page for the current user.
+
+    Covers everything shown on the page except the view counter: article
+    version, votes, the related articles (ids and versions), the user
+    (navigation, permissions), the CSRF cookie (token in the vote form) and
+    pending flash messages.
+    """
+    parts = [
+        article.pk,
+        article.updated_at.timestamp(),
+        article.helpful_count,
+        article.not_helpful_count,
+        ','.join(f'{other.pk}@{other.updated_at.timestamp()}' for other in related),
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        len(messages.get_messages(request)),
+    ]
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
 @login_required
 def kb_detail(request, slug):
     """View a single knowledge base article"""
@@ -72,20 +128,26 @@ def kb_detail(request, slug):
             messages.success(request, 'Vielen Dank für Ihr Feedback!')
         return redirect('knowledge:detail', slug=slug)
 
-    # Get related articles
-    related = KnowledgeArticle.objects.filter(
-        status='published',
-        category=article.category
-    ).exclude(id=article.id)[:3]
+    related = _related_articles(request, article)
 
-    if request.user.role == 'customer':
-        related = related.filter(is_public=True)
+    # Conditional GET: the view has been counted above, a browser with an
+    # up-to-date copy only gets a 304 without rendering the page
+    etag = _article_etag(request, article, related)
+    last_modified = max(other.updated_at for other in [article, *related]).timestamp()
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
 
     context = {
         'article': article,
         'related': related,
     }
-    return render(request, 'knowledge/detail.html', context)
+    response = render(request, 'knowledge/detail.html', context)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers have to revalidate every time (private page), which is cheap now
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
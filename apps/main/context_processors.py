@@ -20,3 +20,16 @@ def branding_context(request):
         'logo_url': settings.LOGO_URL,
         'app_title': settings.APP_TITLE,
     }
+
+
+def upload_context(request):
+    """
+    Add the attachment upload limits to template context.
+
+    - upload_accept: ``accept`` attribute for file inputs (".pdf,.png,...")
+    - upload_max_mb: maximum size per file in MB
+    """
+    return {
+        'upload_accept': ','.join(f'.{extension}' for extension in settings.ALLOWED_EXTENSIONS),
+        'upload_max_mb': settings.MAX_UPLOAD_SIZE // (1024 * 1024),
+    }
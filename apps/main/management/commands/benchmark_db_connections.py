@@ -0,0 +1,82 @@
+"""
+Measure the per-request database connection overhead.
+
+Simulates requests with Django's request_started/request_finished signals
+(which open, health-check and close connections exactly like real requests)
+and times the first query of each request - the one that pays for
+connecting or for the health check of a reused connection. Runs once with a
+new connection per request (CONN_MAX_AGE = 0) and once with the configured
+settings.
+
+Usage:
+    python manage.py benchmark_db_connections
+    python manage.py benchmark_db_connections --requests 500 --database default
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request connection setup with and without persistent connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Simulated requests per run (default: 200)')
+        parser.add_argument('--database', default='default',
+                            help='Database alias (default: default)')
+
+    def _run(self, connection, conn_max_age, requests):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count)
+        first_query = []
+        try:
+            for _ in range(requests):
+                request_started.send(sender=self.__class__)
+                start = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                first_query.append(time.perf_counter() - start)
+                request_finished.send(sender=self.__class__)
+        finally:
+            connection_created.disconnect(count)
+            connection.close()
+        return first_query, len(opened)
+
+    def _report(self, label, timings, opened):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+        self.stdout.write(
+            f'{label:<28} {statistics.mean(timings) * 1000:8.3f} ms mean, {p95 * 1000:8.3f} ms p95, '
+            f'{opened} connections opened'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        requests = max(options['requests'], 1)
+        configured = connection.settings_dict['CONN_MAX_AGE']
+
+        self.stdout.write(f"{connection.vendor} ({connection.settings_dict['NAME']}), {requests} requests, "
+                          f"health checks: {'on' if connection.settings_dict['CONN_HEALTH_CHECKS'] else 'off'}, "
+                          f"pool: {'on' if connection.settings_dict['OPTIONS'].get('pool') else 'off'}")
+        try:
+            per_request, per_request_opened = self._run(connection, 0, requests)
+            persistent, persistent_opened = self._run(connection, configured, requests)
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = configured
+
+        self._report('New connection per request:', per_request, per_request_opened)
+        self._report(f'Configured (CONN_MAX_AGE={configured}):', persistent, persistent_opened)
+        saved = statistics.mean(per_request) - statistics.mean(persistent)
+        self.stdout.write(self.style.SUCCESS(f'Saved per request: {saved * 1000:.3f} ms'))
@@ -0,0 +1,89 @@
+"""
+Microbenchmark for the shared JSON renderer.
+
+Builds a synthetic payload shaped like Ticket.to_dict(include_details=True)
+(datetimes and lazy translation strings included) and compares the stdlib
+encoder used by JsonResponse with apps.main.responses.dumps().
+
+Usage:
+    python manage.py benchmark_json_rendering --tickets 10000
+"""
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from apps.main import responses
+
+
+def build_payload(count):
+    """Create ``count`` ticket-like dictionaries"""
+    now = timezone.now()
+    user = {
+        'id': 1,
+        'username': 'max.mustermann',
+        'email': 'max.mustermann@example.com',
+        'full_name': 'Max Mustermann',
+        'role': 'customer',
+        'last_login': now,
+        'created_at': now - timedelta(days=100),
+    }
+    tickets = []
+    for i in range(count):
+        created = now - timedelta(minutes=i)
+        tickets.append({
+            'id': i,
+            'ticket_number': f'TK-2025-{10000 + i}',
+            'title': 'Beamer startet nicht',
+            'status': _('Open'),
+            'priority': _('Medium'),
+            'created_at': created,
+            'updated_at': created,
+            'sla_due_date': created + timedelta(hours=72),
+            'sla_breached': False,
+            'creator': user,
+            'assignee': None,
+            'category': 'Hardware',
+            'comments': [
+                {'id': i * 3 + j, 'content': 'Bitte prüfen Sie das HDMI-Kabel.', 'author': user,
+                 'created_at': created + timedelta(minutes=j)}
+                for j in range(3)
+            ],
+        })
+    return {'results': tickets}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the stdlib JSON encoder against the shared fast JSON renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=10000,
+                            help='Number of tickets in the payload (default: 10000)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of runs, the fastest one is reported (default: 5)')
+
+    def _best_of(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        payload = build_payload(options['tickets'])
+        repeat = max(options['repeat'], 1)
+
+        stdlib_time = self._best_of(lambda: json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8'), repeat)
+        fast_time = self._best_of(lambda: responses.dumps(payload), repeat)
+
+        encoder = 'orjson' if responses.orjson is not None else 'stdlib fallback'
+        self.stdout.write(f'Payload: {options["tickets"]} tickets')
+        self.stdout.write(f'JsonResponse (stdlib):       {stdlib_time * 1000:8.1f} ms')
+        self.stdout.write(f'FastJsonResponse ({encoder}): {fast_time * 1000:8.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {stdlib_time / fast_time:.1f}x'))
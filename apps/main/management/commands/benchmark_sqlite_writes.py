@@ -0,0 +1,183 @@
+"""
+How many parallel commenters SQLite sustains, plain vs. tuned backend.
+
+Every writer is a separate Django process (like a gunicorn worker) that
+adds comments to one ticket as fast as it can for --seconds: it reads the
+ticket, then adds the comment and touches the ticket in one
+``transaction.atomic()`` block. The run uses a temporary, freshly migrated
+database file, not the configured one, and is repeated for every writer
+count with Django's plain SQLite backend and with the tuned one
+(helpdesk.db_backends.sqlite3 with the SQLITE_* settings).
+
+A writer count is sustained if no comment failed ("database is locked")
+and the 95th percentile stays below --max-p95.
+
+Usage:
+    python manage.py benchmark_sqlite_writes
+    python manage.py benchmark_sqlite_writes --writers 1,4,16,32 --seconds 10
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+MODES = (('plain', 'False'), ('tuned', 'True'))
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Benchmark parallel comment writers on SQLite with the plain and the tuned backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', default='1,2,4,8,16,32',
+                            help='Comma-separated numbers of parallel writer processes (default: 1,2,4,8,16,32)')
+        parser.add_argument('--seconds', type=float, default=5.0,
+                            help='Duration of each run in seconds (default: 5)')
+        parser.add_argument('--max-p95', type=float, default=500.0,
+                            help='Highest acceptable 95th percentile per comment in ms (default: 500)')
+        # Internal: run as one writer process / prepare the database
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+        parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+        parser.add_argument('--ticket', type=int, help=argparse.SUPPRESS)
+        parser.add_argument('--author', type=int, help=argparse.SUPPRESS)
+        parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['prepare']:
+            return self._prepare()
+        if options['worker']:
+            return self._work(options['ticket'], options['author'], options['start_at'], options['seconds'])
+
+        try:
+            counts = sorted({int(count) for count in options['writers'].split(',') if count.strip()})
+        except ValueError:
+            raise CommandError('--writers must be a comma-separated list of numbers')
+
+        workdir = tempfile.mkdtemp(prefix='helpdesk-sqlite-bench-')
+        try:
+            template = os.path.join(workdir, 'template.db')
+            prepared = self._run_manage(template, 'False', ['--prepare'])
+            ids = json.loads(prepared.stdout.strip().splitlines()[-1])
+
+            sustained = {}
+            for mode, tuned in MODES:
+                self.stdout.write(f'\nSQLite {mode} ({self._describe(tuned)})')
+                self.stdout.write(f"{'writers':>8} {'comments/s':>11} {'failed':>7} {'p50 ms':>8} {'p95 ms':>8}")
+                sustained[mode] = 0
+                all_ok = True
+                for count in counts:
+                    database = os.path.join(workdir, f'{mode}-{count}.db')
+                    shutil.copy(template, database)
+                    result = self._run_writers(database, tuned, count, ids, options['seconds'])
+                    ok = result['failed'] == 0 and result['p95'] * 1000 <= options['max_p95']
+                    all_ok = all_ok and ok
+                    if all_ok:
+                        sustained[mode] = count
+                    self.stdout.write(
+                        f"{count:>8} {result['rate']:>11.1f} {result['failed']:>7} {result['p50'] * 1000:>8.1f} "
+                        f"{result['p95'] * 1000:>8.1f}" + ('' if ok else '  <- not sustained')
+                    )
+                    for path in (database, f'{database}-wal', f'{database}-shm'):
+                        if os.path.exists(path):
+                            os.remove(path)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.stdout.write('')
+        for mode, _ in MODES:
+            self.stdout.write(self.style.SUCCESS(
+                f"{mode}: sustains {sustained[mode]} parallel writers "
+                f"(no failed comments, p95 <= {options['max_p95']:g} ms)"
+            ))
+
+    def _describe(self, tuned):
+        if tuned != 'True':
+            return 'rollback journal, deferred BEGIN, 5 s timeout'
+        sqlite = settings.SQLITE_OPTIONS
+        return (f"journal_mode={sqlite['journal_mode']}, synchronous={sqlite['synchronous']}, "
+                f"busy_timeout={sqlite['busy_timeout']} ms, "
+                f"{'BEGIN IMMEDIATE' if sqlite['immediate_transactions'] else 'deferred BEGIN'}")
+
+    def _env(self, database, tuned):
+        return {**os.environ, 'DATABASE_URL': f'sqlite:///{database}', 'SQLITE_TUNED': tuned,
+                'DATABASE_REPLICA_URLS': ''}
+
+    def _command(self, extra):
+        return [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_sqlite_writes', *extra]
+
+    def _run_manage(self, database, tuned, extra):
+        result = subprocess.run(self._command(extra), env=self._env(database, tuned), capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'Benchmark process failed: {result.stderr.strip()[-2000:]}')
+        return result
+
+    def _run_writers(self, database, tuned, count, ids, seconds):
+        # All writers start at the same moment, after their Django startup
+        start_at = time.time() + 2 + 0.15 * count
+        extra = ['--worker', '--ticket', str(ids['ticket']), '--author', str(ids['author']),
+                 '--start-at', str(start_at), '--seconds', str(seconds)]
+        processes = [subprocess.Popen(self._command(extra), env=self._env(database, tuned),
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                     for _ in range(count)]
+
+        comments, failed, latencies = 0, 0, []
+        for process in processes:
+            stdout, stderr = process.communicate()
+            if process.returncode:
+                raise CommandError(f'Writer failed: {stderr.strip()[-2000:]}')
+            result = json.loads(stdout.strip().splitlines()[-1])
+            comments += result['comments']
+            failed += result['failed']
+            latencies += result['latencies']
+        return {
+            'rate': comments / seconds,
+            'failed': failed,
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+        }
+
+    def _prepare(self):
+        from apps.accounts.models import User
+        from apps.tickets.models import Ticket
+
+        call_command('migrate', verbosity=0)
+        author = User.objects.create_customer('Bench', 'Mark', email='benchmark@example.com')
+        ticket = Ticket.objects.create(title='SQLite benchmark', description='Parallel comments',
+                                       created_by=author)
+        self.stdout.write(json.dumps({'ticket': ticket.pk, 'author': author.pk}))
+
+    def _work(self, ticket_id, author_id, start_at, seconds):
+        from apps.accounts.models import User
+        from apps.tickets.models import Ticket, TicketComment
+
+        author = User.objects.get(pk=author_id)
+        time.sleep(max(0.0, start_at - time.time()))
+        until = time.time() + seconds
+        comments, failed, latencies = 0, 0, []
+        while time.time() < until:
+            start = time.perf_counter()
+            try:
+                Ticket.objects.get(pk=ticket_id)  # The request reads before it writes
+                with transaction.atomic():
+                    ticket = Ticket.objects.get(pk=ticket_id)
+                    TicketComment.objects.create(ticket=ticket, author=author, content='Parallel comment')
+                    Ticket.objects.filter(pk=ticket_id).update(updated_at=timezone.now())
+                comments += 1
+            except OperationalError:
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+        self.stdout.write(json.dumps({'comments': comments, 'failed': failed, 'latencies': latencies}))
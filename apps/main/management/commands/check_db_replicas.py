@@ -0,0 +1,156 @@
+"""
+Check the read replica configuration.
+
+Without options every configured replica (DATABASE_REPLICA_URLS) is checked
+for reachability and replication lag.
+
+With --local primary and replica must be two SQLite files, e.g.
+
+    DATABASE_URL=sqlite:///primary.db DATABASE_REPLICA_URLS=sqlite:///replica.db
+
+The replica is filled with a copy of the primary, then the routing is
+checked: read-only views read from the replica, writes and
+read-your-writes go to the primary, and lagging or broken replicas fall
+back to the primary. A marker category is written to the primary and
+removed again afterwards.
+
+Usage:
+    python manage.py check_db_replicas
+    python manage.py check_db_replicas --local
+"""
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import HttpResponse
+from django.template import engines
+from django.template.response import TemplateResponse
+from django.test import RequestFactory, override_settings
+
+from apps.tickets.models import Category
+from helpdesk import replicas
+
+MARKER = '__replica_check__'
+
+
+class Command(BaseCommand):
+    help = 'Check reachability and lag of the read replicas, or the routing with two local SQLite files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--local', action='store_true',
+                            help='Check the routing with a SQLite primary and a SQLite replica')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No read replicas configured (DATABASE_REPLICA_URLS).')
+        self.failed = False
+
+        if options['local']:
+            self._check_local()
+        else:
+            for alias in settings.DATABASE_REPLICAS:
+                self._check_replica(alias)
+
+        if self.failed:
+            raise CommandError('Replica checks failed')
+
+    def _check_replica(self, alias):
+        target = connections[alias].settings_dict['HOST'] or connections[alias].settings_dict['NAME']
+        try:
+            lag = replicas.replica_lag(alias)
+        except DatabaseError as e:
+            self._check(f'{alias} ({target}) reachable ({e})', lambda: False)
+            return
+        self._check(f'{alias} ({target}) reachable', lambda: True)
+        self._check(f'{alias} replication running', lambda: lag is not None)
+        if lag is not None:
+            self._check(f'{alias} is {lag:.1f}s behind (max {settings.DB_REPLICA_MAX_LAG:g}s)',
+                        lambda: lag <= settings.DB_REPLICA_MAX_LAG)
+
+    def _sync(self, alias):
+        """Copy the primary into the replica file"""
+        for name in (DEFAULT_DB_ALIAS, alias):
+            connections[name].close()
+        source = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        replicas.reset_health_checks()
+
+    def _check_local(self):
+        alias = settings.DATABASE_REPLICAS[0]
+        if any(connections[name].vendor != 'sqlite' for name in (DEFAULT_DB_ALIAS, alias)):
+            raise CommandError('--local needs SQLite files for DATABASE_URL and DATABASE_REPLICA_URLS.')
+
+        @replicas.read_only_view
+        def count_markers(request):
+            queryset = Category.objects.filter(name=MARKER)
+            return HttpResponse(f'{queryset.db}:{queryset.count()}')
+
+        @replicas.read_only_view
+        def render_markers(request):
+            # The queryset is only evaluated when the response is rendered
+            template = engines['django'].from_string('{{ markers.db }}:{{ markers.count }}')
+            return TemplateResponse(request, template, {'markers': Category.objects.filter(name=MARKER)})
+
+        def write_marker(request):
+            Category.objects.get_or_create(name=MARKER)
+            return HttpResponse('ok')
+
+        def counts(request=None):
+            return count_markers(request or RequestFactory().get('/')).content.decode()
+
+        Category.objects.filter(name=MARKER).delete()
+        self._sync(alias)
+        try:
+            self._check('Read-only view reads from the replica', lambda: counts() == f'{alias}:0')
+            self._check('Reads outside read-only views use the primary',
+                        lambda: Category.objects.filter(name=MARKER).db == DEFAULT_DB_ALIAS)
+
+            Category.objects.create(name=MARKER)
+            self._check('Replica lags behind the primary (not synced)', lambda: counts() == f'{alias}:0')
+            self._check('Template responses are rendered on the replica',
+                        lambda: render_markers(RequestFactory().get('/')).content.decode() == f'{alias}:0')
+
+            middleware = replicas.ReplicaMiddleware(write_marker)
+            response = middleware(RequestFactory().post('/'))
+            cookie = response.cookies.get(replicas.STICKY_COOKIE)
+            self._check('A write sets the read-your-writes cookie', lambda: cookie is not None)
+            request = RequestFactory().get('/')
+            request.COOKIES[replicas.STICKY_COOKIE] = cookie.value if cookie else ''
+            self._check('The writer reads from the primary afterwards',
+                        lambda: replicas.ReplicaMiddleware(count_markers)(request).content.decode() == 'default:1')
+            self._check('Other users keep reading from the replica',
+                        lambda: replicas.ReplicaMiddleware(count_markers)(RequestFactory().get('/')).content.decode()
+                        == f'{alias}:0')
+
+            with override_settings(DB_REPLICA_MAX_LAG=-1):
+                replicas.reset_health_checks()
+                self._check('A lagging replica falls back to the primary', lambda: counts() == 'default:1')
+            replicas.reset_health_checks()
+
+            connections[alias].close()
+            broken = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            broken.execute(f'DROP TABLE {Category._meta.db_table}')
+            broken.close()
+            self._check('A failing replica falls back to the primary', lambda: counts() == 'default:1')
+            self._check('The failing replica is skipped afterwards', lambda: counts() == 'default:1')
+        finally:
+            Category.objects.filter(name=MARKER).delete()
+            self._sync(alias)
+
+    def _check(self, name, func):
+        try:
+            ok = func()
+        except Exception as e:
+            ok = False
+            name = f'{name} ({e.__class__.__name__}: {e})'
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f'PASS  {name}'))
+        else:
+            self.failed = True
+            self.stdout.write(self.style.ERROR(f'FAIL  {name}'))
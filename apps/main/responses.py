@@ -0,0 +1,85 @@
+"""
+Shared JSON responses for all JSON endpoints.
+
+``orjson`` is used when it is installed, otherwise the standard library
+encoder with Django's ``DjangoJSONEncoder`` is the fallback. Both handle
+datetimes, dates, decimals, UUIDs and lazy translation strings.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _orjson_default(obj):
+    """Fallback for types orjson does not serialize natively"""
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    # Decimal, timedelta, ... are handled like in DjangoJSONEncoder
+    return DjangoJSONEncoder().default(obj)
+
+
+def dumps(data):
+    """Serialize ``data`` to JSON bytes using the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Drop-in replacement for ``JsonResponse`` using the fast encoder.
+
+    Like ``JsonResponse``, only dictionaries are accepted unless ``safe=False``.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the '
+                'safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class StreamingJsonArrayResponse(StreamingHttpResponse):
+    """
+    Stream a large JSON array without building it in memory.
+
+    ``items`` may be any iterable (e.g. a queryset ``.iterator()``). Items are
+    encoded in chunks of ``chunk_size`` elements. With ``key`` the array is
+    wrapped into an object: ``{"<key>": [...]}``.
+    """
+
+    def __init__(self, items, key=None, chunk_size=500, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(streaming_content=self._generate(items, key, chunk_size), **kwargs)
+
+    @staticmethod
+    def _generate(items, key, chunk_size):
+        if key is not None:
+            yield b'{' + dumps(str(key)) + b':['
+        else:
+            yield b'['
+
+        chunk = []
+        first = True
+        for item in items:
+            chunk.append(dumps(item))
+            if len(chunk) >= chunk_size:
+                yield (b'' if first else b',') + b','.join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield (b'' if first else b',') + b','.join(chunk)
+
+        yield b']}' if key is not None else b']'
@@ -2,9 +2,13 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils.decorators import method_decorator
+
+from helpdesk.replicas import read_only_view
 
 
 @login_required
+@read_only_view
 def dashboard(request):
     """Main dashboard view"""
     context = {
@@ -13,6 +17,7 @@ def dashboard(request):
     return render(request, 'dashboard/index.html', context)
 
 
+@method_decorator(read_only_view, name='dispatch')
 class DashboardView(LoginRequiredMixin, TemplateView):
     """Dashboard class-based view"""
     template_name = 'dashboard/index.html'
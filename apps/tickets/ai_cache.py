@@ -0,0 +1,142 @@
+"""
+Cache for AI auto-responses.
+
+Many tickets are near-identical ("WLAN geht nicht", "Beamer startet nicht").
+Generated answers are therefore cached under a hash of the normalized ticket
+text (lowercase, accents and punctuation stripped) plus the category. Only
+the greeting is personalized when a cached answer is served, so the cached
+text never contains customer names.
+
+A cached answer is discarded when one of the knowledge articles it was
+generated from changed since (per-article version counters, bumped by
+``KnowledgeArticle.save``/``delete``). Hits, misses and invalidations are
+counted in the cache as well (``cache_stats()``, ``manage.py ai_response_cache``).
+Versions and counters are only shared between the web and Celery processes
+with a shared cache backend (``CACHE_URL``).
+"""
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.knowledge.text import normalize
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'ai_response'
+STATS = ('hits', 'misses', 'invalidated')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_GREETING_RE = re.compile(r'^\s*(hallo|hi|guten (morgen|tag|abend)|sehr geehrte[rs]?|liebe[rs]?)\b[^,\n]*,?[ \t]*\n*',
+                          re.IGNORECASE)
+
+
+def content_key(title, description, category_id=None):
+    """Cache key for a ticket text: punctuation, case and accents do not matter"""
+    text = ' '.join(_WORD_RE.findall(normalize(f'{title}\n{description}')))
+    digest = hashlib.sha256(f'{category_id or 0}\n{text}'.encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{digest}'
+
+
+def strip_greeting(text):
+    """Remove the leading greeting line of a generated answer"""
+    return _GREETING_RE.sub('', text, count=1).lstrip()
+
+
+def personalize(body, first_name):
+    """Prefix a cached answer with the greeting for one customer"""
+    greeting = f'Hallo {first_name},' if first_name else 'Hallo,'
+    return f'{greeting}\n\n{body}'
+
+
+# Knowledge article versions
+
+def _article_version_key(article_id):
+    return f'{CACHE_PREFIX}:kb:{article_id}'
+
+
+def article_versions(article_ids):
+    """Return ``{article_id: version}`` for the given articles"""
+    article_ids = list(article_ids)
+    if not article_ids:
+        return {}
+    stored = cache.get_many([_article_version_key(article_id) for article_id in article_ids])
+    return {
+        article_id: stored.get(_article_version_key(article_id), 0)
+        for article_id in article_ids
+    }
+
+
+def _increment(key):
+    # add() + incr() are atomic in the shared cache, so concurrent processes never lose a count
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)  # Evicted between add() and incr()
+
+
+def invalidate_article(article_id):
+    """Invalidate all cached answers generated from this knowledge article"""
+    _increment(_article_version_key(article_id))
+
+
+# Lookup and storage
+
+def _record(name):
+    _increment(f'{CACHE_PREFIX}:stats:{name}')
+
+
+def get_response(key):
+    """
+    Return the cached entry for ``key`` or None.
+
+    Entries are dictionaries with ``body`` (answer without greeting),
+    ``is_solution`` and ``kb_article_ids``.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        _record('misses')
+        return None
+
+    if article_versions(entry['kb_article_ids']) != entry['kb_versions']:
+        logger.info(f"AI response cache entry {key} invalidated by changed knowledge articles")
+        cache.delete(key)
+        _record('invalidated')
+        _record('misses')
+        return None
+
+    _record('hits')
+    return entry
+
+
+def store_response(key, body, is_solution, kb_article_ids, kb_versions, timeout=None):
+    """
+    Cache a generated answer.
+
+    ``kb_versions`` must be taken *before* the answer was generated, so an
+    article edited in the meantime invalidates the entry right away.
+    """
+    cache.set(key, {
+        'body': body,
+        'is_solution': is_solution,
+        'kb_article_ids': list(kb_article_ids),
+        'kb_versions': kb_versions,
+    }, settings.AI_RESPONSE_CACHE_TIMEOUT if timeout is None else timeout)
+
+
+def cache_stats():
+    """Return hit/miss counters and the hit rate"""
+    keys = {name: f'{CACHE_PREFIX}:stats:{name}' for name in STATS}
+    stored = cache.get_many(keys.values())
+    stats = {name: stored.get(key, 0) for name, key in keys.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_stats():
+    """Reset the hit/miss counters"""
+    cache.delete_many([f'{CACHE_PREFIX}:stats:{name}' for name in STATS])
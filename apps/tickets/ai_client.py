@@ -0,0 +1,263 @@
+"""
+Resilient access to the Anthropic API.
+
+``AIClientManager`` wraps the (synchronous) Anthropic client so that a slow
+or failing API cannot stall ticket creation:
+
+- a token bucket limits the request rate,
+- a semaphore bounds the number of concurrent calls per process,
+- every call has a deadline covering waiting, retries and the request itself,
+- transient errors (connection problems, timeouts, 429, 5xx) are retried
+  with exponential backoff and jitter,
+- a circuit breaker short-circuits calls while the recent error rate is high
+  and lets a single probe call through after a cool-down.
+
+Latency, error and token counters are available via ``metrics()``.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import anthropic
+
+logger = logging.getLogger(__name__)
+
+
+class AIUnavailableError(Exception):
+    """The call was not made or gave up (circuit open, overloaded, deadline exceeded)"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take one token, waiting at most ``timeout`` seconds. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Error-rate based circuit breaker.
+
+    The circuit opens when at least ``min_calls`` calls were made within the
+    last ``window`` seconds and the share of failures reaches
+    ``failure_rate``. After ``cooldown`` seconds one probe call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate=0.5, min_calls=5, window=60.0, cooldown=30.0):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._results = deque()  # (timestamp, success)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may be made now"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def cancel(self):
+        """The allowed call was not made (or its outcome says nothing about the API)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                logger.info("AI circuit breaker closed again")
+                self._state = self.CLOSED
+                self._probe_in_flight = False
+                self._results.clear()
+                return
+            self._add(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._add(False)
+            failures = sum(1 for _, success in self._results if not success)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_rate:
+                self._open()
+
+    def _add(self, success):
+        now = time.monotonic()
+        self._results.append((now, success))
+        while self._results and self._results[0][0] < now - self.window:
+            self._results.popleft()
+
+    def _open(self):
+        logger.warning(f"AI circuit breaker opened for {self.cooldown:g}s")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._results.clear()
+
+
+class AIClientManager:
+    """Rate-limited, bounded and fault-tolerant ``messages.create`` for an Anthropic client"""
+
+    RETRYABLE_ERRORS = (
+        anthropic.APIConnectionError,  # includes APITimeoutError
+        anthropic.RateLimitError,
+        anthropic.InternalServerError,
+    )
+
+    def __init__(self, client, max_concurrency=4, requests_per_minute=50, timeout=20.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, breaker=None):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=max(1, max_concurrency))
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {
+            'calls': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+            'short_circuited': 0, 'rejected': 0, 'input_tokens': 0, 'output_tokens': 0,
+        }
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+
+    def _backoff(self, attempt, error):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        # Respect the server's Retry-After on 429 if it is longer
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    def create_message(self, timeout=None, **kwargs):
+        """
+        ``client.messages.create(**kwargs)`` with rate limiting, retries and a deadline.
+
+        ``timeout`` (seconds, default: the manager's timeout) bounds the whole
+        call including waiting and retries. Raises ``AIUnavailableError`` if
+        the call is short-circuited, cannot start in time or finally fails
+        with a transient error; other API errors (e.g. 400) are re-raised.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        if not self.breaker.allow():
+            self._count(short_circuited=1)
+            raise AIUnavailableError('AI service temporarily disabled (circuit open)')
+
+        if not self._semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            self.breaker.cancel()
+            self._count(rejected=1)
+            raise AIUnavailableError('Too many concurrent AI requests')
+
+        try:
+            attempt = 0
+            while True:
+                if not self._bucket.acquire(max(deadline - time.monotonic(), 0)):
+                    self.breaker.cancel()
+                    self._count(rejected=1)
+                    raise AIUnavailableError('AI request rate limit reached')
+
+                remaining = deadline - time.monotonic()
+                self._count(calls=1)
+                start = time.monotonic()
+                try:
+                    message = self.client.messages.create(timeout=remaining, **kwargs)
+                except self.RETRYABLE_ERRORS as e:
+                    self._count(failures=1)
+                    self.breaker.record_failure()
+                    delay = self._backoff(attempt, e)
+                    if (attempt >= self.max_retries or self.breaker.state != CircuitBreaker.CLOSED
+                            or time.monotonic() + delay >= deadline):
+                        raise AIUnavailableError(f'AI request failed: {e}') from e
+                    logger.info(f"AI request failed ({e}), retrying in {delay:.1f}s")
+                    self._count(retries=1)
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                except Exception:
+                    # Client errors (invalid request, auth) say nothing about API health
+                    self._count(failures=1)
+                    self.breaker.cancel()
+                    raise
+
+                latency = time.monotonic() - start
+                usage = getattr(message, 'usage', None)
+                with self._lock:
+                    self._latencies.append(latency)
+                    self._counters['successes'] += 1
+                    if usage is not None:
+                        self._counters['input_tokens'] += usage.input_tokens
+                        self._counters['output_tokens'] += usage.output_tokens
+                self.breaker.record_success()
+                return message
+        finally:
+            self._semaphore.release()
+
+    def metrics(self):
+        """Counters, latency percentiles (ms, last 1000 calls) and circuit state"""
+        with self._lock:
+            metrics = dict(self._counters)
+            latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1)
+
+        metrics['error_rate'] = metrics['failures'] / metrics['calls'] if metrics['calls'] else 0.0
+        metrics['latency_ms'] = {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1.0)}
+        metrics['circuit'] = self.breaker.state
+        return metrics
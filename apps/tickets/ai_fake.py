@@ -0,0 +1,56 @@
+"""
+Offline stand-in for the Anthropic client.
+
+Mirrors the part of ``anthropic.Anthropic`` used by the AI service
+(``client.messages.create(...)``) and returns canned German answers without
+any network access. Enabled with ``CLAUDE_FAKE_CLIENT=True`` for development
+and tests; ``calls`` records every request for inspection.
+"""
+import threading
+from types import SimpleNamespace
+
+DEFAULT_RESPONSE = (
+    "Hallo,\n\n"
+    "vielen Dank für Ihre Nachricht. Bitte versuchen Sie folgende Schritte: "
+    "Starten Sie das Gerät neu und prüfen Sie alle Kabelverbindungen.\n\n"
+    "Mit freundlichen Grüßen\nIhr Support-Team"
+)
+
+
+class _Messages:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, max_tokens, messages, **kwargs):
+        prompt = messages[-1]['content'] if messages else ''
+        with self._client._lock:
+            self._client.calls.append({'model': model, 'max_tokens': max_tokens,
+                                       'messages': messages, **kwargs})
+
+        text = self._client.response
+        if callable(text):
+            text = text(prompt)
+        return SimpleNamespace(
+            id=f'msg_fake_{len(self._client.calls)}',
+            model=model,
+            role='assistant',
+            stop_reason='end_turn',
+            content=[SimpleNamespace(type='text', text=text)],
+            # Rough estimate, good enough for usage accounting in tests
+            usage=SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(text) // 4),
+        )
+
+
+class FakeAnthropicClient:
+    """
+    Fake ``anthropic.Anthropic`` client.
+
+    ``response`` is the answer text, or a callable receiving the prompt and
+    returning the answer text.
+    """
+
+    def __init__(self, response=DEFAULT_RESPONSE):
+        self.response = response
+        self.calls = []
+        self._lock = threading.Lock()
+        self.messages = _Messages(self)
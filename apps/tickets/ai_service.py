@@ -1,39 +1,80 @@
 """
 Claude AI Service for automatic ticket responses
 """
+import logging
+import time
+
 import anthropic
 from django.conf import settings
 from .models import Ticket, TicketComment
+from . import ai_cache
+from .ai_client import AIClientManager, AIUnavailableError, CircuitBreaker
 from apps.knowledge.models import KnowledgeArticle
 
+logger = logging.getLogger(__name__)
+
 
 class ClaudeAIService:
     """Service to interact with Claude AI for auto-responses"""
 
-    def __init__(self):
-        self.client = None
-        if settings.CLAUDE_API_KEY:
-            self.client = anthropic.Anthropic(api_key=settings.CLAUDE_API_KEY)
+    def __init__(self, client=None):
+        self.client = client
+        if self.client is None:
+            if settings.CLAUDE_FAKE_CLIENT:
+                from .ai_fake import FakeAnthropicClient
+                self.client = FakeAnthropicClient()
+            elif settings.CLAUDE_API_KEY:
+                # Retries and timeouts are handled by the client manager
+                self.client = anthropic.Anthropic(api_key=settings.CLAUDE_API_KEY,
+                                                  timeout=settings.CLAUDE_TIMEOUT, max_retries=0)
+
+        self.client_manager = None
+        if self.client is not None:
+            self.client_manager = AIClientManager(
+                self.client,
+                max_concurrency=settings.CLAUDE_MAX_CONCURRENCY,
+                requests_per_minute=settings.CLAUDE_REQUESTS_PER_MINUTE,
+                timeout=settings.CLAUDE_TIMEOUT,
+                max_retries=settings.CLAUDE_MAX_RETRIES,
+            )
 
     def is_available(self):
-        """Check if Claude AI is configured and available"""
-        return self.client is not None
+        """Check if Claude AI is configured and not disabled by the circuit breaker"""
+        return self.client is not None and self.client_manager.breaker.state != CircuitBreaker.OPEN
+
+    def metrics(self):
+        """Latency, error and token metrics of the API client (this process)"""
+        return self.client_manager.metrics() if self.client_manager else None
 
     def get_relevant_knowledge(self, query, limit=3):
         """Search knowledge base for relevant articles"""
-        from django.db.models import Q
+        from django.db.models import Q, Case, When, IntegerField, Value
+        from apps.knowledge.text import normalize
+
+        # Use the most specific words of the query and rank articles by
+        # how many of them occur in the precomputed search text
+        terms = sorted({term for term in normalize(query).split() if len(term) > 3}, key=len, reverse=True)[:8]
+        if not terms:
+            return KnowledgeArticle.objects.none()
+
+        matches = Q()
+        score = Value(0)
+        for term in terms:
+            matches |= Q(search_text__contains=term)
+            score = score + Case(When(search_text__contains=term, then=1), default=0, output_field=IntegerField())
 
         articles = KnowledgeArticle.objects.filter(
             status='published',
             is_public=True
-        ).filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query) |
-            Q(keywords__icontains=query)
-        )[:limit]
+        ).filter(matches).annotate(
+            relevance=score
+        ).order_by('-relevance', '-helpful_count')[:limit]
 
         return articles
 
+    # Only low/medium priority tickets get automatic responses
+    NO_AUTO_RESPONSE_PRIORITIES = ['high', 'critical']
+
     def should_auto_respond(self, ticket):
         """Determine if ticket should get auto-response"""
         # Only auto-respond to new tickets
@@ -41,7 +82,7 @@ class ClaudeAIService:
             return False
 
         # Don't auto-respond if already assigned
-        if ticket.assigned_to:
+        if ticket.assigned_to_id:
             return False
 
         # Don't auto-respond if already has comments
@@ -49,78 +90,96 @@ class ClaudeAIService:
             return False
 
         # Only auto-respond to low/medium priority
-        if ticket.priority in ['high', 'critical']:
+        if ticket.priority in self.NO_AUTO_RESPONSE_PRIORITIES:
             return False
 
         return True
 
+    def auto_respond_candidates(self, queryset=None):
+        """
+        Tickets that should get an auto-response - the rules of
+        ``should_auto_respond()`` applied in bulk as a single query.
+        """
+        from django.db.models import Exists, OuterRef
+
+        queryset = Ticket.objects.all() if queryset is None else queryset
+        return queryset.filter(
+            status='open',
+            assigned_to__isnull=True,
+        ).exclude(
+            priority__in=self.NO_AUTO_RESPONSE_PRIORITIES
+        ).annotate(
+            has_comments=Exists(TicketComment.objects.filter(ticket=OuterRef('pk')))
+        ).filter(has_comments=False)
+
     def generate_auto_response(self, ticket):
-        """Generate an automatic response using Claude AI"""
+        """
+        Generate an automatic response using Claude AI.
+
+        Answers are cached by normalized ticket text and category (see
+        ``ai_cache``); only the greeting is personalized per customer.
+        """
         if not self.is_available():
             return None
 
-        # Get relevant knowledge articles
-        kb_articles = self.get_relevant_knowledge(ticket.title + ' ' + ticket.description)
-
-        # Build context from knowledge base
-        kb_context = ""
-        if kb_articles:
-            kb_context = "\n\nRelevante Wissensdatenbank-Artikel:\n"
-            for article in kb_articles:
-                kb_context += f"\n- {article.title}:\n{article.content[:500]}...\n"
-
-        # Build prompt for Claude
-        prompt = f"""Du bist ein hilfsbereiter Support-Agent für das ML Gruppe Helpdesk-System.
-
-Ein Kunde hat folgendes Ticket erstellt:
-
-Titel: {ticket.title}
-Beschreibung: {ticket.description}
-Priorität: {ticket.get_priority_display()}
-Kategorie: {ticket.category.name if ticket.category else 'Keine'}
-
-{kb_context}
-
-Aufgabe:
-- Analysiere das Problem des Kunden
-- Wenn das Problem einfach ist und du eine Lösung aus den Wissensdatenbank-Artikeln ableiten kannst, gib eine hilfreiche Antwort
-- Wenn das Problem komplex ist oder keine passende Lösung in der Wissensdatenbank ist, sage dem Kunden freundlich, dass ein Support-Agent sich um sein Anliegen kümmern wird
-- Schreibe auf Deutsch
-- Sei freundlich und professionell
-- Halte dich kurz (max. 200 Wörter)
+        cache_key = ai_cache.content_key(ticket.title, ticket.description, ticket.category_id)
+        cached = ai_cache.get_response(cache_key)
+        if cached is not None:
+            articles = KnowledgeArticle.objects.in_bulk(cached['kb_article_ids'])
+            return {
+                'text': ai_cache.personalize(cached['body'], ticket.created_by.first_name),
+                'is_solution': cached['is_solution'],
+                'kb_articles': [articles[pk] for pk in cached['kb_article_ids'] if pk in articles],
+                'cached': True,
+            }
 
-Antworte NICHT mit einer Lösung wenn:
-- Das Problem technisch komplex ist
-- Es um sensible Daten geht
-- Es um Abrechnungen oder Verträge geht
-- Du dir nicht sicher bist
+        # Get relevant knowledge articles; the prompt builder picks the best
+        # passages of them within the token budget
+        from .prompts import build_auto_response_prompt
 
-Beginne mit "Hallo {ticket.created_by.first_name}," und ende mit einer freundlichen Grußformel."""
+        candidates = list(self.get_relevant_knowledge(ticket.title + ' ' + ticket.description, limit=5))
+        prompt, prompt_info = build_auto_response_prompt(ticket, candidates, settings.CLAUDE_PROMPT_TOKEN_BUDGET)
+        kb_articles = [article for article in candidates if article.pk in prompt_info['article_ids']]
+        kb_versions = ai_cache.article_versions(article.pk for article in kb_articles)
 
         try:
-            message = self.client.messages.create(
+            start = time.monotonic()
+            message = self.client_manager.create_message(
                 model="claude-3-5-sonnet-20241022",
-                max_tokens=1024,
+                max_tokens=settings.CLAUDE_RESPONSE_MAX_TOKENS,
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
             )
+            logger.info(
+                f"Auto-response for {ticket.ticket_number}: "
+                f"{message.usage.input_tokens} input tokens (estimated {prompt_info['estimated_tokens']}, "
+                f"ticket {prompt_info['ticket_tokens']}, kb {prompt_info['kb_tokens']}), "
+                f"{message.usage.output_tokens} output tokens, {time.monotonic() - start:.2f}s"
+            )
 
-            response_text = message.content[0].text
+            body = ai_cache.strip_greeting(message.content[0].text)
 
             # Determine if this is a helpful answer or a "wait for agent" message
-            is_solution = any(word in response_text.lower() for word in [
+            is_solution = any(word in body.lower() for word in [
                 'lösung', 'können sie', 'versuchen sie', 'folgende schritte', 'hier ist'
             ])
 
+            ai_cache.store_response(cache_key, body, is_solution,
+                                    [article.pk for article in kb_articles], kb_versions)
+
             return {
-                'text': response_text,
+                'text': ai_cache.personalize(body, ticket.created_by.first_name),
                 'is_solution': is_solution,
-                'kb_articles': list(kb_articles)
+                'kb_articles': kb_articles,
+                'cached': False,
             }
 
+        except AIUnavailableError as e:
+            logger.warning(f"Claude AI unavailable: {e}")
+            return None
         except Exception as e:
-            print(f"Claude AI Error: {e}")
+            logger.error(f"Claude AI Error: {e}")
             return None
 
     def create_auto_comment(self, ticket):
@@ -128,6 +187,10 @@ Beginne mit "Hallo {ticket.created_by.first_name}," und ende mit einer freundlic
         if not self.should_auto_respond(ticket):
             return None
 
+        return self.post_auto_comment(ticket)
+
+    def post_auto_comment(self, ticket):
+        """Generate and post the auto-response without checking the rules again"""
         response_data = self.generate_auto_response(ticket)
 
         if not response_data:
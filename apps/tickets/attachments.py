@@ -0,0 +1,219 @@
+"""
+Streaming attachment uploads with content-addressed storage.
+
+``AttachmentUploadHandler`` replaces Django's upload handlers for the ticket
+forms. Each uploaded file is written chunk by chunk to a temporary file
+while its SHA-256 is computed; memory use per upload is one chunk. While
+streaming the handler
+
+- checks the extension against ``ALLOWED_EXTENSIONS``,
+- checks the first bytes (magic numbers) against the extension - the
+  content type is taken from the sniffed type, not from the browser,
+- aborts as soon as ``MAX_UPLOAD_SIZE`` is exceeded.
+
+Rejected files are dropped (the rest of their data is skipped) and reported
+in ``request.upload_errors``. ``store_attachments`` then moves the accepted
+files to ``ticket_attachments/sha256/<ab>/<cd>/<hash>``; identical files
+(e.g. the same screenshot attached twice) share one stored copy. Images get
+thumbnails in the background (see ``apps.tickets.thumbnails``).
+"""
+import hashlib
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .thumbnails import thumbnail_worker
+
+CHUNK_SIZE = 64 * 2 ** 10
+MAX_FILES = 10
+# Bytes needed to sniff the type (text needs a longer sample than magic numbers)
+SNIFF_BYTES = 4096
+STORAGE_PREFIX = 'ticket_attachments/sha256'
+
+# Extension -> (accepted magic numbers, content type); None = text
+SIGNATURES = {
+    'png': ((b'\x89PNG\r\n\x1a\n',), 'image/png'),
+    'jpg': ((b'\xff\xd8\xff',), 'image/jpeg'),
+    'jpeg': ((b'\xff\xd8\xff',), 'image/jpeg'),
+    'gif': ((b'GIF87a', b'GIF89a'), 'image/gif'),
+    'pdf': ((b'%PDF-',), 'application/pdf'),
+    'zip': ((b'PK\x03\x04', b'PK\x05\x06'), 'application/zip'),
+    'docx': ((b'PK\x03\x04',), 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    'doc': ((b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',), 'application/msword'),
+    'txt': (None, 'text/plain'),
+}
+
+
+def extension(name):
+    return os.path.splitext(name or '')[1].lower().lstrip('.')
+
+
+def sniff(ext, head, complete):
+    """
+    Check the first bytes of a file against its extension.
+
+    Returns the content type, None if the bytes do not match, or False if
+    more bytes are needed (only for text before ``complete``).
+    """
+    signatures, content_type = SIGNATURES.get(ext, ((), None))
+    if signatures is None:
+        if b'\x00' in head:
+            return None
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut at the end of the sample is fine
+            if complete or e.start < len(head) - 3:
+                return None
+        return content_type if complete or len(head) >= SNIFF_BYTES else False
+    if any(head.startswith(signature) for signature in signatures):
+        return content_type
+    if not complete and len(head) < max(len(signature) for signature in signatures):
+        return False
+    return None
+
+
+def storage_name(sha256):
+    return f'{STORAGE_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+class AttachmentUpload(TemporaryUploadedFile):
+    """Uploaded file on disk with its hash and sniffed content type; deleted on close unless stored"""
+
+    sha256 = None
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """Streams uploads to temporary files, hashing and validating them on the fly"""
+
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.count = 0
+        if request is not None:
+            request.upload_errors = []
+
+    def _reject(self, message):
+        if self.request is not None:
+            self.request.upload_errors.append(f'{self.file_name}: {message}')
+        raise SkipFile()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        # The parser closes ``self.file`` when a file is skipped - never the previous (accepted) one
+        self.__dict__.pop('file', None)
+        self.hasher = hashlib.sha256()
+        self.head = b''
+        self.sniffed = False
+        self.size = 0
+        self.ext = extension(file_name)
+
+        if self.ext not in settings.ALLOWED_EXTENSIONS or self.ext not in SIGNATURES:
+            self._reject('Dateityp nicht erlaubt')
+        if self.count >= MAX_FILES:
+            self._reject(f'Maximal {MAX_FILES} Dateien pro Upload')
+        if content_length and content_length > settings.MAX_UPLOAD_SIZE:
+            self._reject(f'Datei ist größer als {settings.MAX_UPLOAD_SIZE // 2 ** 20} MB')
+
+        self.file = AttachmentUpload(file_name, content_type, 0, charset, content_type_extra)
+        raise StopFutureHandlers()
+
+    def _sniff(self, complete):
+        content_type = sniff(self.ext, self.head, complete)
+        if content_type is None:
+            self._reject('Dateiinhalt passt nicht zum Dateityp')
+        if content_type:
+            self.file.content_type = content_type
+            self.sniffed = True
+            self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.MAX_UPLOAD_SIZE:
+            self._reject(f'Datei ist größer als {settings.MAX_UPLOAD_SIZE // 2 ** 20} MB')
+        if not self.sniffed:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            self._sniff(complete=False)
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.sniffed:
+            self._sniff(complete=True)
+        self.count += 1
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        return self.file
+
+
+def streaming_uploads(view):
+    """
+    Use ``AttachmentUploadHandler`` for the uploads of ``view``.
+
+    The upload handlers must be replaced before the CSRF check reads
+    ``request.POST``, hence the exempt/protect pair (see Django's
+    "Modifying upload handlers on the fly").
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        if request.method == 'POST':
+            request.upload_handlers = [AttachmentUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
+
+
+def store_file(upload):
+    """Move ``upload`` into content-addressed storage (once per content); returns the storage name"""
+    name = storage_name(upload.sha256)
+    if default_storage.exists(name):
+        upload.close()  # Same content already stored
+        return name
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        # Remote storage
+        default_storage.save(name, upload)
+        upload.close()
+        return name
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    upload.file.flush()
+    file_move_safe(upload.temporary_file_path(), path, allow_overwrite=True)
+    os.chmod(path, 0o644)
+    return name
+
+
+def store_attachments(ticket, uploads, user):
+    """Create ``TicketAttachment`` rows for the accepted ``uploads`` of ``ticket``"""
+    from .models import TicketAttachment
+
+    attachments = []
+    for upload in uploads:
+        if not isinstance(upload, AttachmentUpload) or upload.sha256 is None:
+            continue
+        attachments.append(TicketAttachment(
+            ticket=ticket,
+            filename=os.path.basename(upload.name)[:255],
+            file=store_file(upload),
+            content_type=upload.content_type,
+            size=upload.size,
+            sha256=upload.sha256,
+            uploaded_by=user,
+        ))
+    attachments = TicketAttachment.objects.bulk_create(attachments)
+    thumbnail_worker.submit(attachments)
+    return attachments
@@ -0,0 +1,282 @@
+"""
+Category and priority prediction for new tickets.
+
+A local linear model is the fast path: hashed word features of title and
+description (the same terms as the similar-ticket index) feed one softmax
+regression per target. It is trained offline on handled tickets with
+``manage.py train_ticket_classifier`` and stored as a NumPy ``.npz`` file
+(``TICKET_CLASSIFIER_PATH``); prediction is a sparse dot product and takes
+a few microseconds.
+
+Predictions of a trained model below ``TICKET_CLASSIFIER_MIN_CONFIDENCE``
+can be delegated to Claude (``TICKET_CLASSIFIER_AI_FALLBACK``, off by
+default: the call blocks the request that creates the ticket).
+"""
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from .similarity import ticket_terms
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 16
+
+
+def featurize(title, description):
+    """Sparse L2-normalized feature vector as ``(indices, values)``"""
+    features = {}
+    for term, count in ticket_terms(title, description).items():
+        index = zlib.crc32(term.encode('utf-8')) % N_FEATURES
+        features[index] = features.get(index, 0.0) + count
+    indices = np.fromiter(features.keys(), dtype=np.int32, count=len(features))
+    values = 1.0 + np.log(np.fromiter(features.values(), dtype=np.float32, count=len(features)))
+    norm = np.linalg.norm(values)
+    return indices, (values / norm if norm else values).astype(np.float32)
+
+
+class SoftmaxModel:
+    """Multinomial logistic regression over hashed sparse features"""
+
+    def __init__(self, labels, weights=None, bias=None):
+        self.labels = list(labels)
+        self.weights = weights if weights is not None else np.zeros((len(labels), N_FEATURES), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(labels), dtype=np.float32)
+
+    def predict_proba(self, indices, values):
+        logits = self.weights[:, indices] @ values + self.bias
+        logits -= logits.max()
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum()
+
+    def predict(self, indices, values):
+        """Return ``(label, probability)`` of the most likely class"""
+        probabilities = self.predict_proba(indices, values)
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    @classmethod
+    def fit(cls, samples, targets, epochs=30, learning_rate=0.5, l2=1e-4, batch_size=256, seed=0):
+        """
+        Train on ``samples`` (list of ``featurize()`` results) and ``targets``.
+
+        Only the hashed columns that occur in the training data are
+        materialized, as dense mini-batches over that compact vocabulary.
+        """
+        labels = sorted(set(targets), key=str)
+        label_index = {label: i for i, label in enumerate(labels)}
+        Y = np.eye(len(labels), dtype=np.float32)[[label_index[target] for target in targets]]
+
+        columns = np.unique(np.concatenate([indices for indices, _ in samples]))
+        compact = [(np.searchsorted(columns, indices), values) for indices, values in samples]
+
+        weights = np.zeros((len(labels), len(columns)), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(samples))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                X = np.zeros((len(batch), len(columns)), dtype=np.float32)
+                for row, sample in enumerate(batch):
+                    indices, values = compact[sample]
+                    X[row, indices] = values
+
+                logits = X @ weights.T + bias
+                logits -= logits.max(axis=1, keepdims=True)
+                probabilities = np.exp(logits)
+                probabilities /= probabilities.sum(axis=1, keepdims=True)
+                error = (probabilities - Y[batch]) / len(batch)
+                weights -= learning_rate * (error.T @ X + l2 * weights)
+                bias -= learning_rate * error.sum(axis=0)
+
+        full_weights = np.zeros((len(labels), N_FEATURES), dtype=np.float32)
+        full_weights[:, columns] = weights
+        return cls(labels, full_weights, bias)
+
+
+class TicketClassifier:
+    """Loads the trained models (reloading after retraining) and classifies tickets"""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.category_model = None
+        self.priority_model = None
+        self.meta = {}
+
+    @property
+    def path(self):
+        return self._path or settings.TICKET_CLASSIFIER_PATH
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return True
+
+        with self._lock:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.category_model = SoftmaxModel(
+                    data['category_labels'].tolist(), data['category_weights'], data['category_bias'])
+                self.priority_model = SoftmaxModel(
+                    data['priority_labels'].tolist(), data['priority_weights'], data['priority_bias'])
+                self.meta = json.loads(str(data['meta']))
+            self._mtime = mtime
+        logger.info(f"Ticket classifier loaded from {self.path}")
+        return True
+
+    def is_available(self):
+        return self._load()
+
+    def save(self, category_model, priority_model, meta):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f'{self.path}.tmp.npz'
+        np.savez_compressed(
+            tmp,
+            category_labels=np.array(category_model.labels, dtype=np.int64),
+            category_weights=category_model.weights,
+            category_bias=category_model.bias,
+            priority_labels=np.array(priority_model.labels),
+            priority_weights=priority_model.weights,
+            priority_bias=priority_model.bias,
+            meta=np.array(json.dumps(meta)),
+        )
+        os.replace(tmp, self.path)
+
+    def predict(self, title, description):
+        """
+        Local prediction only. Returns a dictionary with ``category_id``,
+        ``category_confidence``, ``priority``, ``priority_confidence`` and
+        ``source`` ('model'), or None if no model was trained yet.
+        """
+        if not self._load():
+            return None
+        indices, values = featurize(title, description)
+        if not len(indices):
+            return None
+        category_id, category_confidence = self.category_model.predict(indices, values)
+        priority, priority_confidence = self.priority_model.predict(indices, values)
+        return {
+            'category_id': category_id,
+            'category_confidence': category_confidence,
+            'priority': priority,
+            'priority_confidence': priority_confidence,
+            'source': 'model',
+        }
+
+    def classify(self, title, description, use_ai=True, min_confidence=None):
+        """
+        Predict category and priority; low-confidence predictions of the
+        model are asked from Claude if ``use_ai``, the fallback is enabled
+        (``TICKET_CLASSIFIER_AI_FALLBACK``) and the AI service is available.
+        Without a trained model nothing is predicted and Claude is not asked.
+
+        Fields that are still not confident afterwards are set to None.
+        """
+        min_confidence = settings.TICKET_CLASSIFIER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        prediction = self.predict(title, description)
+        result = prediction or {
+            'category_id': None, 'category_confidence': 0.0,
+            'priority': None, 'priority_confidence': 0.0, 'source': None,
+        }
+
+        uncertain = (result['category_confidence'] < min_confidence
+                     or result['priority_confidence'] < min_confidence)
+        if uncertain and use_ai and prediction is not None and settings.TICKET_CLASSIFIER_AI_FALLBACK:
+            ai_result = self._classify_with_ai(title, description)
+            if ai_result:
+                for field in ('category', 'priority'):
+                    if result[f'{field}_confidence'] < min_confidence and ai_result.get(field) is not None:
+                        key = 'category_id' if field == 'category' else 'priority'
+                        result[key] = ai_result[field]
+                        result[f'{field}_confidence'] = min_confidence
+                        result['source'] = 'ai'
+
+        if result['category_confidence'] < min_confidence:
+            result['category_id'] = None
+        if result['priority_confidence'] < min_confidence:
+            result['priority'] = None
+        return result
+
+    def _classify_with_ai(self, title, description):
+        from .ai_client import AIUnavailableError
+        from .ai_service import ai_service
+        from .models import Category, Ticket
+
+        if not ai_service.is_available():
+            return None
+
+        categories = dict(Category.objects.filter(is_active=True).values_list('name', 'id'))
+        priorities = [key for key, _ in Ticket.PRIORITY_CHOICES]
+        prompt = f"""Ordne das folgende Support-Ticket ein.
+
+Titel: {title}
+Beschreibung: {description}
+
+Kategorien: {', '.join(categories) or 'keine'}
+Prioritäten: {', '.join(priorities)} (critical = Unterricht/Betrieb komplett blockiert, low = Frage oder Wunsch)
+
+Antworte nur mit JSON: {{"category": "<Kategorie oder null>", "priority": "<Priorität>"}}"""
+
+        try:
+            message = ai_service.client_manager.create_message(
+                timeout=5,
+                model="claude-3-5-sonnet-20241022",
+                max_tokens=100,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            match = re.search(r'\{.*\}', message.content[0].text, re.DOTALL)
+            answer = json.loads(match.group(0)) if match else {}
+        except (AIUnavailableError, ValueError) as e:
+            logger.warning(f"AI classification failed: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"AI classification error: {e}")
+            return None
+
+        if not isinstance(answer, dict):
+            return None
+        priority = answer.get('priority')
+        return {
+            'category': categories.get(answer.get('category')),
+            'priority': priority if priority in priorities else None,
+        }
+
+    def apply(self, ticket, use_ai=True):
+        """
+        Set confidently predicted category and priority on an unsaved ticket.
+
+        Returns a list of ``(label, old value, new value)`` for the changed
+        fields, e.g. to document the change on the ticket.
+        """
+        from .models import Category
+
+        result = self.classify(ticket.title, ticket.description, use_ai=use_ai)
+        changes = []
+
+        if result['category_id'] is not None and result['category_id'] != ticket.category_id:
+            category = Category.objects.filter(pk=result['category_id'], is_active=True).first()
+            if category is not None:
+                changes.append(('Kategorie', ticket.category.name if ticket.category_id else 'Keine', category.name))
+                ticket.category = category
+
+        if result['priority'] is not None and result['priority'] != ticket.priority:
+            old_priority = ticket.get_priority_display()
+            ticket.priority = result['priority']
+            changes.append(('Priorität', old_priority, ticket.get_priority_display()))
+
+        return changes
+
+
+# Create a global instance
+ticket_classifier = TicketClassifier()
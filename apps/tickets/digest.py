@@ -0,0 +1,135 @@
+"""
+Digest emails for agent notifications.
+
+Agents choose in their profile whether new tickets are mailed immediately,
+every N minutes or hourly (``User.notification_mode``). For the digest modes
+``notify_agents_new_ticket`` only stores a ``NotificationEvent``;
+``send_due_digests`` (run every minute via ``manage.py send_notification_digests``
+or the Celery task, see ``CELERY_BEAT_SCHEDULE``) collects the pending events per agent and sends one email
+per agent once the oldest pending event is older than the agent's window.
+All digests of a run share one SMTP connection.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Sent events are kept this long (e.g. to look up what an agent was sent)
+KEEP_SENT_DAYS = 7
+
+
+def queue_events(recipients, ticket, kind='new_ticket'):
+    """Store a pending notification about ``ticket`` for each of ``recipients``"""
+    from .models import NotificationEvent
+
+    NotificationEvent.objects.bulk_create([
+        NotificationEvent(recipient=recipient, ticket=ticket, kind=kind) for recipient in recipients
+    ])
+
+
+def render_digest(recipient, tickets):
+    """Subject and body of the digest email for ``recipient``"""
+    site_url = settings.SITE_URL.rstrip('/')
+    count = len(tickets)
+    subject = (f'Neues Ticket: {tickets[0].ticket_number} - {tickets[0].title}' if count == 1
+               else f'{count} neue Tickets im Helpdesk')
+
+    lines = [f'Hallo {recipient.first_name},', '',
+             'seit der letzten Zusammenfassung wurde ein neues Support-Ticket erstellt:' if count == 1
+             else f'seit der letzten Zusammenfassung wurden {count} neue Support-Tickets erstellt:', '']
+    for ticket in tickets:
+        lines.append(f'{ticket.ticket_number} [{ticket.get_priority_display()}] {ticket.title}')
+        details = [
+            f'Kategorie: {ticket.category.name if ticket.category else "Keine"}',
+            f'Erstellt von: {ticket.created_by.full_name}',
+            f'Erstellt am: {timezone.localtime(ticket.created_at).strftime("%d.%m.%Y %H:%M")}',
+        ]
+        if ticket.status != 'open' or ticket.assigned_to_id:
+            details.append(f'Status: {ticket.get_status_display()}'
+                           + (f' ({ticket.assigned_to.full_name})' if ticket.assigned_to_id else ''))
+        lines.append('  ' + ' | '.join(details))
+        lines.append(f'  {site_url}/tickets/{ticket.pk}/')
+        lines.append('')
+
+    lines += [
+        'Die Häufigkeit dieser Benachrichtigungen können Sie in Ihrem Profil ändern.',
+        '',
+        '---',
+        'Diese Email wurde automatisch vom ML Gruppe Helpdesk System gesendet.',
+    ]
+    return subject, '\n'.join(lines)
+
+
+def send_due_digests(now=None, connection=None):
+    """
+    Send one digest per agent whose window is over.
+
+    Returns ``{'digests': n, 'events': n, 'failed': n}``. Events of failed
+    emails stay pending and are retried on the next run. The pending events
+    are locked until they are marked as sent, so an overlapping run (slow
+    SMTP server, second scheduler) skips them instead of mailing them twice.
+    """
+    with transaction.atomic():
+        return _send_due_digests(now or timezone.now(), connection)
+
+
+def _send_due_digests(now, connection):
+    from .models import NotificationEvent
+
+    locked = list(NotificationEvent.objects.filter(sent_at__isnull=True)
+                  .select_for_update(skip_locked=True).values_list('pk', flat=True))
+    pending = (NotificationEvent.objects.filter(pk__in=locked)
+               .select_related('recipient', 'ticket__category', 'ticket__created_by', 'ticket__assigned_to')
+               .order_by('recipient_id', 'created_at'))
+
+    by_recipient = {}
+    for event in pending.iterator(chunk_size=2000):
+        by_recipient.setdefault(event.recipient_id, []).append(event)
+
+    batch = []  # (email, event ids)
+    for events in by_recipient.values():
+        recipient = events[0].recipient
+        if not recipient.is_active or not recipient.email:
+            NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).update(sent_at=now)
+            continue
+        # The window starts with the oldest pending event
+        if events[0].created_at > now - timedelta(minutes=recipient.digest_minutes):
+            continue
+
+        tickets = list({event.ticket_id: event.ticket for event in events}.values())
+        subject, body = render_digest(recipient, tickets)
+        email = EmailMessage(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL,
+                             to=[recipient.email])
+        batch.append((email, [event.pk for event in events]))
+
+    stats = {'digests': 0, 'events': 0, 'failed': 0}
+    if not batch:
+        return stats
+
+    connection = connection or get_connection()
+    sent_ids = []
+    try:
+        connection.open()
+        for email, event_ids in batch:
+            email.connection = connection
+            try:
+                email.send()
+            except Exception as e:
+                logger.error(f"Digest to {email.to[0]} failed: {e}")
+                stats['failed'] += 1
+                continue
+            sent_ids.extend(event_ids)
+            stats['digests'] += 1
+    finally:
+        connection.close()
+
+    NotificationEvent.objects.filter(pk__in=sent_ids).update(sent_at=now)
+    NotificationEvent.objects.filter(sent_at__lt=now - timedelta(days=KEEP_SENT_DAYS)).delete()
+    stats['events'] = len(sent_ids)
+    logger.info(f"Notification digests: {stats}")
+    return stats
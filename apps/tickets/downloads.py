@@ -0,0 +1,159 @@
+"""
+Serving ticket attachments.
+
+The permission check happens in Django; the byte transfer does not need a
+Python worker:
+
+- ``ATTACHMENT_SENDFILE = 'nginx'``: the response only carries an
+  ``X-Accel-Redirect`` header pointing to an ``internal`` nginx location
+  (``ATTACHMENT_SENDFILE_PREFIX``), nginx sends the file (including ranges),
+- ``'apache'``: the same with ``X-Sendfile`` and the absolute path
+  (mod_xsendfile),
+- otherwise a ``FileResponse``. WSGI servers with ``wsgi.file_wrapper``
+  (gunicorn) send it with ``sendfile()`` - bounded by ``Content-Length``,
+  which also works for ranges since the file is positioned at the start.
+
+ETag (the content hash), Last-Modified and Cache-Control are set in all
+cases; conditional requests are answered with 304 and single byte ranges
+(``Range``/``If-Range``) with 206 by Django in the fallback mode.
+Thumbnails and previews of images (``variant``) are served the same way.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+from .thumbnails import VARIANTS, derivative_name
+
+# Shown in the browser instead of downloaded
+INLINE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'application/pdf', 'text/plain'}
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """File-like view of ``length`` bytes of ``file`` starting at its current position"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # Lets wsgi.file_wrapper use sendfile() from the current offset
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range. Returns ``(start, end)`` (inclusive),
+    None if the header should be ignored or ``False`` if unsatisfiable.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None  # Missing, malformed or multiple ranges: send everything
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _etag(attachment, variant=None):
+    etag = attachment.sha256 or f'{attachment.pk}-{attachment.size}'
+    return quote_etag(f'{etag}-{variant}' if variant else etag)
+
+
+def _set_common_headers(response, content_type, filename, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Attachments never change: cache in the browser, not in shared proxies
+    patch_cache_control(response, private=True, max_age=CACHE_MAX_AGE)
+    disposition = content_disposition_header(content_type not in INLINE_TYPES, filename)
+    if disposition:
+        response['Content-Disposition'] = disposition
+    return response
+
+
+def serve_attachment(request, attachment, variant=None):
+    """
+    Response for downloading ``attachment`` or one of its image derivatives
+    (``'thumb'``, ``'preview'``); permissions must be checked before.
+    """
+    if not attachment.file or (variant and variant not in VARIANTS):
+        raise Http404('Datei nicht gefunden')
+
+    name = attachment.file.name
+    content_type = attachment.content_type or 'application/octet-stream'
+    filename = attachment.filename
+    if variant:
+        name = derivative_name(name, variant)
+        content_type = 'image/jpeg'
+        filename = f'{os.path.splitext(filename)[0]}.{variant}.jpg'
+
+    etag = _etag(attachment, variant)
+    last_modified = int(attachment.uploaded_at.timestamp())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _set_common_headers(not_modified, content_type, filename, etag, last_modified)
+
+    storage = attachment.file.storage
+    backend = settings.ATTACHMENT_SENDFILE
+    if backend in ('nginx', 'apache'):
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            prefix = settings.ATTACHMENT_SENDFILE_PREFIX.rstrip('/')
+            response['X-Accel-Redirect'] = f'{prefix}/{quote(name)}'
+        else:
+            response['X-Sendfile'] = storage.path(name)
+        return _set_common_headers(response, content_type, filename, etag, last_modified)
+
+    try:
+        file = storage.open(name, 'rb')
+    except FileNotFoundError:
+        raise Http404('Datei nicht gefunden')
+    size = storage.size(name)
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _set_common_headers(response, content_type, filename, etag, last_modified)
+
+    if byte_range:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeFile(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = str(size)
+    return _set_common_headers(response, content_type, filename, etag, last_modified)
@@ -0,0 +1,100 @@
+"""
+Email threading via the ``EmailMessageIndex`` table.
+
+Every mail sent for a ticket gets its own Message-ID, which is stored with
+the ticket id; inbound mails store their Message-ID and References. A reply
+is then resolved with one query on the unique ``message_id`` index, no
+matter which mail of the conversation it answers.
+
+Mails to the customer are indexed as ``outbound``, notifications to agents
+as ``internal``, so an agent answering a notification by mail adds an
+internal note instead of a comment the customer sees.
+"""
+import logging
+from email.utils import make_msgid
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+def message_id_domain():
+    """Domain part for generated Message-IDs (sender domain, else the site host)"""
+    sender = settings.DEFAULT_FROM_EMAIL or ''
+    if '@' in sender:
+        return sender.rsplit('@', 1)[1].strip('> ')
+    return urlparse(settings.SITE_URL).hostname or 'helpdesk.local'
+
+
+def resolve_tickets(message_ids):
+    """Map the known ones of ``message_ids`` to ``(ticket id, direction)``"""
+    from .models import EmailMessageIndex
+
+    message_ids = {message_id for message_id in message_ids if message_id}
+    if not message_ids:
+        return {}
+    return {
+        message_id: (ticket_id, direction)
+        for message_id, ticket_id, direction in EmailMessageIndex.objects.filter(message_id__in=message_ids)
+        .values_list('message_id', 'ticket_id', 'direction')
+    }
+
+
+def received_message_ids(message_ids):
+    """Those of ``message_ids`` that were already ingested"""
+    from .models import EmailMessageIndex
+
+    return set(EmailMessageIndex.objects.filter(message_id__in=set(message_ids), direction='inbound')
+               .values_list('message_id', flat=True))
+
+
+def record_messages(entries):
+    """
+    Store ``(message_id, ticket_id, direction)`` entries.
+
+    Message-IDs that are already indexed keep their ticket; a Message-ID that
+    was only known as a reference is marked inbound once the mail arrives.
+    """
+    from .models import EmailMessageIndex
+
+    objects = {}
+    for message_id, ticket_id, direction in entries:
+        if message_id and (message_id not in objects or objects[message_id].direction == 'reference'):
+            objects[message_id] = EmailMessageIndex(message_id=message_id[:255], ticket_id=ticket_id,
+                                                    direction=direction)
+    if not objects:
+        return
+    EmailMessageIndex.objects.bulk_create(objects.values(), batch_size=1000, ignore_conflicts=True)
+
+    inbound = [message_id for message_id, obj in objects.items() if obj.direction == 'inbound']
+    if inbound:
+        EmailMessageIndex.objects.filter(message_id__in=inbound, direction='reference').update(direction='inbound')
+
+
+def send_ticket_mail(ticket, subject, message, recipient_list, fail_silently=False, internal=False):
+    """
+    Send a mail about ``ticket`` and index its Message-ID.
+
+    The mail continues the ticket's conversation (In-Reply-To/References of the
+    original request), so replies land on the ticket even from mail clients
+    that drop the References chain. ``internal`` marks mails to agents only:
+    replies to them become internal notes. Returns the number of sent mails.
+    """
+    message_id = make_msgid(domain=message_id_domain())
+    headers = {'Message-ID': message_id}
+    if ticket.email_thread_id:
+        headers['In-Reply-To'] = ticket.email_thread_id
+        headers['References'] = ticket.email_thread_id
+
+    mail = EmailMessage(subject=subject, body=message, from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=recipient_list, headers=headers)
+    sent = mail.send(fail_silently=fail_silently)
+    if sent:
+        try:
+            record_messages([(message_id, ticket.pk, 'internal' if internal else 'outbound')])
+        except Exception as e:
+            # The mail is out; a missing index entry only costs the threading of replies
+            logger.error(f"Cannot index Message-ID of ticket {ticket.pk}: {e}")
+    return sent
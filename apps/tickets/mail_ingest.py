@@ -0,0 +1,568 @@
+"""
+Inbound email ingestion: emails become tickets, replies become comments.
+
+The worker polls the mailbox incrementally by IMAP UID. The highest
+processed UID (and the folder's UIDVALIDITY) is stored in ``MailboxState``
+in the same transaction as the created tickets/comments, so a crash never
+loses or duplicates mail. Per batch:
+
+1. ``UID SEARCH`` for UIDs above the high-water mark, ``UID FETCH`` in batches
+   (``BODY.PEEK[]`` - messages are not marked as read)
+2. MIME parsing in a process pool (``parse_message``)
+3. threading onto tickets with a few indexed lookups for the whole batch:
+   ``In-Reply-To``/``References`` against the Message-ID index
+   (``apps.tickets.email_threading``), then the ticket number in the subject
+   (only accepted from the ticket's customer)
+4. ``bulk_create`` of the new tickets and comments; their Message-IDs and
+   References are added to the index. Agents are notified about the new
+   tickets after the commit.
+
+The From header is not authenticated. Mails from an agent's address are
+therefore only accepted as replies to a mail the helpdesk sent (its random
+Message-ID is the proof); anything else from an agent address is skipped.
+Replies to agent notifications become internal notes.
+Unknown senders only get a customer account if their domain is listed in
+``MAIL_CUSTOMER_DOMAINS``, otherwise their mail is skipped as well.
+
+``MaildirMailbox`` is a local stand-in for the IMAP server (a maildir with
+a persistent UID list), used for offline runs and ``benchmark_mail_ingestion``.
+"""
+import email
+import email.policy
+import imaplib
+import json
+import logging
+import mailbox
+import random
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import getaddresses, parseaddr, parsedate_to_datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+AGENT_ROLES = ('support_agent', 'admin')
+# Batches smaller than this are parsed in-process (pool overhead is not worth it)
+MIN_POOL_BATCH = 20
+
+_TICKET_NUMBER_RE = re.compile(r'\bTK-\d{4}-\d{5}\b')
+_FETCH_UID_RE = re.compile(rb'UID (\d+)')
+_REPLY_SEPARATOR_RE = re.compile(
+    r'^\s*(Am .{1,200} schrieb .{1,200}:|On .{1,200} wrote:|-{2,}\s*(Ursprüngliche Nachricht|Original Message|'
+    r'Originalnachricht)\s*-{2,}|_{20,}|(Von|From):\s.+)\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+# Mailboxes
+
+class ImapMailbox:
+    """Read-only access to one IMAP folder by UID"""
+
+    def __init__(self, host, port, username, password, folder='INBOX', timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.folder = folder
+        self.timeout = timeout
+        self.conn = None
+
+    @property
+    def name(self):
+        return f'imap://{self.username}@{self.host}/{self.folder}'
+
+    def open(self):
+        """Connect and select the folder; returns the folder's UIDVALIDITY"""
+        self.conn = imaplib.IMAP4_SSL(self.host, self.port, timeout=self.timeout)
+        self.conn.login(self.username, self.password)
+        typ, _ = self.conn.select(self.folder, readonly=True)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f'Cannot select {self.folder}')
+        _, data = self.conn.response('UIDVALIDITY')
+        return int(data[0])
+
+    def search(self, after_uid):
+        """UIDs greater than ``after_uid``, ascending"""
+        typ, data = self.conn.uid('SEARCH', None, f'UID {after_uid + 1}:*')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f'UID SEARCH failed: {data}')
+        # "n:*" always matches the last message, even if its UID is lower
+        return sorted(uid for uid in map(int, data[0].split()) if uid > after_uid)
+
+    def fetch(self, uids):
+        """Return ``[(uid, raw_message_bytes), ...]``"""
+        typ, data = self.conn.uid('FETCH', ','.join(map(str, uids)), '(UID BODY.PEEK[])')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f'UID FETCH failed: {data}')
+        messages = []
+        for item in data:
+            if isinstance(item, tuple):
+                match = _FETCH_UID_RE.search(item[0])
+                if match:
+                    messages.append((int(match.group(1)), item[1]))
+        return sorted(messages)
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+            self.conn = None
+
+
+class MaildirMailbox:
+    """
+    IMAP stand-in backed by a local maildir.
+
+    UIDs are assigned in delivery order and persisted in ``.uidlist.json``
+    (like Dovecot's ``dovecot-uidlist``), so they are stable across runs.
+    """
+
+    UIDLIST = '.uidlist.json'
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.maildir = None
+        self.uids = {}
+
+    @property
+    def name(self):
+        return f'maildir://{self.path.resolve()}'
+
+    def open(self):
+        self.maildir = mailbox.Maildir(self.path, create=True)
+        uidlist_path = self.path / self.UIDLIST
+        if uidlist_path.exists():
+            uidlist = json.loads(uidlist_path.read_text())
+        else:
+            uidlist = {'uid_validity': int(time.time()), 'next_uid': 1, 'uids': {}}
+
+        known = uidlist['uids']
+        # Maildir keys start with the delivery timestamp
+        for key in sorted(set(self.maildir.keys()) - set(known)):
+            known[key] = uidlist['next_uid']
+            uidlist['next_uid'] += 1
+        uidlist_path.write_text(json.dumps(uidlist))
+
+        self.uids = {uid: key for key, uid in known.items()}
+        return uidlist['uid_validity']
+
+    def search(self, after_uid):
+        return sorted(uid for uid in self.uids if uid > after_uid)
+
+    def fetch(self, uids):
+        messages = []
+        for uid in uids:
+            try:
+                messages.append((uid, self.maildir.get_bytes(self.uids[uid])))
+            except KeyError:
+                pass  # Deleted in the meantime
+        return messages
+
+    def close(self):
+        self.maildir = None
+
+
+def mailbox_from_settings():
+    return ImapMailbox(settings.IMAP_HOST, settings.IMAP_PORT, settings.IMAP_USERNAME,
+                       settings.IMAP_PASSWORD, folder=settings.IMAP_FOLDER)
+
+
+# Parsing (runs in worker processes - no database access)
+
+def _message_ids(value):
+    return re.findall(r'<[^<>\s]+>', value or '')
+
+
+def _strip_quoted(text):
+    """Remove the quoted previous conversation from a reply"""
+    match = _REPLY_SEPARATOR_RE.search(text)
+    if match and match.start() > 0:
+        text = text[:match.start()]
+    lines = [line for line in text.splitlines() if not line.startswith('>')]
+    return '\n'.join(lines).strip()
+
+
+def parse_message(uid, raw, uid_validity=0):
+    """
+    Parse a raw email into a plain dictionary (picklable, for the process pool).
+
+    Returns None for messages that should be ignored (auto-replies, bounces).
+    """
+    from apps.knowledge.text import html_to_text
+
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+
+    auto_submitted = str(message.get('Auto-Submitted', 'no')).lower()
+    if auto_submitted != 'no' or str(message.get('Precedence', '')).lower() in ('bulk', 'junk', 'auto_reply'):
+        return None
+
+    from_name, from_email = parseaddr(str(message.get('From', '')))
+    if not from_email or '@' not in from_email:
+        return None
+
+    body = ''
+    part = message.get_body(preferencelist=('plain', 'html'))
+    if part is not None:
+        try:
+            content = part.get_content()
+        except (LookupError, UnicodeDecodeError):
+            content = part.get_payload(decode=True).decode('utf-8', errors='replace')
+        body = html_to_text(content) if part.get_content_type() == 'text/html' else content
+
+    in_reply_to = _message_ids(str(message.get('In-Reply-To', '')))
+    references = _message_ids(str(message.get('References', '')))
+
+    try:
+        date = parsedate_to_datetime(str(message.get('Date')))
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        date = None
+
+    message_ids = _message_ids(str(message.get('Message-ID', '')))
+    return {
+        'uid': uid,
+        'message_id': message_ids[0] if message_ids else f'<{uid}.{uid_validity}@helpdesk.invalid>',
+        # Nearest ancestor first
+        'thread_ids': list(dict.fromkeys(in_reply_to + references[::-1])),
+        'from_email': from_email.strip(),
+        'from_name': from_name.strip(),
+        'to': [address for _, address in getaddresses([str(message.get('To', ''))]) if address],
+        'subject': ' '.join(str(message.get('Subject', '')).split()),
+        'body': body.strip(),
+        'reply_body': _strip_quoted(body),
+        'date': date,
+    }
+
+
+# Ingestion (database)
+
+def _allocate_ticket_numbers(count):
+    """Unique ticket numbers for ``count`` new tickets with one lookup per round"""
+    from .models import Ticket
+
+    year = timezone.now().year
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {f'TK-{year}-{random.randint(10000, 99999)}' for _ in range(2 * (count - len(numbers)))}
+        candidates -= numbers
+        taken = set(Ticket.objects.filter(ticket_number__in=candidates).values_list('ticket_number', flat=True))
+        numbers |= candidates - taken
+    return list(numbers)[:count]
+
+
+def _split_name(name, address):
+    parts = name.replace('"', '').split()
+    if len(parts) >= 2:
+        return ' '.join(parts[:-1]), parts[-1]
+    local = address.split('@')[0]
+    pieces = [piece for piece in re.split(r'[._\-]+', local) if piece]
+    if len(pieces) >= 2:
+        return pieces[0].capitalize(), pieces[-1].capitalize()
+    return (parts[0] if parts else local), '-'
+
+
+def may_create_customer(address):
+    """Whether an unknown sender gets a customer account (``MAIL_CUSTOMER_DOMAINS``, subdomains included)"""
+    domains = settings.MAIL_CUSTOMER_DOMAINS
+    if '*' in domains:
+        return True
+    domain = address.rsplit('@', 1)[-1].lower()
+    return any(domain == allowed or domain.endswith(f'.{allowed}') for allowed in domains)
+
+
+def _resolve_senders(messages):
+    """
+    Map lowercased sender address to user. Unknown senders become customers
+    if their domain is allowed; the others are missing from the result.
+    Addresses are matched case-insensitively, so an agent stored as
+    ``Max.Muster@…`` is found and no duplicate account is created.
+    """
+    from django.db.models.functions import Lower
+    from apps.accounts.models import User
+
+    addresses = {message['from_email'].lower() for message in messages}
+    users = {
+        user.email.lower(): user
+        for user in User.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=addresses)
+    }
+
+    for message in messages:
+        address = message['from_email'].lower()
+        if address not in users and may_create_customer(address):
+            first_name, last_name = _split_name(message['from_name'], address)
+            users[address] = User.objects.create_customer(first_name=first_name, last_name=last_name,
+                                                          email=address)
+    return users
+
+
+def ingest_messages(messages):
+    """
+    Store parsed messages as tickets and comments. Must run in a transaction.
+
+    Returns ``{'tickets': n, 'comments': n, 'duplicates': n, 'rejected': n}``.
+    """
+    from apps.accounts.models import User
+    from .classifier import ticket_classifier
+    from .email_threading import received_message_ids, record_messages, resolve_tickets
+    from .models import Ticket, TicketComment
+    from .teams import teams_notifier
+    from .views import notify_agents_new_ticket
+
+    stats = {'tickets': 0, 'comments': 0, 'duplicates': 0, 'rejected': 0}
+
+    # Skip messages that were already ingested (e.g. after UIDVALIDITY changed)
+    seen = received_message_ids(message['message_id'] for message in messages)
+    unique = []
+    for message in messages:
+        if message['message_id'] in seen:
+            stats['duplicates'] += 1
+        else:
+            seen.add(message['message_id'])
+            unique.append(message)
+    if not unique:
+        return stats
+
+    # Thread lookups for the whole batch
+    thread_tickets = resolve_tickets(thread_id for message in unique for thread_id in message['thread_ids'])
+
+    subject_numbers = {number for message in unique for number in _TICKET_NUMBER_RE.findall(message['subject'])}
+    numbered_tickets = {
+        number: (ticket_id, created_by_id)
+        for number, ticket_id, created_by_id in Ticket.objects.filter(ticket_number__in=subject_numbers)
+        .values_list('ticket_number', 'id', 'created_by_id')
+    }
+
+    senders = _resolve_senders(unique)
+
+    # Decide per message: comment on an existing ticket, on a ticket created
+    # earlier in this batch, or a new ticket
+    new_tickets = []      # Ticket instances
+    new_messages = []     # (message, ('ticket', id) / ('new', index)) for the index
+    comments = []         # (message, ticket_id or new ticket index, internal)
+    batch_threads = {}    # message_id -> ('ticket', id) / ('new', index)
+    for message in unique:
+        address = message['from_email'].lower()
+        sender = senders.get(address)
+        if sender is None:
+            logger.info(f"Mail {message['message_id']} from unknown sender {address} skipped")
+            stats['rejected'] += 1
+            continue
+
+        target = None
+        internal = False
+        if sender.role in AGENT_ROLES:
+            # Only a reply to a mail the helpdesk sent proves the agent address was not forged
+            for thread_id in message['thread_ids']:
+                ticket_id, direction = thread_tickets.get(thread_id, (None, None))
+                if direction in ('outbound', 'internal'):
+                    target = ('ticket', ticket_id)
+                    internal = direction == 'internal'
+                    break
+            if target is None:
+                logger.warning(f"Mail {message['message_id']} from agent address {address} is not a reply "
+                               f"to a helpdesk mail, skipped")
+                stats['rejected'] += 1
+                continue
+        else:
+            for thread_id in message['thread_ids']:
+                if thread_id in thread_tickets:
+                    target = ('ticket', thread_tickets[thread_id][0])
+                    break
+                if thread_id in batch_threads:
+                    target = batch_threads[thread_id]
+                    break
+            if target is None:
+                for number in _TICKET_NUMBER_RE.findall(message['subject']):
+                    ticket_id, created_by_id = numbered_tickets.get(number, (None, None))
+                    if ticket_id and created_by_id == sender.pk:
+                        target = ('ticket', ticket_id)
+                        break
+
+        if target is None:
+            ticket = Ticket(
+                title=(message['subject'] or 'Anfrage per E-Mail')[:200],
+                description=message['body'] or '(Kein Inhalt)',
+                created_by=sender,
+                email_thread_id=message['message_id'],
+            )
+            ticket_classifier.apply(ticket, use_ai=False)
+            new_tickets.append(ticket)
+            target = ('new', len(new_tickets) - 1)
+        else:
+            comments.append((message, target, internal))
+        batch_threads[message['message_id']] = target
+        new_messages.append((message, target))
+
+    if new_tickets:
+        now = timezone.now()
+        for ticket, number in zip(new_tickets, _allocate_ticket_numbers(len(new_tickets))):
+            ticket.ticket_number = number
+            ticket.created_at = now
+            ticket.set_priority_based_sla()
+        Ticket.objects.bulk_create(new_tickets, batch_size=500)
+        if any(ticket.pk is None for ticket in new_tickets):
+            # Backends without RETURNING (MySQL)
+            ids = dict(Ticket.objects.filter(ticket_number__in=[ticket.ticket_number for ticket in new_tickets])
+                       .values_list('ticket_number', 'id'))
+            for ticket in new_tickets:
+                ticket.pk = ticket.id = ids[ticket.ticket_number]
+        stats['tickets'] = len(new_tickets)
+
+        # bulk_create skips Ticket.save, which alerts Teams about critical tickets;
+        # the agents are notified like for tickets created in the web form
+        def announce():
+            for ticket in new_tickets:
+                if ticket.priority == 'critical':
+                    teams_notifier.notify('critical', ticket)
+                try:
+                    notify_agents_new_ticket(ticket)
+                except Exception as e:
+                    logger.error(f"Cannot notify agents about ticket {ticket.ticket_number}: {e}")
+        transaction.on_commit(announce)
+
+    if comments:
+        now = timezone.now()
+        objects = []
+        for message, (kind, value), internal in comments:
+            ticket_id = new_tickets[value].pk if kind == 'new' else value
+            objects.append(TicketComment(
+                ticket_id=ticket_id,
+                author=senders[message['from_email'].lower()],
+                content=message['reply_body'] or message['body'] or '(Kein Inhalt)',
+                is_internal=internal,
+                email_message_id=message['message_id'],
+            ))
+        TicketComment.objects.bulk_create(objects, batch_size=500)
+        stats['comments'] = len(objects)
+
+        agent_ids = set(User.objects.filter(pk__in={comment.author_id for comment in objects},
+                                            role__in=AGENT_ROLES).values_list('id', flat=True))
+        customer_ticket_ids = {comment.ticket_id for comment in objects if comment.author_id not in agent_ids}
+        agent_ticket_ids = {comment.ticket_id for comment in objects
+                            if comment.author_id in agent_ids and not comment.is_internal}
+        # A customer reply re-opens tickets waiting for the customer or marked resolved
+        Ticket.objects.filter(pk__in=customer_ticket_ids, status__in=['pending', 'resolved']) \
+            .update(status='open', updated_at=now)
+        # Same rule as TicketComment.save for agent answers
+        Ticket.objects.filter(pk__in=agent_ticket_ids, first_response_at__isnull=True) \
+            .update(first_response_at=now)
+
+    entries = []
+    for message, (kind, value) in new_messages:
+        ticket_id = new_tickets[value].pk if kind == 'new' else value
+        entries.append((message['message_id'], ticket_id, 'inbound'))
+        entries.extend((thread_id, ticket_id, 'reference') for thread_id in message['thread_ids'])
+    record_messages(entries)
+
+    return stats
+
+
+class MailIngestor:
+    """Incremental UID-based ingestion of one mailbox"""
+
+    def __init__(self, mailbox, batch_size=BATCH_SIZE, processes=None):
+        self.mailbox = mailbox
+        self.batch_size = batch_size
+        self.processes = processes
+        self._pool = None
+
+    def _parse(self, fetched, uid_validity):
+        if self.processes == 0 or len(fetched) < MIN_POOL_BATCH:
+            return [parse_message(uid, raw, uid_validity) for uid, raw in fetched]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        uids, raws = zip(*fetched)
+        chunksize = max(1, len(fetched) // (4 * (self._pool._max_workers or 1)))
+        return list(self._pool.map(parse_message, uids, raws, [uid_validity] * len(uids), chunksize=chunksize))
+
+    def run_once(self, progress=None):
+        """Ingest all new messages; returns the stats of this run"""
+        from .models import MailboxState
+
+        stats = {'fetched': 0, 'ignored': 0, 'failed': 0, 'tickets': 0, 'comments': 0, 'duplicates': 0,
+                 'rejected': 0}
+        start = time.monotonic()
+
+        uid_validity = self.mailbox.open()
+        try:
+            state, _ = MailboxState.objects.get_or_create(mailbox=self.mailbox.name[:255])
+            if state.uid_validity != uid_validity:
+                if state.uid_validity is not None:
+                    logger.warning(f"UIDVALIDITY of {self.mailbox.name} changed, re-scanning the folder")
+                state.uid_validity = uid_validity
+                state.last_uid = 0
+                state.save()
+
+            uids = self.mailbox.search(state.last_uid)
+            for offset in range(0, len(uids), self.batch_size):
+                batch_uids = uids[offset:offset + self.batch_size]
+                fetched = self.mailbox.fetch(batch_uids)
+                stats['fetched'] += len(fetched)
+
+                parsed = []
+                for (uid, raw), message in zip(fetched, self._parse_safely(fetched, uid_validity, stats)):
+                    if message is None:
+                        stats['ignored'] += 1
+                    else:
+                        parsed.append(message)
+
+                with transaction.atomic():
+                    result = ingest_messages(parsed)
+                    state.last_uid = batch_uids[-1]
+                    state.save(update_fields=['last_uid', 'updated_at'])
+                for key, value in result.items():
+                    stats[key] += value
+
+                if progress:
+                    progress(dict(stats, elapsed=time.monotonic() - start))
+        finally:
+            self.mailbox.close()
+
+        stats['elapsed'] = time.monotonic() - start
+        if stats['fetched']:
+            logger.info(f"Mail ingestion {self.mailbox.name}: {stats}")
+        return stats
+
+    def _parse_safely(self, fetched, uid_validity, stats):
+        try:
+            return self._parse(fetched, uid_validity)
+        except Exception as e:
+            # Fall back to one by one so a single broken message cannot block the mailbox
+            logger.warning(f"Batch parsing failed ({e}), parsing messages individually")
+        results = []
+        for uid, raw in fetched:
+            try:
+                results.append(parse_message(uid, raw, uid_validity))
+            except Exception as e:
+                logger.exception(f"Cannot parse message UID {uid}: {e}")
+                stats['failed'] += 1
+                results.append(None)
+        return results
+
+    def run_forever(self, interval=60, progress=None):
+        """Poll the mailbox every ``interval`` seconds"""
+        while True:
+            try:
+                self.run_once(progress=progress)
+            except (imaplib.IMAP4.error, OSError) as e:
+                logger.error(f"Mail ingestion of {self.mailbox.name} failed: {e}")
+            except DatabaseError as e:
+                # The batch was rolled back; drop a broken connection and retry next round
+                logger.error(f"Mail ingestion of {self.mailbox.name} failed (database): {e}")
+                close_old_connections()
+            time.sleep(interval)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
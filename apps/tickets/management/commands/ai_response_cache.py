@@ -0,0 +1,37 @@
+"""
+Show the hit rate of the AI auto-response cache.
+
+Usage:
+    python manage.py ai_response_cache
+    python manage.py ai_response_cache --reset
+"""
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from apps.tickets.ai_cache import cache_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show (and optionally reset) the AI auto-response cache statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            self.stdout.write(self.style.WARNING(
+                'The cache is per process (CACHE_URL=locmem://): the counters of the web and '
+                'Celery processes are not visible here. Configure CACHE_URL.'
+            ))
+
+        stats = cache_stats()
+        self.stdout.write(f"Hits:        {stats['hits']}")
+        self.stdout.write(f"Misses:      {stats['misses']}")
+        self.stdout.write(f"Invalidated: {stats['invalidated']} (changed knowledge articles)")
+        self.stdout.write(f"Hit rate:    {stats['hit_rate']:.1%}")
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,69 @@
+"""
+Generate AI auto-responses for open, unassigned tickets without comments.
+
+Continues after the last checkpoint; use --reset to scan all tickets again.
+
+Usage:
+    python manage.py ai_triage_backlog --dry-run
+    python manage.py ai_triage_backlog --batch-size 50 --workers 4
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tickets.ai_service import ai_service
+from apps.tickets.triage import BATCH_SIZE, default_checkpoint_path, run_triage
+
+
+class Command(BaseCommand):
+    help = 'Generate AI auto-responses for backlog tickets in parallel batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Tickets per batch (default: {BATCH_SIZE})')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Parallel AI requests (default: CLAUDE_MAX_CONCURRENCY)')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Process at most this many tickets (default: all)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the tickets that would get a response')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Checkpoint file (default: logs/ai_triage_checkpoint.json)')
+        parser.add_argument('--reset', action='store_true',
+                            help='Ignore the checkpoint and start with the first ticket')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if not dry_run and not ai_service.is_available():
+            raise CommandError('Claude AI is not configured or currently unavailable.')
+
+        checkpoint = Path(options['checkpoint'] or default_checkpoint_path())
+        if options['reset'] and checkpoint.exists():
+            checkpoint.unlink()
+
+        def progress(stats):
+            self.stdout.write(
+                f"{stats['scanned']} scanned, {stats['responded']} responded, {stats['failed']} failed "
+                f"({stats['per_second']:.1f} tickets/s, last id {stats['last_ticket_id']})"
+            )
+
+        stats = run_triage(
+            batch_size=max(options['batch_size'], 1),
+            workers=options['workers'],
+            limit=options['limit'],
+            dry_run=dry_run,
+            checkpoint_path=checkpoint,
+            progress=progress,
+        )
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"{stats['scanned']} tickets would get an auto-response."))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['responded']} responses ({stats['solutions']} possible solutions), "
+            f"{stats['failed']} failed, {stats['scanned']} tickets in {stats['elapsed']:.1f}s "
+            f"({stats['per_second']:.1f} tickets/s)."
+        ))
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING('Failed tickets are retried on the next run.'))
@@ -0,0 +1,98 @@
+"""
+Measure the mail ingestion throughput on a synthetic maildir.
+
+Generates new mails and replies (to earlier mails of the run) in a temporary
+maildir and ingests them. All database changes are rolled back afterwards.
+
+Usage:
+    python manage.py benchmark_mail_ingestion --messages 5000 --processes 4
+"""
+import mailbox
+import random
+import tempfile
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.tickets.mail_ingest import BATCH_SIZE, MailIngestor, MaildirMailbox
+
+from .benchmark_similar_tickets import DETAILS, PROBLEMS, SUBJECTS
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the inbound mail ingestion on a synthetic maildir'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000,
+                            help='Number of synthetic messages (default: 2000)')
+        parser.add_argument('--reply-share', type=float, default=0.5,
+                            help='Share of messages that reply to an earlier message (default: 0.5)')
+        parser.add_argument('--senders', type=int, default=200,
+                            help='Number of distinct senders (default: 200)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Messages per transaction (default: {BATCH_SIZE})')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Parsing processes, 0 = in-process (default: CPU count)')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Random seed (default: 1)')
+
+    @staticmethod
+    def _message(rng, number, sender, parent):
+        subject = rng.choice(SUBJECTS)
+        message = EmailMessage()
+        message['From'] = f'Lehrkraft {sender} <benchmark.{sender}@schule.example>'
+        message['To'] = 'support@helpdesk.example'
+        message['Date'] = format_datetime(timezone.now())
+        message['Message-ID'] = make_msgid(f'bench{number}', domain='schule.example')
+        if parent is None:
+            message['Subject'] = f'{subject} {rng.choice(PROBLEMS)}'
+        else:
+            message['Subject'] = f"Re: {parent['Subject']}"
+            message['In-Reply-To'] = parent['Message-ID']
+            message['References'] = parent['Message-ID']
+        body = (f'Hallo,\n\nder {subject} in Raum {rng.randint(100, 400)} {rng.choice(PROBLEMS)} '
+                f'{rng.choice(DETAILS)}.\n\nViele Grüße\nLehrkraft {sender}\n')
+        if parent is not None:
+            body += '\nAm Montag schrieb Support:\n> Bitte starten Sie das Gerät neu.\n'
+        message.set_content(body)
+        return message
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with tempfile.TemporaryDirectory() as path:
+            maildir = mailbox.Maildir(Path(path) / 'Maildir', create=True)
+            originals = []
+            for number in range(options['messages']):
+                parent = rng.choice(originals) if originals and rng.random() < options['reply_share'] else None
+                message = self._message(rng, number, rng.randrange(options['senders']), parent)
+                if parent is None:
+                    originals.append(message)
+                maildir.add(message)
+
+            ingestor = MailIngestor(MaildirMailbox(Path(path) / 'Maildir'),
+                                    batch_size=max(options['batch_size'], 1), processes=options['processes'])
+            try:
+                # The synthetic senders are unknown: let them become customers
+                with transaction.atomic(), override_settings(MAIL_CUSTOMER_DOMAINS=['schule.example']):
+                    stats = ingestor.run_once()
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                ingestor.close()
+
+        per_minute = stats['fetched'] / stats['elapsed'] * 60 if stats['elapsed'] else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {stats['fetched']} messages ({stats['tickets']} tickets, {stats['comments']} comments) "
+            f"in {stats['elapsed']:.1f}s: {per_minute:,.0f} messages/minute. Changes rolled back."
+        ))
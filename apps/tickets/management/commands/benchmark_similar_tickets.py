@@ -0,0 +1,77 @@
+"""
+Measure build and query time of the similar-ticket index on synthetic tickets.
+
+The tickets are generated in memory (no database access), so the index size
+can be chosen freely.
+
+Usage:
+    python manage.py benchmark_similar_tickets --tickets 100000 --queries 500
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.tickets.similarity import SimilarityIndex, ticket_terms
+
+SUBJECTS = [
+    'Beamer', 'Projektor', 'Whiteboard', 'Laptop', 'Tablet', 'Drucker', 'WLAN', 'Dokumentenkamera',
+    'Lautsprecher', 'Mikrofon', 'Ladewagen', 'Netzteil', 'HDMI-Kabel', 'Adapter', 'Maus', 'Tastatur',
+]
+PROBLEMS = [
+    'zeigt kein Bild', 'startet nicht', 'flackert', 'verbindet sich nicht', 'ist sehr langsam',
+    'macht Geräusche', 'lädt nicht', 'wird nicht erkannt', 'fällt ständig aus', 'meldet einen Fehler',
+]
+DETAILS = [
+    'im Klassenraum', 'nach dem Update', 'seit heute morgen', 'in der Pause', 'bei allen Schülern',
+    'nur im Erdgeschoss', 'trotz Neustart', 'mit dem neuen Kabel', 'im Lehrerzimmer', 'im Fachraum Physik',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the in-memory similar-ticket index on synthetic tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=100000,
+                            help='Number of synthetic tickets to index (default: 100000)')
+        parser.add_argument('--queries', type=int, default=500,
+                            help='Number of queries to measure (default: 500)')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Random seed (default: 1)')
+
+    @staticmethod
+    def _ticket(rng, number):
+        subject = rng.choice(SUBJECTS)
+        title = f'{subject} {rng.choice(PROBLEMS)}'
+        description = ' '.join([
+            f'Der {subject} in Raum {rng.randint(100, 400)}', rng.choice(PROBLEMS), rng.choice(DETAILS),
+            rng.choice(DETAILS), f'Inventar {number}',
+        ])
+        return title, description
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        index = SimilarityIndex()
+
+        start = time.perf_counter()
+        for number in range(options['tickets']):
+            index.add(number, ticket_terms(*self._ticket(rng, number)))
+        build_time = time.perf_counter() - start
+        self.stdout.write(f'Indexed {len(index)} tickets in {build_time:.1f}s '
+                          f'({build_time / max(len(index), 1) * 1e6:.0f} µs per ticket)')
+
+        timings = []
+        found = 0
+        for number in range(options['queries']):
+            terms = ticket_terms(*self._ticket(rng, number))
+            start = time.perf_counter()
+            found += bool(index.query(terms))
+            timings.append(time.perf_counter() - start)
+
+        if not timings:
+            return
+        timings.sort()
+        percentile = lambda p: timings[min(int(len(timings) * p), len(timings) - 1)] * 1000
+        self.stdout.write(f'Queries: {len(timings)}, with matches: {found}')
+        self.stdout.write(f'Query time: p50 {percentile(0.5):.2f} ms, p95 {percentile(0.95):.2f} ms, '
+                          f'max {timings[-1] * 1000:.2f} ms')
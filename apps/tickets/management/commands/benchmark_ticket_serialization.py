@@ -0,0 +1,64 @@
+"""
+Compare Ticket.to_dict() with the batch serializer on existing tickets.
+
+Usage:
+    python manage.py benchmark_ticket_serialization --limit 200 --details
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.tickets.models import Ticket
+from apps.tickets.serialization import serialize_tickets
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-object Ticket.to_dict() against the batch ticket serializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100,
+                            help='Number of tickets to serialize (default: 100)')
+        parser.add_argument('--details', action='store_true',
+                            help='Include comments and attachments')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of runs, the fastest one is reported (default: 3)')
+
+    def _measure(self, func, repeat):
+        best = None
+        queries = 0
+        result = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                result = func()
+                elapsed = time.perf_counter() - start
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best, queries
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        details = options['details']
+        repeat = max(options['repeat'], 1)
+
+        queryset = Ticket.objects.order_by('-created_at')[:limit]
+
+        per_object, per_object_time, per_object_queries = self._measure(
+            lambda: [ticket.to_dict(include_details=details) for ticket in queryset.all()],
+            repeat
+        )
+        batch, batch_time, batch_queries = self._measure(
+            lambda: serialize_tickets(queryset.all(), include_details=details),
+            repeat
+        )
+
+        self.stdout.write(f'Tickets: {len(batch)} (details: {"yes" if details else "no"})')
+        self.stdout.write(f'Ticket.to_dict():    {per_object_time * 1000:8.1f} ms, {per_object_queries} queries')
+        self.stdout.write(f'serialize_tickets(): {batch_time * 1000:8.1f} ms, {batch_queries} queries')
+
+        if per_object != batch:
+            self.stdout.write(self.style.ERROR('Output differs between both serialization paths!'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Output is identical.'))
@@ -0,0 +1,132 @@
+"""
+Check the resilience of the AI client manager against a local fake API server.
+
+A small HTTP server emulating the Anthropic messages endpoint is started on
+localhost; a real ``anthropic.Anthropic`` client is pointed at it. The
+command checks retries, the circuit breaker (open, short-circuit, half-open
+probe, close) and per-call deadlines. No API key or network access needed.
+
+Usage:
+    python manage.py check_ai_client
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import anthropic
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tickets.ai_client import AIClientManager, AIUnavailableError, CircuitBreaker
+
+
+class _FakeAnthropicHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/messages according to ``server.mode``: ok, error, overloaded or slow"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.hits += 1
+        mode = self.server.mode
+
+        if mode == 'slow':
+            time.sleep(2)
+        if mode == 'error':
+            return self._send(500, {'type': 'error', 'error': {'type': 'api_error', 'message': 'boom'}})
+        if mode == 'overloaded':
+            return self._send(429, {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'slow down'}},
+                              {'retry-after': '0'})
+
+        self._send(200, {
+            'id': f'msg_{self.server.hits}', 'type': 'message', 'role': 'assistant', 'model': 'fake',
+            'content': [{'type': 'text', 'text': 'Hallo,\n\nTest.'}],
+            'stop_reason': 'end_turn', 'stop_sequence': None,
+            'usage': {'input_tokens': 12, 'output_tokens': 4},
+        })
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Check retries, circuit breaker and deadlines of the AI client against a local fake server'
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeAnthropicHandler)
+        server.mode = 'ok'
+        server.hits = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        client = anthropic.Anthropic(api_key='test', base_url=f'http://127.0.0.1:{server.server_port}',
+                                     max_retries=0, http_client=httpx.Client())
+        manager = AIClientManager(
+            client, max_concurrency=2, requests_per_minute=6000, timeout=1.0, max_retries=2,
+            backoff_base=0.01, backoff_max=0.05,
+            breaker=CircuitBreaker(failure_rate=0.5, min_calls=6, window=60, cooldown=0.5),
+        )
+        self.failed = False
+
+        def call(timeout=None):
+            return manager.create_message(timeout=timeout, model='fake', max_tokens=10,
+                                          messages=[{'role': 'user', 'content': 'Test'}])
+
+        try:
+            self._check('Successful call', lambda: call().content[0].text == 'Hallo,\n\nTest.')
+
+            server.mode, server.hits = 'overloaded', 0
+            self._check('429 is retried, then gives up', lambda: self._raises(call) and server.hits == 3)
+
+            server.mode = 'error'
+            self._raises(call)
+            self._check('Circuit opens on high error rate', lambda: manager.breaker.state == CircuitBreaker.OPEN)
+
+            hits = server.hits
+            start = time.monotonic()
+            self._check('Open circuit short-circuits without a request',
+                        lambda: self._raises(call) and server.hits == hits and time.monotonic() - start < 0.05)
+
+            time.sleep(0.6)
+            server.mode = 'ok'
+            self._check('Half-open probe closes the circuit',
+                        lambda: call() is not None and manager.breaker.state == CircuitBreaker.CLOSED)
+
+            server.mode = 'slow'
+            start = time.monotonic()
+            self._check('Deadline bounds a hanging call',
+                        lambda: self._raises(lambda: call(timeout=0.3)) and time.monotonic() - start < 0.6)
+        finally:
+            server.shutdown()
+
+        self.stdout.write(json.dumps(manager.metrics(), indent=2))
+        if self.failed:
+            raise CommandError('AI client checks failed')
+
+    @staticmethod
+    def _raises(func):
+        try:
+            func()
+        except AIUnavailableError:
+            return True
+        return False
+
+    def _check(self, name, func):
+        try:
+            ok = func()
+        except Exception as e:
+            ok = False
+            name = f'{name} ({e.__class__.__name__}: {e})'
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f'PASS  {name}'))
+        else:
+            self.failed = True
+            self.stdout.write(self.style.ERROR(f'FAIL  {name}'))
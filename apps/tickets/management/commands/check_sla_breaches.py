@@ -0,0 +1,22 @@
+"""
+Flag open tickets whose SLA due date has passed and send Teams alerts.
+
+Meant to run periodically (cron or the ``check_sla_breaches`` Celery task).
+
+Usage:
+    python manage.py check_sla_breaches
+"""
+from django.core.management.base import BaseCommand
+
+from apps.tickets.sla import check_sla_breaches
+from apps.tickets.teams import teams_notifier
+
+
+class Command(BaseCommand):
+    help = 'Flag tickets that breached their SLA and alert Teams'
+
+    def handle(self, *args, **options):
+        breached = check_sla_breaches()
+        # Send the queued alerts before the process exits
+        teams_notifier.close()
+        self.stdout.write(self.style.SUCCESS(f'{len(breached)} tickets newly breached their SLA.'))
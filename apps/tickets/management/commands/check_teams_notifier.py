@@ -0,0 +1,106 @@
+"""
+Check the Teams notifier against a local webhook stub.
+
+A small HTTP server on localhost stands in for the Teams webhook. The command
+checks that a burst of alerts is coalesced into few cards without blocking
+the caller, and that rate limiting (429 + Retry-After), server errors and
+rejected payloads are handled. No Teams webhook or network access needed.
+
+Usage:
+    python manage.py check_teams_notifier
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tickets.teams import TeamsNotifier
+
+
+class _WebhookStubHandler(BaseHTTPRequestHandler):
+    """Answers POSTs with the next status of ``server.statuses`` (200 when empty)"""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        self.server.hits += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 200:
+            self.server.cards.append(payload)
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0.2')
+        self.send_header('Content-Length', '1')
+        self.end_headers()
+        self.wfile.write(b'1')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Check coalescing, retries and rate-limit handling of the Teams notifier against a local stub'
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookStubHandler)
+        server.hits, server.statuses, server.cards = 0, [], []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/webhook'
+        self.failed = False
+
+        def run(statuses, events, kinds=('critical',)):
+            server.hits, server.statuses, server.cards = 0, list(statuses), []
+            notifier = TeamsNotifier(webhook_url=url, interval=0.3, max_retries=2,
+                                     backoff_base=0.05, backoff_max=1.0)
+            start = time.monotonic()
+            for number in range(events):
+                ticket = SimpleNamespace(pk=number, ticket_number=f'TK-TEST-{number:05d}', title=f'Ausfall {number}')
+                notifier.notify(kinds[number % len(kinds)], ticket)
+            notify_time = time.monotonic() - start
+            time.sleep(0.5)
+            notifier.close()
+            return notifier.stats(), notify_time
+
+        try:
+            stats, notify_time = run([], 300, kinds=('critical', 'sla_breach', 'escalation'))
+            self._check(f'300 alerts are queued without blocking ({notify_time * 1000:.1f} ms)',
+                        lambda: notify_time < 0.5)
+            self._check(f'300 alerts are coalesced into {stats["cards_sent"]} card(s)',
+                        lambda: 1 <= stats['cards_sent'] <= 3 and server.hits == stats['cards_sent'])
+            self._check('Card lists every event type', lambda: all(
+                label in json.dumps(server.cards[0], ensure_ascii=False)
+                for label in ('Neue kritische Tickets', 'SLA verletzt', 'Eskalierte Tickets')))
+
+            start = time.monotonic()
+            stats, _ = run([429], 1)
+            self._check('429 waits for Retry-After and retries',
+                        lambda: stats['cards_sent'] == 1 and stats['rate_limited'] == 1
+                        and time.monotonic() - start >= 0.2)
+
+            stats, _ = run([500, 503], 1)
+            self._check('5xx is retried with backoff', lambda: stats['cards_sent'] == 1 and server.hits == 3)
+
+            stats, _ = run([500, 500, 500], 1)
+            self._check('Gives up after the retries', lambda: stats['cards_failed'] == 1 and server.hits == 3)
+
+            stats, _ = run([400], 1)
+            self._check('Rejected payload is not retried', lambda: stats['cards_failed'] == 1 and server.hits == 1)
+        finally:
+            server.shutdown()
+
+        if self.failed:
+            raise CommandError('Teams notifier checks failed')
+
+    def _check(self, name, func):
+        try:
+            ok = func()
+        except Exception as e:
+            ok = False
+            name = f'{name} ({e.__class__.__name__}: {e})'
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f'PASS  {name}'))
+        else:
+            self.failed = True
+            self.stdout.write(self.style.ERROR(f'FAIL  {name}'))
@@ -0,0 +1,44 @@
+"""
+Render thumbnails and previews for image attachments that have none yet.
+
+New uploads are rendered in the background by the web processes; this
+command backfills existing attachments and catches up on uploads whose
+rendering was interrupted (e.g. by a restart). Already rendered images are
+skipped, so it can run repeatedly (cron/Celery).
+
+Usage:
+    python manage.py generate_thumbnails
+    python manage.py generate_thumbnails --processes 4 --batch-size 500
+    python manage.py generate_thumbnails --force
+"""
+from django.core.management.base import BaseCommand
+
+from apps.tickets.thumbnails import BATCH_SIZE, generate_missing
+
+
+class Command(BaseCommand):
+    help = 'Render missing thumbnails and previews of image attachments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Images rendered per batch (default: {BATCH_SIZE})')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Rendering processes, 0 = render in-process (default: CPU count)')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Check at most this many stored images')
+        parser.add_argument('--force', action='store_true',
+                            help='Render again even if a thumbnail exists')
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            self.stdout.write(
+                f"{stats['checked']} checked, {stats['generated']} rendered, {stats['failed']} failed "
+                f"({stats['elapsed']:.1f}s)"
+            )
+
+        stats = generate_missing(batch_size=max(options['batch_size'], 1), processes=options['processes'],
+                                 force=options['force'], limit=options['limit'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['generated']} rendered, {stats['skipped']} already present, "
+            f"{stats['failed']} failed of {stats['checked']} images in {stats['elapsed']:.1f}s."
+        ))
@@ -0,0 +1,71 @@
+"""
+Turn inbound emails into tickets and replies into comments.
+
+Polls the IMAP folder (IMAP_HOST, IMAP_FOLDER, ...) incrementally by UID;
+only messages above the stored high-water mark are fetched. With --maildir a
+local maildir is read instead of the IMAP server.
+
+Usage:
+    python manage.py ingest_mail --once
+    python manage.py ingest_mail --interval 30 --processes 4
+    python manage.py ingest_mail --once --maildir /var/mail/helpdesk
+"""
+import imaplib
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tickets.mail_ingest import BATCH_SIZE, ImapMailbox, MailIngestor, MaildirMailbox
+
+
+class Command(BaseCommand):
+    help = 'Create tickets and comments from inbound emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Ingest the new messages and exit instead of polling')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='Seconds between two polls (default: 60)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Messages fetched and stored per transaction (default: {BATCH_SIZE})')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Processes for parsing, 0 = parse in-process (default: CPU count)')
+        parser.add_argument('--maildir', default=None,
+                            help='Read a local maildir instead of the IMAP server')
+        parser.add_argument('--folder', default=None,
+                            help='IMAP folder (default: IMAP_FOLDER)')
+
+    def handle(self, *args, **options):
+        if options['maildir']:
+            mailbox = MaildirMailbox(options['maildir'])
+        else:
+            if not settings.IMAP_USERNAME or not settings.IMAP_PASSWORD:
+                raise CommandError('IMAP is not configured (EMAIL_USERNAME / EMAIL_PASSWORD).')
+            mailbox = ImapMailbox(settings.IMAP_HOST, settings.IMAP_PORT, settings.IMAP_USERNAME,
+                                  settings.IMAP_PASSWORD, folder=options['folder'] or settings.IMAP_FOLDER)
+
+        ingestor = MailIngestor(mailbox, batch_size=max(options['batch_size'], 1), processes=options['processes'])
+
+        def progress(stats):
+            self.stdout.write(
+                f"{stats['fetched']} fetched, {stats['tickets']} tickets, {stats['comments']} comments, "
+                f"{stats['duplicates']} duplicates, {stats['ignored']} ignored, {stats['rejected']} rejected "
+                f"({stats['elapsed']:.1f}s)"
+            )
+
+        try:
+            if options['once']:
+                stats = ingestor.run_once(progress=progress)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Done: {stats['tickets']} new tickets, {stats['comments']} comments from "
+                    f"{stats['fetched']} messages in {stats['elapsed']:.1f}s."
+                ))
+            else:
+                self.stdout.write(f'Polling {mailbox.name} every {options["interval"]}s (Ctrl+C to stop)')
+                ingestor.run_forever(interval=options['interval'], progress=progress)
+        except (imaplib.IMAP4.error, OSError) as e:
+            raise CommandError(f'Mail ingestion failed: {e}')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ingestor.close()
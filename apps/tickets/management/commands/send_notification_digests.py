@@ -0,0 +1,21 @@
+"""
+Send the new-ticket digests of agents whose digest window is over.
+
+Meant to run every minute (cron or the ``send_notification_digests`` Celery task).
+
+Usage:
+    python manage.py send_notification_digests
+"""
+from django.core.management.base import BaseCommand
+
+from apps.tickets.digest import send_due_digests
+
+
+class Command(BaseCommand):
+    help = 'Send due agent notification digests over one SMTP connection'
+
+    def handle(self, *args, **options):
+        stats = send_due_digests()
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['digests']} digests with {stats['events']} notifications sent, {stats['failed']} failed."
+        ))
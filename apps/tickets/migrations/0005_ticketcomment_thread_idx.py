@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_merge_20251022_1104'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketcomment',
+            index=models.Index(fields=['ticket', 'created_at', 'id'], name='ticketcomment_thread_idx'),
+        ),
+    ]
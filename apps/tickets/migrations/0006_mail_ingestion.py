@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_ticketcomment_thread_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailboxState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mailbox', models.CharField(max_length=255, unique=True, verbose_name='mailbox')),
+                ('uid_validity', models.BigIntegerField(blank=True, null=True, verbose_name='UID validity')),
+                ('last_uid', models.BigIntegerField(default=0, verbose_name='last UID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'mailbox state',
+                'verbose_name_plural': 'mailbox states',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['email_thread_id'], name='ticket_email_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketcomment',
+            index=models.Index(fields=['email_message_id'], name='ticketcomment_email_msg_idx'),
+        ),
+    ]
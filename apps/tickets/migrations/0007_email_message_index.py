@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def index_existing_messages(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketComment = apps.get_model('tickets', 'TicketComment')
+    EmailMessageIndex = apps.get_model('tickets', 'EmailMessageIndex')
+
+    rows = Ticket.objects.exclude(email_thread_id__isnull=True).exclude(email_thread_id='') \
+        .values_list('email_thread_id', 'id')
+    comment_rows = TicketComment.objects.exclude(email_message_id__isnull=True).exclude(email_message_id='') \
+        .values_list('email_message_id', 'ticket_id')
+    for queryset in (rows, comment_rows):
+        batch = []
+        for message_id, ticket_id in queryset.iterator():
+            batch.append(EmailMessageIndex(message_id=message_id, ticket_id=ticket_id, direction='inbound'))
+            if len(batch) >= 5000:
+                EmailMessageIndex.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        EmailMessageIndex.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_mail_ingestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailMessageIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(max_length=255, unique=True, verbose_name='message ID')),
+                ('direction', models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound'), ('reference', 'Reference')], max_length=10, verbose_name='direction')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+            ],
+            options={
+                'verbose_name': 'email message',
+                'verbose_name_plural': 'email messages',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_email_thread_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ticketcomment',
+            name='ticketcomment_email_msg_idx',
+        ),
+        migrations.AddField(
+            model_name='emailmessageindex',
+            name='ticket',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_messages', to='tickets.ticket', verbose_name='ticket'),
+        ),
+        migrations.RunPython(index_existing_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_email_message_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('new_ticket', 'New ticket')], default='new_ticket', max_length=20, verbose_name='kind')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_events', to=settings.AUTH_USER_MODEL, verbose_name='recipient')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_events', to='tickets.ticket', verbose_name='ticket')),
+            ],
+            options={
+                'verbose_name': 'notification event',
+                'verbose_name_plural': 'notification events',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['sent_at', 'recipient', 'created_at'], name='notification_pending_idx')],
+            },
+        ),
+    ]
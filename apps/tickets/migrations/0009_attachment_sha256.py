@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_notification_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='SHA-256'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_attachment_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailmessageindex',
+            name='direction',
+            field=models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound'), ('internal', 'Internal (to agents)'), ('reference', 'Reference')], max_length=10, verbose_name='direction'),
+        ),
+    ]
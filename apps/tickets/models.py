@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
+from django.utils.functional import cached_property
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 import random
 import base64
@@ -190,11 +192,24 @@ class Ticket(models.Model):
     def __str__(self):
         return f'{self.ticket_number} - {self.title}'
 
+    # Fields that feed the similar-ticket index (see apps.tickets.similarity)
+    SIMILARITY_FIELDS = {'title', 'description', 'status'}
+
     def save(self, *args, **kwargs):
         if not self.ticket_number:
             self.ticket_number = self.generate_ticket_number()
+        adding = self._state.adding
         super().save(*args, **kwargs)
 
+        if adding and self.priority == 'critical':
+            from .teams import teams_notifier
+            transaction.on_commit(lambda: teams_notifier.notify('critical', self))
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SIMILARITY_FIELDS.intersection(update_fields):
+            from .similarity import similar_ticket_service
+            similar_ticket_service.schedule_update(self)
+
     @staticmethod
     def generate_ticket_number():
         """Generate unique ticket number"""
@@ -374,6 +389,10 @@ class TicketComment(models.Model):
         verbose_name = _('ticket comment')
         verbose_name_plural = _('ticket comments')
         ordering = ['created_at']
+        indexes = [
+            # Cursor-based thread polling (ticket_comments_api)
+            models.Index(fields=['ticket', 'created_at', 'id'], name='ticketcomment_thread_idx'),
+        ]
 
     def __str__(self):
         return f'Comment on {self.ticket.ticket_number} by {self.author.username}'
@@ -409,6 +428,8 @@ class TicketAttachment(models.Model):
     file = models.FileField(_('file'), upload_to='ticket_attachments/%Y/%m/%d/')
     content_type = models.CharField(_('content type'), max_length=100)
     size = models.IntegerField(_('size'))
+    # Content hash; files are stored content-addressed (see apps.tickets.attachments)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, blank=True, default='', db_index=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL,
                                    on_delete=models.PROTECT,
                                    related_name='uploaded_attachments',
@@ -423,6 +444,34 @@ class TicketAttachment(models.Model):
     def __str__(self):
         return f'{self.filename} on {self.ticket.ticket_number}'
 
+    def delete(self, *args, **kwargs):
+        name = self.file.name
+        result = super().delete(*args, **kwargs)
+        # Identical files share one stored copy
+        if name and not TicketAttachment.objects.filter(file=name).exists():
+            from .thumbnails import delete_derivatives
+
+            self.file.storage.delete(name)
+            delete_derivatives(name)
+        return result
+
+    @cached_property
+    def preview_variants(self):
+        """Rendered derivatives of this image ('thumb', 'preview'), see apps.tickets.thumbnails"""
+        from .thumbnails import IMAGE_TYPES, available_variants
+
+        if self.content_type not in IMAGE_TYPES:
+            return set()
+        return available_variants(self.file.name)
+
+    @property
+    def has_thumbnail(self):
+        return 'thumb' in self.preview_variants
+
+    @property
+    def has_preview(self):
+        return 'preview' in self.preview_variants
+
     def to_dict(self, include_content=False):
         data = {
             'id': self.id,
@@ -431,7 +480,91 @@ class TicketAttachment(models.Model):
             'size': self.size,
             'uploaded_by': self.uploaded_by.to_dict(),
             'uploaded_at': self.uploaded_at.isoformat(),
-            'url': self.file.url if self.file else None
+            'url': reverse('tickets:attachment_download', args=[self.pk]) if self.file else None
         }
 
         return data
+
+
+class MailboxState(models.Model):
+    """Progress of the inbound mail ingestion per mailbox (IMAP UID high-water mark)"""
+
+    mailbox = models.CharField(_('mailbox'), max_length=255, unique=True)
+    uid_validity = models.BigIntegerField(_('UID validity'), null=True, blank=True)
+    last_uid = models.BigIntegerField(_('last UID'), default=0)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('mailbox state')
+        verbose_name_plural = _('mailbox states')
+
+    def __str__(self):
+        return f'{self.mailbox} (UID {self.last_uid})'
+
+
+class EmailMessageIndex(models.Model):
+    """
+    Message-ID -> ticket lookup for email threading.
+
+    Holds the Message-IDs of all mails sent for and received into a ticket,
+    plus the References of received mails, so a reply resolves to its ticket
+    with one lookup on the unique ``message_id`` index. Mails sent to agents
+    only (notifications) are ``internal``: replies to them become internal
+    notes.
+    """
+
+    DIRECTION_CHOICES = [
+        ('inbound', _('Inbound')),
+        ('outbound', _('Outbound')),
+        ('internal', _('Internal (to agents)')),
+        ('reference', _('Reference')),
+    ]
+
+    message_id = models.CharField(_('message ID'), max_length=255, unique=True)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE,
+                               related_name='email_messages',
+                               verbose_name=_('ticket'))
+    direction = models.CharField(_('direction'), max_length=10, choices=DIRECTION_CHOICES)
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('email message')
+        verbose_name_plural = _('email messages')
+
+    def __str__(self):
+        return f'{self.message_id} -> {self.ticket_id}'
+
+
+class NotificationEvent(models.Model):
+    """
+    Pending email notification for an agent in digest mode.
+
+    Collected by ``notify_agents_new_ticket`` and sent (one digest email per
+    agent and window) by ``apps.tickets.digest.send_due_digests``.
+    """
+
+    KIND_CHOICES = [
+        ('new_ticket', _('New ticket')),
+    ]
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                  related_name='notification_events',
+                                  verbose_name=_('recipient'))
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE,
+                               related_name='notification_events',
+                               verbose_name=_('ticket'))
+    kind = models.CharField(_('kind'), max_length=20, choices=KIND_CHOICES, default='new_ticket')
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+    sent_at = models.DateTimeField(_('sent at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('notification event')
+        verbose_name_plural = _('notification events')
+        ordering = ['created_at']
+        indexes = [
+            # Pending events per recipient (digest builder)
+            models.Index(fields=['sent_at', 'recipient', 'created_at'], name='notification_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.ticket_id} -> {self.recipient_id}'
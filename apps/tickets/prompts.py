@@ -0,0 +1,185 @@
+"""
+Token-budgeted prompt for AI auto-responses.
+
+The prompt is limited to ``CLAUDE_PROMPT_TOKEN_BUDGET`` tokens (estimated
+locally, no API call): the fixed instructions come first, then the ticket
+text gets up to ``TICKET_SHARE`` of the rest and the remaining budget is
+filled with the knowledge base passages that match the ticket best - not
+simply the beginning of each article.
+"""
+import math
+import re
+from collections import Counter
+
+from apps.knowledge.related import tokenize
+from apps.knowledge.text import normalize
+
+# German text averages fewer characters per token than English
+CHARS_PER_TOKEN = 3.5
+TICKET_SHARE = 0.4
+TITLE_MAX_TOKENS = 60
+PASSAGE_TARGET_CHARS = 600
+MIN_PASSAGE_TOKENS = 30
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+INSTRUCTIONS = """Du bist ein hilfsbereiter Support-Agent für das ML Gruppe Helpdesk-System.
+
+Ein Kunde hat folgendes Ticket erstellt:
+
+Titel: {title}
+Beschreibung: {description}
+Priorität: {priority}
+Kategorie: {category}
+
+{kb_context}
+
+Aufgabe:
+- Analysiere das Problem des Kunden
+- Wenn das Problem einfach ist und du eine Lösung aus den Wissensdatenbank-Artikeln ableiten kannst, gib eine hilfreiche Antwort
+- Wenn das Problem komplex ist oder keine passende Lösung in der Wissensdatenbank ist, sage dem Kunden freundlich, dass ein Support-Agent sich um sein Anliegen kümmern wird
+- Schreibe auf Deutsch
+- Sei freundlich und professionell
+- Halte dich kurz (max. 200 Wörter)
+
+Antworte NICHT mit einer Lösung wenn:
+- Das Problem technisch komplex ist
+- Es um sensible Daten geht
+- Es um Abrechnungen oder Verträge geht
+- Du dir nicht sicher bist
+
+Beginne mit "Hallo," (ohne Namen) und ende mit einer freundlichen Grußformel. Verwende keine Namen oder persönlichen Daten des Kunden."""
+
+
+def estimate_tokens(text):
+    """Local estimate of the number of tokens of ``text``"""
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Shorten ``text`` to about ``max_tokens``, cutting at a sentence or word boundary"""
+    text = (text or '').strip()
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 1:
+        return ''
+
+    cut = text[:max_chars - 1]
+    sentence_end = max(cut.rfind('. '), cut.rfind('! '), cut.rfind('? '), cut.rfind('\n'))
+    if sentence_end > max_chars // 2:
+        return cut[:sentence_end + 1].rstrip()
+    word_end = cut.rfind(' ')
+    return (cut[:word_end] if word_end > max_chars // 2 else cut).rstrip() + '…'
+
+
+def split_passages(text, target_chars=PASSAGE_TARGET_CHARS):
+    """Split article text into passages of about ``target_chars``, on paragraph/sentence boundaries"""
+    passages = []
+    current = ''
+    for paragraph in (text or '').split('\n\n'):
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= target_chars else _SENTENCE_END_RE.split(paragraph)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > target_chars:
+                passages.append(current)
+                current = ''
+            current = f'{current} {piece}'.strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+def rank_passages(query, articles):
+    """
+    Return ``[(score, article, passage), ...]`` best first, scored with BM25
+    against the ticket text. The article title counts as part of each passage.
+    """
+    query_terms = set(tokenize(normalize(query)))
+    candidates = []
+    for article in articles:
+        title_terms = tokenize(normalize(article.title))
+        for passage in split_passages(article.content_text):
+            candidates.append((article, passage, Counter(title_terms + tokenize(normalize(passage)))))
+    if not candidates or not query_terms:
+        return []
+
+    document_frequency = Counter()
+    for _, _, terms in candidates:
+        document_frequency.update(query_terms.intersection(terms))
+    average_length = sum(sum(terms.values()) for _, _, terms in candidates) / len(candidates)
+
+    ranked = []
+    for position, (article, passage, terms) in enumerate(candidates):
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms:
+            tf = terms.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(candidates) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+        # Ties (e.g. no matching terms): earlier passages of better ranked articles first
+        ranked.append((score, -position, article, passage))
+
+    ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [(score, article, passage) for score, _, article, passage in ranked]
+
+
+def build_auto_response_prompt(ticket, articles, budget):
+    """
+    Build the auto-response prompt within ``budget`` estimated tokens.
+
+    Returns ``(prompt, info)``; ``info`` holds the estimated token counts per
+    part and the ids of the articles that made it into the prompt.
+    """
+    category = ticket.category.name if ticket.category else 'Keine'
+    fixed = INSTRUCTIONS.format(title='', description='', priority=ticket.get_priority_display(),
+                                category=category, kb_context='')
+    fixed_tokens = estimate_tokens(fixed)
+    available = max(budget - fixed_tokens, 0)
+
+    title = truncate_to_tokens(ticket.title, TITLE_MAX_TOKENS)
+    ticket_budget = max(int(available * TICKET_SHARE) - estimate_tokens(title), 0)
+    description = truncate_to_tokens(ticket.description, ticket_budget)
+    # Budget the ticket text does not need goes to the knowledge base
+    kb_budget = available - estimate_tokens(title) - estimate_tokens(description)
+
+    kb_header = "\n\nRelevante Wissensdatenbank-Artikel:\n"
+    selected = {}  # article -> passages, in ranking order of the articles
+    used = estimate_tokens(kb_header)
+    for score, article, passage in rank_passages(f'{ticket.title} {ticket.description}', articles):
+        if score <= 0:
+            break  # The rest shares no term with the ticket and would only cost tokens
+        header = 0 if article in selected else estimate_tokens(f"\n- {article.title}:\n")
+        remaining = kb_budget - used - header
+        if remaining < MIN_PASSAGE_TOKENS:
+            if remaining < 0 and not selected:
+                break
+            continue
+        passage = truncate_to_tokens(passage, remaining)
+        selected.setdefault(article, []).append(passage)
+        used += header + estimate_tokens(passage) + 1
+
+    kb_context = ''
+    if selected:
+        kb_context = kb_header + ''.join(
+            f"\n- {article.title}:\n" + '\n'.join(passages) + '\n'
+            for article, passages in selected.items()
+        )
+
+    prompt = INSTRUCTIONS.format(title=title, description=description, priority=ticket.get_priority_display(),
+                                 category=category, kb_context=kb_context)
+    return prompt, {
+        'estimated_tokens': estimate_tokens(prompt),
+        'ticket_tokens': estimate_tokens(title) + estimate_tokens(description),
+        'kb_tokens': estimate_tokens(kb_context),
+        'description_truncated': len(description) < len((ticket.description or '').strip()),
+        'article_ids': [article.pk for article in selected],
+    }
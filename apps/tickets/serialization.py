@@ -0,0 +1,205 @@
+"""
+Batch serialization of tickets for JSON responses.
+
+``Ticket.to_dict()`` walks ``created_by``, ``assigned_to``, ``category``,
+``mobile_classroom.location`` and (with details) every comment author and
+attachment uploader - one query per relation and object. The helpers in this
+module build the very same dictionaries for a whole queryset from a constant
+number of ``values()`` queries:
+
+- 1 query for the tickets (category/classroom/location names joined in)
+- 1 query for all referenced users
+- 2 queries for comments and attachments (only with ``include_details``)
+
+``iter_serialized_tickets()`` does the same in chunks for streaming responses.
+"""
+from collections import defaultdict
+
+from django.urls import reverse
+
+from apps.accounts.models import User
+from .models import Ticket, TicketComment, TicketAttachment
+
+
+USER_FIELDS = [
+    'id', 'username', 'email', 'first_name', 'last_name', 'role', 'support_level',
+    'phone', 'department', 'location', 'is_active', 'email_verified',
+    'last_login', 'created_at',
+]
+
+TICKET_FIELDS = [
+    'id', 'ticket_number', 'title', 'status', 'priority', 'created_at', 'updated_at',
+    'created_by_id', 'assigned_to_id', 'sla_due_date', 'sla_breached',
+    'category__name', 'mobile_classroom__name', 'mobile_classroom__location__name',
+]
+
+TICKET_DETAIL_FIELDS = [
+    'description', 'first_response_at', 'resolved_at', 'rating', 'feedback',
+]
+
+COMMENT_FIELDS = [
+    'id', 'ticket_id', 'author_id', 'content', 'is_internal', 'created_at', 'updated_at',
+]
+
+ATTACHMENT_FIELDS = [
+    'id', 'ticket_id', 'filename', 'file', 'content_type', 'size', 'uploaded_by_id', 'uploaded_at',
+]
+
+
+# What customers may see of other users (agents): no contact data, no login times
+PUBLIC_USER_FIELDS = ('id', 'full_name', 'role')
+
+
+def public_user_dict(data):
+    """Reduce a ``User.to_dict()`` representation to ``PUBLIC_USER_FIELDS``"""
+    return {field: data[field] for field in PUBLIC_USER_FIELDS} if data else None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def user_dict_from_row(row):
+    """Build the ``User.to_dict()`` representation from a ``values()`` row"""
+    return {
+        'id': row['id'],
+        'username': row['username'],
+        'email': row['email'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'full_name': f"{row['first_name']} {row['last_name']}",
+        'role': row['role'],
+        'support_level': row['support_level'],
+        'phone': row['phone'],
+        'department': row['department'],
+        'location': row['location'],
+        'is_active': row['is_active'],
+        'email_verified': row['email_verified'],
+        'last_login': _isoformat(row['last_login']),
+        'created_at': row['created_at'].isoformat(),
+    }
+
+
+def serialize_users(user_ids):
+    """Return ``{user_id: user_dict}`` for all given ids in a single query"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return {}
+    rows = User.objects.filter(id__in=user_ids).values(*USER_FIELDS)
+    return {row['id']: user_dict_from_row(row) for row in rows}
+
+
+def serialize_tickets(queryset, include_details=False, public_users=False):
+    """
+    Serialize a ticket queryset to a list of dictionaries.
+
+    The result is identical to ``[t.to_dict(include_details) for t in queryset]``
+    but needs a constant number of queries regardless of the number of tickets.
+    Filtering, ordering and slicing of ``queryset`` are preserved. With
+    ``public_users`` (customers) users are reduced to ``PUBLIC_USER_FIELDS``.
+    """
+    fields = TICKET_FIELDS + (TICKET_DETAIL_FIELDS if include_details else [])
+    rows = list(queryset.values(*fields))
+    if not rows:
+        return []
+
+    ticket_ids = [row['id'] for row in rows]
+    user_ids = set()
+    for row in rows:
+        user_ids.add(row['created_by_id'])
+        user_ids.add(row['assigned_to_id'])
+
+    comments_by_ticket = defaultdict(list)
+    attachments_by_ticket = defaultdict(list)
+    if include_details:
+        comment_rows = (
+            TicketComment.objects
+            .filter(ticket_id__in=ticket_ids)
+            .order_by('created_at')
+            .values(*COMMENT_FIELDS)
+        )
+        for comment in comment_rows:
+            comments_by_ticket[comment['ticket_id']].append(comment)
+            user_ids.add(comment['author_id'])
+
+        # Default ordering of TicketAttachment (newest first) is kept by values()
+        attachment_rows = TicketAttachment.objects.filter(ticket_id__in=ticket_ids).values(*ATTACHMENT_FIELDS)
+        for attachment in attachment_rows:
+            attachments_by_ticket[attachment['ticket_id']].append(attachment)
+            user_ids.add(attachment['uploaded_by_id'])
+
+    users = serialize_users(user_ids)
+    if public_users:
+        users = {user_id: public_user_dict(user) for user_id, user in users.items()}
+
+    result = []
+    for row in rows:
+        data = {
+            'id': row['id'],
+            'ticket_number': row['ticket_number'],
+            'title': row['title'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+            'creator': users.get(row['created_by_id']),
+            'assignee': users.get(row['assigned_to_id']),
+            'category': row['category__name'],
+            'mobile_classroom': row['mobile_classroom__name'],
+            'location': row['mobile_classroom__location__name'],
+            'sla_due_date': _isoformat(row['sla_due_date']),
+            'sla_breached': row['sla_breached'],
+        }
+
+        if include_details:
+            data.update({
+                'description': row['description'],
+                'first_response_at': _isoformat(row['first_response_at']),
+                'resolved_at': _isoformat(row['resolved_at']),
+                'rating': row['rating'],
+                'feedback': row['feedback'],
+                'comments': [
+                    {
+                        'id': comment['id'],
+                        'content': comment['content'],
+                        'is_internal': comment['is_internal'],
+                        'author': users.get(comment['author_id']),
+                        'created_at': comment['created_at'].isoformat(),
+                        'updated_at': comment['updated_at'].isoformat(),
+                    }
+                    for comment in comments_by_ticket[row['id']]
+                ],
+                'attachments': [
+                    {
+                        'id': attachment['id'],
+                        'filename': attachment['filename'],
+                        'content_type': attachment['content_type'],
+                        'size': attachment['size'],
+                        'uploaded_by': users.get(attachment['uploaded_by_id']),
+                        'uploaded_at': attachment['uploaded_at'].isoformat(),
+                        'url': (reverse('tickets:attachment_download', args=[attachment['id']])
+                                if attachment['file'] else None),
+                    }
+                    for attachment in attachments_by_ticket[row['id']]
+                ],
+            })
+
+        result.append(data)
+
+    return result
+
+
+def iter_serialized_tickets(queryset, include_details=False, chunk_size=500, public_users=False):
+    """
+    Yield the ``serialize_tickets()`` dictionaries of ``queryset`` one by one.
+
+    Only the ids are loaded up front; the tickets are serialized ``chunk_size``
+    at a time, so memory stays flat for any number of tickets.
+    """
+    ticket_ids = list(queryset.values_list('id', flat=True))
+    for start in range(0, len(ticket_ids), chunk_size):
+        chunk = ticket_ids[start:start + chunk_size]
+        position = {ticket_id: index for index, ticket_id in enumerate(chunk)}
+        # Tickets deleted in the meantime are skipped
+        data = serialize_tickets(Ticket.objects.filter(id__in=chunk), include_details, public_users)
+        yield from sorted(data, key=lambda ticket: position[ticket['id']])
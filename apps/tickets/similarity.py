@@ -0,0 +1,288 @@
+"""
+Similar-ticket suggestions (duplicate detection).
+
+Tickets are vectorized locally - no network, no model files - with a
+hashing-trick TF-IDF over the words of title and description (the title
+counts double). An in-memory MinHash/LSH index over open and recent tickets
+finds candidates without comparing against every ticket; the candidates are
+then ranked by exact TF-IDF cosine similarity.
+
+The index is built lazily per process, updated when a ticket is saved and
+refreshed from the database (``updated_at`` high-water mark) at most every
+``REFRESH_INTERVAL`` seconds, so that changes from other worker processes are
+picked up as well.
+"""
+import logging
+import threading
+import time
+import zlib
+from itertools import islice
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.knowledge.related import tokenize
+from apps.knowledge.text import normalize
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 20
+TITLE_WEIGHT = 2
+NUM_PERM = 32
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 300
+MAX_BUCKET_SCAN = 256
+MIN_SCORE = 0.2
+
+RECENT_DAYS = 90
+REFRESH_INTERVAL = 60  # seconds
+OPEN_STATUSES = ['open', 'in_progress', 'pending']
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20251022)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def ticket_terms(title, description):
+    """Term counts of a ticket text, title weighted higher"""
+    terms = Counter(tokenize(normalize(description)))
+    for token in tokenize(normalize(title)):
+        terms[token] += TITLE_WEIGHT
+    return terms
+
+
+def _hash(token):
+    return zlib.crc32(token.encode('utf-8'))
+
+
+class SimilarityIndex:
+    """
+    MinHash LSH index with hashed TF-IDF re-ranking.
+
+    ``add()``/``remove()`` are incremental; ``query()`` only scores the
+    tickets sharing at least one LSH band with the query text. Buckets keep
+    insertion order and only the newest ``MAX_BUCKET_SCAN`` entries of a
+    bucket are looked at, so query time does not grow with the index size.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vectors = {}      # id -> (feature indices, term frequencies)
+        self._bands = {}        # id -> list of band keys
+        self._buckets = [defaultdict(dict) for _ in range(BANDS)]  # key -> ordered ids
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, item_id):
+        return item_id in self._vectors
+
+    @staticmethod
+    def _vectorize(terms):
+        features = Counter()
+        for term, count in terms.items():
+            features[_hash(term) % N_FEATURES] += count
+        indices = np.fromiter(features.keys(), dtype=np.int32, count=len(features))
+        tf = 1.0 + np.log(np.fromiter(features.values(), dtype=np.float32, count=len(features)))
+        return indices, tf.astype(np.float32)
+
+    @staticmethod
+    def _band_keys(terms):
+        hashes = np.fromiter((_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+        hashes %= _MERSENNE_PRIME
+        # (a * h + b) mod p for all permutations x tokens, minimum per permutation
+        signature = ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+        signature = signature.astype(np.uint32)
+        return [signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+    def _idf(self, indices):
+        return np.log((1.0 + self._count) / (1.0 + self._df[indices])) + 1.0
+
+    def add(self, item_id, terms):
+        """Add or replace an item"""
+        with self._lock:
+            self.remove(item_id)
+            if not terms:
+                return
+
+            indices, tf = self._vectorize(terms)
+            keys = self._band_keys(terms)
+
+            self._vectors[item_id] = (indices, tf)
+            self._bands[item_id] = keys
+            for band, key in enumerate(keys):
+                self._buckets[band][key][item_id] = None
+            self._df[indices] += 1
+            self._count += 1
+
+    def remove(self, item_id):
+        """Remove an item (no-op if unknown)"""
+        with self._lock:
+            vector = self._vectors.pop(item_id, None)
+            if vector is None:
+                return
+            for band, key in enumerate(self._bands.pop(item_id)):
+                bucket = self._buckets[band][key]
+                bucket.pop(item_id, None)
+                if not bucket:
+                    del self._buckets[band][key]
+            self._df[vector[0]] -= 1
+            self._count -= 1
+
+    def query(self, terms, limit=5, exclude=None, min_score=MIN_SCORE):
+        """Return ``[(item_id, score), ...]`` of the most similar items"""
+        if not terms:
+            return []
+
+        with self._lock:
+            hits = Counter()
+            for band, key in enumerate(self._band_keys(terms)):
+                hits.update(islice(reversed(self._buckets[band].get(key, {})), MAX_BUCKET_SCAN))
+            hits.pop(exclude, None)
+            if not hits:
+                return []
+
+            # Items sharing more bands are the more likely matches
+            candidates = [item_id for item_id, _ in hits.most_common(MAX_CANDIDATES)]
+
+            indices, tf = self._vectorize(terms)
+            order = np.argsort(indices)
+            indices = indices[order]
+            weights = tf[order] * self._idf(indices)
+            weights /= np.linalg.norm(weights)
+
+            # Cosine similarity of all candidates at once on the concatenated sparse vectors
+            vectors = [self._vectors[item_id] for item_id in candidates]
+            offsets = np.cumsum([0] + [len(vector[0]) for vector in vectors[:-1]])
+            item_indices = np.concatenate([vector[0] for vector in vectors])
+            item_weights = np.concatenate([vector[1] for vector in vectors]) * self._idf(item_indices)
+
+            positions = np.minimum(np.searchsorted(indices, item_indices), len(indices) - 1)
+            products = np.where(indices[positions] == item_indices, weights[positions] * item_weights, 0.0)
+            scores = np.add.reduceat(products, offsets) / np.sqrt(np.add.reduceat(item_weights ** 2, offsets))
+
+            scored = [
+                (item_id, float(score))
+                for item_id, score in zip(candidates, scores.tolist())
+                if score >= min_score
+            ]
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+
+class SimilarTicketService:
+    """Keeps a ``SimilarityIndex`` of open and recent tickets in sync with the database"""
+
+    def __init__(self):
+        self.index = SimilarityIndex()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._high_water = None
+        self._last_refresh = 0.0
+
+    @staticmethod
+    def _eligible_filter(now=None):
+        cutoff = (now or timezone.now()) - timedelta(days=RECENT_DAYS)
+        return Q(status__in=OPEN_STATUSES) | Q(created_at__gte=cutoff)
+
+    def _apply(self, rows):
+        cutoff = timezone.now() - timedelta(days=RECENT_DAYS)
+        for ticket_id, title, description, status, created_at, updated_at in rows:
+            if status in OPEN_STATUSES or created_at >= cutoff:
+                self.index.add(ticket_id, ticket_terms(title, description))
+            else:
+                self.index.remove(ticket_id)
+            if self._high_water is None or updated_at > self._high_water:
+                self._high_water = updated_at
+
+    def _load(self):
+        from .models import Ticket
+
+        start = time.perf_counter()
+        rows = (
+            Ticket.objects
+            .filter(self._eligible_filter())
+            .values_list('id', 'title', 'description', 'status', 'created_at', 'updated_at')
+            .iterator(chunk_size=2000)
+        )
+        self._apply(rows)
+        self._loaded = True
+        self._last_refresh = time.monotonic()
+        logger.info(f"Similar-ticket index built with {len(self.index)} tickets "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    def _refresh(self):
+        from .models import Ticket
+
+        rows = Ticket.objects.all()
+        if self._high_water is not None:
+            rows = rows.filter(updated_at__gt=self._high_water)
+        self._apply(rows.values_list('id', 'title', 'description', 'status', 'created_at', 'updated_at'))
+        self._last_refresh = time.monotonic()
+
+    def ensure_current(self):
+        """Build the index on first use and pick up changes from other processes"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            elif time.monotonic() - self._last_refresh > REFRESH_INTERVAL:
+                self._refresh()
+
+    def update_ticket(self, ticket):
+        """Add, update or remove a ticket after it was saved"""
+        if not self._loaded:
+            return  # Picked up when the index is built
+        with self._lock:
+            self._apply([(ticket.id, ticket.title, ticket.description, ticket.status,
+                          ticket.created_at, ticket.updated_at)])
+
+    def schedule_update(self, ticket):
+        """Update the index for ``ticket`` once the current transaction commits"""
+        def update():
+            try:
+                self.update_ticket(ticket)
+            except Exception as e:
+                logger.exception(f"Failed to update similar-ticket index for {ticket.pk}: {e}")
+
+        transaction.on_commit(update)
+
+    def similar_ids(self, title, description, limit=5, exclude=None):
+        """Return ``[(ticket_id, score), ...]`` for the given text"""
+        self.ensure_current()
+        return self.index.query(ticket_terms(title, description), limit=limit, exclude=exclude)
+
+    def similar_tickets(self, title, description, limit=5, exclude=None, queryset=None):
+        """
+        Return ticket instances similar to the given text, best match first.
+
+        Each ticket gets a ``similarity`` attribute (0..1). ``queryset`` can
+        restrict the result, e.g. to the tickets of one customer.
+        """
+        from .models import Ticket
+
+        # Fetch more ids than needed in case ``queryset`` filters some out
+        matches = self.similar_ids(title, description, limit=limit * 4 if queryset is not None else limit,
+                                   exclude=exclude)
+        if not matches:
+            return []
+
+        scores = dict(matches)
+        queryset = Ticket.objects.all() if queryset is None else queryset
+        tickets = queryset.filter(id__in=scores).select_related('created_by', 'assigned_to')
+        tickets = sorted(tickets, key=lambda ticket: scores[ticket.id], reverse=True)[:limit]
+        for ticket in tickets:
+            ticket.similarity = round(scores[ticket.id], 2)
+        return tickets
+
+
+# Create a global instance
+similar_ticket_service = SimilarTicketService()
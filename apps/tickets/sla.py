@@ -0,0 +1,35 @@
+"""
+SLA breach detection.
+
+``Ticket.check_sla_breach()`` only looks at one ticket; this marks all
+overdue open tickets with one query and sends a Teams alert per newly
+breached ticket (coalesced into one card by the notifier).
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def check_sla_breaches():
+    """Flag open tickets past their SLA due date; returns the newly breached tickets"""
+    from .models import Ticket
+    from .teams import teams_notifier
+
+    with transaction.atomic():
+        breached = list(
+            Ticket.objects.select_for_update()
+            .filter(sla_breached=False, sla_due_date__lt=timezone.now())
+            .exclude(status__in=['resolved', 'closed'])
+            .only('id', 'ticket_number', 'title', 'priority', 'sla_due_date')
+        )
+        Ticket.objects.filter(pk__in=[ticket.pk for ticket in breached]).update(sla_breached=True)
+
+    for ticket in breached:
+        due = timezone.localtime(ticket.sla_due_date).strftime('%d.%m.%Y %H:%M')
+        teams_notifier.notify('sla_breach', ticket, detail=f'{ticket.get_priority_display()}, fällig {due}')
+    if breached:
+        logger.info(f"{len(breached)} tickets breached their SLA")
+    return breached
@@ -0,0 +1,37 @@
+"""
+Celery tasks for tickets (loaded by ``app.autodiscover_tasks()``).
+"""
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def ai_triage_backlog(batch_size=50, limit=None):
+    """Generate AI auto-responses for backlog tickets (see apps.tickets.triage)"""
+    from .triage import run_triage
+
+    return run_triage(batch_size=batch_size, limit=limit)
+
+
+@shared_task(ignore_result=True)
+def check_sla_breaches():
+    """Flag overdue tickets and alert Teams (see apps.tickets.sla); scheduled every 5 minutes"""
+    from .sla import check_sla_breaches as check
+
+    return len(check())
+
+
+@shared_task(ignore_result=True)
+def send_notification_digests():
+    """Send due agent notification digests (see apps.tickets.digest); scheduled every minute"""
+    from .digest import send_due_digests
+
+    return send_due_digests()
+
+
+@shared_task(ignore_result=True)
+def generate_thumbnails(batch_size=200):
+    """Render missing attachment thumbnails (see apps.tickets.thumbnails); schedule e.g. hourly"""
+    from .thumbnails import generate_missing
+
+    # Celery's prefork workers may not start child processes: render in the worker itself
+    return generate_missing(batch_size=batch_size, processes=0)['generated']
@@ -0,0 +1,243 @@
+"""
+Microsoft Teams alerts via incoming webhooks.
+
+``notify()`` only puts the event on an in-memory queue and never blocks the
+request. A background thread collects the events for ``TEAMS_NOTIFY_INTERVAL``
+seconds and sends one adaptive card per webhook (channel) summarizing them -
+a burst of 300 critical tickets after an outage becomes one message, not 300
+POSTs. The thread keeps one pooled HTTP connection per webhook host, retries
+connection errors and 5xx responses with exponential backoff and waits as
+long as Teams asks for on 429 (``Retry-After``).
+
+The queue lives in the process: every web/worker process coalesces its own
+events. Events that do not fit into the bounded queue are dropped and
+counted, as are cards that could not be delivered after the retries.
+"""
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EVENT_LABELS = OrderedDict([
+    ('escalation', 'Eskalierte Tickets'),
+    ('sla_breach', 'SLA verletzt'),
+    ('critical', 'Neue kritische Tickets'),
+])
+# Tickets listed per event type in one card; the rest is only counted
+MAX_ITEMS_PER_KIND = 10
+# Events per card at most (a longer burst is split over several cards)
+MAX_BATCH = 2000
+
+_STOP = object()
+
+
+def build_card(events):
+    """Adaptive card payload summarizing ``events`` (already de-duplicated)"""
+    by_kind = OrderedDict((kind, []) for kind in EVENT_LABELS)
+    for event in events:
+        by_kind.setdefault(event['kind'], []).append(event)
+
+    summary = ', '.join(f'{len(items)} {EVENT_LABELS.get(kind, kind)}' for kind, items in by_kind.items() if items)
+    body = [{'type': 'TextBlock', 'size': 'Large', 'weight': 'Bolder', 'wrap': True,
+             'text': f'Helpdesk: {summary}'}]
+    for kind, items in by_kind.items():
+        if not items:
+            continue
+        body.append({'type': 'TextBlock', 'weight': 'Bolder', 'spacing': 'Medium', 'wrap': True,
+                     'text': f'{EVENT_LABELS.get(kind, kind)} ({len(items)})'})
+        body.append({'type': 'FactSet', 'facts': [
+            {'title': event['ticket_number'],
+             'value': f"[{event['title']}]({event['url']})" + (f" - {event['detail']}" if event['detail'] else '')}
+            for event in items[:MAX_ITEMS_PER_KIND]
+        ]})
+        if len(items) > MAX_ITEMS_PER_KIND:
+            body.append({'type': 'TextBlock', 'isSubtle': True, 'wrap': True,
+                         'text': f'… und {len(items) - MAX_ITEMS_PER_KIND} weitere'})
+
+    return {
+        'type': 'message',
+        'attachments': [{
+            'contentType': 'application/vnd.microsoft.card.adaptive',
+            'content': {
+                '$schema': 'http://adaptivecards.io/schemas/adaptive-card.json',
+                'type': 'AdaptiveCard',
+                'version': '1.4',
+                'body': body,
+                'actions': [{'type': 'Action.OpenUrl', 'title': 'Helpdesk öffnen',
+                             'url': f"{settings.SITE_URL.rstrip('/')}/tickets/"}],
+            },
+        }],
+    }
+
+
+class TeamsNotifier:
+    """Queues ticket events and sends them coalesced from a background thread"""
+
+    def __init__(self, webhook_url=None, interval=None, max_queue=10000, max_retries=4,
+                 backoff_base=1.0, backoff_max=60.0, timeout=10.0, client=None):
+        self._webhook_url = webhook_url
+        self._interval = interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._client = client
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {'queued': 0, 'dropped': 0, 'duplicates': 0, 'cards_sent': 0,
+                          'cards_failed': 0, 'requests': 0, 'retries': 0, 'rate_limited': 0}
+
+    @property
+    def webhook_url(self):
+        return self._webhook_url if self._webhook_url is not None else settings.TEAMS_WEBHOOK_URL
+
+    @property
+    def interval(self):
+        return self._interval if self._interval is not None else settings.TEAMS_NOTIFY_INTERVAL
+
+    def is_configured(self):
+        return bool(self.webhook_url)
+
+    def notify(self, kind, ticket, detail='', webhook_url=None):
+        """
+        Queue an alert about ``ticket``. Never blocks; returns False if Teams
+        is not configured or the queue is full.
+        """
+        url = webhook_url or self.webhook_url
+        if not url:
+            return False
+
+        event = {
+            'kind': kind,
+            'url': f"{settings.SITE_URL.rstrip('/')}/tickets/{ticket.pk}/",
+            'ticket_number': ticket.ticket_number,
+            'title': ticket.title[:120],
+            'detail': detail[:200],
+        }
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((url, event))
+        except queue.Full:
+            self._count('dropped')
+            logger.warning(f"Teams queue full, alert for {ticket.ticket_number} dropped")
+            return False
+        self._count('queued')
+        return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending=self._queue.qsize())
+
+    def close(self, timeout=10.0):
+        """Send what is queued and stop the worker thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='teams-notifier', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        client = self._client or httpx.Client(timeout=self.timeout,
+                                              limits=httpx.Limits(max_keepalive_connections=4))
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                stop = self._collect(batch, time.monotonic() + self.interval)
+                self._send_batch(client, batch)
+                if stop:
+                    break
+        finally:
+            if self._client is None:
+                client.close()
+
+    def _collect(self, batch, deadline):
+        """Add queued events to ``batch`` until ``deadline``; True if the notifier is closing"""
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                # Flush whatever is still queued
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        return True
+            batch.append(item)
+        return False
+
+    def _send_batch(self, client, batch):
+        channels = OrderedDict()
+        for url, event in batch:
+            events = channels.setdefault(url, OrderedDict())
+            key = (event['kind'], event['ticket_number'])
+            if key in events:
+                self._count('duplicates')
+            events[key] = event
+
+        for url, events in channels.items():
+            try:
+                delivered = self._post(client, url, build_card(list(events.values())))
+            except Exception as e:
+                logger.exception(f"Teams alert failed: {e}")
+                delivered = False
+            self._count('cards_sent' if delivered else 'cards_failed')
+
+    def _post(self, client, url, payload):
+        for attempt in range(self.max_retries + 1):
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * (0.5 + random.random() / 2)
+            self._count('requests')
+            try:
+                response = client.post(url, json=payload)
+            except httpx.TransportError as e:
+                logger.warning(f"Teams webhook not reachable: {e}")
+            else:
+                if response.status_code < 300:
+                    return True
+                if response.status_code == 429:
+                    self._count('rate_limited')
+                    try:
+                        delay = min(self.backoff_max, float(response.headers.get('Retry-After', delay)))
+                    except ValueError:
+                        pass
+                elif response.status_code < 500:
+                    logger.error(f"Teams webhook rejected the alert: {response.status_code} {response.text[:200]}")
+                    return False
+            if attempt < self.max_retries:
+                self._count('retries')
+                time.sleep(delay)
+
+        logger.error(f"Teams alert not delivered after {self.max_retries + 1} attempts")
+        return False
+
+
+# Create a global instance
+teams_notifier = TeamsNotifier()
@@ -0,0 +1,265 @@
+"""
+Thumbnails and previews for image attachments.
+
+For every stored image two JPEG derivatives are written next to the file
+(``<name>.thumb.jpg`` and ``<name>.preview.jpg``), so the ticket page shows
+small previews instead of loading full-size screenshots. Content-addressed
+files share their derivatives like they share the original.
+
+Generation never runs in the request: ``store_attachments`` hands the new
+images to ``thumbnail_worker``, which renders them in a small process pool
+(``THUMBNAIL_WORKERS``) after the transaction commits. ``generate_missing``
+(``manage.py generate_thumbnails``) renders in batches what is missing, e.g.
+for attachments uploaded before this existed or while the pool was down.
+
+Generation is idempotent: the thumbnail is written last and atomically, an
+original with a thumbnail is done. A preview is only written if the original
+is larger than the preview size - otherwise the original is shown.
+Derivatives need local file storage; others are skipped.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/gif'}
+# Variant -> (bounding box, JPEG quality)
+VARIANTS = {
+    'preview': ((1280, 1280), 85),
+    'thumb': ((240, 240), 80),
+}
+BATCH_SIZE = 200
+
+
+def derivative_name(name, variant):
+    return f'{name}.{variant}.jpg'
+
+
+def _local_path(name):
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _save_jpeg(image, path, quality):
+    # Written under a temporary name and renamed: readers never see partial
+    # files, concurrent generators of the same image do not conflict
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        image.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def render_derivatives(path, force=False):
+    """
+    Write the derivatives of the image at ``path``.
+
+    Runs in the pool processes, so it only touches the file system. Returns
+    ``'generated'``, ``'skipped'`` (already done) or ``'failed'``.
+    """
+    from PIL import Image, ImageOps
+
+    thumb_path = derivative_name(path, 'thumb')
+    if not force and os.path.exists(thumb_path):
+        return 'skipped'
+
+    try:
+        with Image.open(path) as image:
+            preview_box, preview_quality = VARIANTS['preview']
+            # JPEG: let the decoder scale down while decoding (much faster than a full decode)
+            image.draft('RGB', preview_box)
+            image = ImageOps.exif_transpose(image)
+            too_large = image.width > preview_box[0] or image.height > preview_box[1]
+
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            preview_path = derivative_name(path, 'preview')
+            if too_large:
+                image.thumbnail(preview_box, Image.Resampling.LANCZOS)
+                _save_jpeg(image, preview_path, preview_quality)
+            elif os.path.exists(preview_path):
+                os.remove(preview_path)
+
+            thumb_box, thumb_quality = VARIANTS['thumb']
+            image.thumbnail(thumb_box, Image.Resampling.LANCZOS)
+            _save_jpeg(image, thumb_path, thumb_quality)
+    except Exception as e:
+        # Broken or hostile files (decompression bombs) just get no previews
+        logger.warning(f"No thumbnail for {path}: {e}")
+        return 'failed'
+    return 'generated'
+
+
+def available_variants(name):
+    """The derivatives that exist for the stored file ``name``"""
+    path = _local_path(name) if name else None
+    if path is None:
+        return set()
+    return {variant for variant in VARIANTS if os.path.exists(derivative_name(path, variant))}
+
+
+def delete_derivatives(name):
+    path = _local_path(name)
+    if path is None:
+        return
+    for variant in VARIANTS:
+        try:
+            os.remove(derivative_name(path, variant))
+        except FileNotFoundError:
+            pass
+
+
+def _pool(processes):
+    # 'spawn': the web process runs threads (e.g. the Teams notifier), forking it is unsafe
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+
+
+class ThumbnailWorker:
+    """Renders derivatives of new attachments in a background process pool"""
+
+    def __init__(self, processes=None):
+        self._processes = processes
+        self._pool = None
+        self._pending = set()
+        # Reentrant: a future that is already done runs its callback in ``_submit``
+        self._lock = threading.RLock()
+        self._counters = {'submitted': 0, 'generated': 0, 'skipped': 0, 'failed': 0}
+
+    @property
+    def processes(self):
+        return self._processes if self._processes is not None else settings.THUMBNAIL_WORKERS
+
+    def submit(self, attachments):
+        """Render the derivatives of the image ``attachments`` once the current transaction commits"""
+        if self.processes <= 0:
+            return
+        paths = []
+        for attachment in attachments:
+            if attachment.content_type in IMAGE_TYPES and attachment.file:
+                path = _local_path(attachment.file.name)
+                if path is not None:
+                    paths.append(path)
+        if paths:
+            transaction.on_commit(lambda: self._submit(paths))
+
+    def _submit(self, paths):
+        with self._lock:
+            if self._pool is None:
+                self._pool = _pool(self.processes)
+                atexit.register(self.close)
+            for path in paths:
+                if path in self._pending:
+                    continue
+                self._pending.add(path)
+                self._counters['submitted'] += 1
+                future = self._pool.submit(render_derivatives, path)
+                future.add_done_callback(lambda future, path=path: self._done(path, future))
+
+    def _done(self, path, future):
+        if future.cancelled():
+            with self._lock:
+                self._pending.discard(path)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            # Pool died or was shut down; generate_missing picks the file up later
+            logger.error(f"Thumbnail generation for {path} failed: {e}")
+            result = 'failed'
+            if isinstance(e, BrokenProcessPool):
+                with self._lock:
+                    self._pool = None  # Start a new one with the next upload
+        with self._lock:
+            self._pending.discard(path)
+            self._counters[result] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending))
+
+    def close(self):
+        """Stop the pool; files not yet rendered are left to ``generate_missing``"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def generate_missing(batch_size=BATCH_SIZE, processes=None, force=False, limit=None, progress=None):
+    """
+    Render the derivatives of all stored images that have none yet (all with
+    ``force``), ``batch_size`` files at a time.
+
+    Returns ``{'checked': n, 'generated': n, 'skipped': n, 'failed': n, 'elapsed': s}``.
+    """
+    from .models import TicketAttachment
+
+    started = time.monotonic()
+    stats = {'checked': 0, 'generated': 0, 'skipped': 0, 'failed': 0}
+    names = (TicketAttachment.objects.filter(content_type__in=IMAGE_TYPES).exclude(file='')
+             .order_by('file').values_list('file', flat=True).distinct())
+    if limit:
+        names = names[:limit]
+
+    processes = processes if processes is not None else (os.cpu_count() or 1)
+    pool = _pool(processes) if processes > 0 else None
+    try:
+        batch = []
+        for name in names.iterator(chunk_size=2000):
+            path = _local_path(name)
+            if path is None or not os.path.exists(path):
+                continue
+            stats['checked'] += 1
+            if not force and os.path.exists(derivative_name(path, 'thumb')):
+                stats['skipped'] += 1
+                continue
+            batch.append(path)
+            if len(batch) >= batch_size:
+                _render_batch(pool, batch, force, stats)
+                batch = []
+                if progress:
+                    progress(dict(stats, elapsed=time.monotonic() - started))
+        if batch:
+            _render_batch(pool, batch, force, stats)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats['elapsed'] = time.monotonic() - started
+    logger.info(f"Thumbnails: {stats}")
+    return stats
+
+
+def _render_batch(pool, paths, force, stats):
+    if pool is None:
+        results = [render_derivatives(path, force) for path in paths]
+    else:
+        chunksize = max(1, len(paths) // (4 * (pool._max_workers or 1)))
+        results = pool.map(render_derivatives, paths, [force] * len(paths), chunksize=chunksize)
+    for result in results:
+        stats[result] += 1
+
+
+# Create a global instance
+thumbnail_worker = ThumbnailWorker()
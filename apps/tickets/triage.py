@@ -0,0 +1,135 @@
+"""
+Batch AI triage of backlog tickets.
+
+Auto-responses are normally only generated when a ticket is created. This
+job catches up on existing tickets (e.g. after the AI key was configured or
+knowledge articles were imported):
+
+- candidates come from ``ai_service.auto_respond_candidates()`` - one
+  annotated query per batch, walking the ticket ids in ascending order,
+- the tickets of a batch are answered in parallel by a bounded thread pool
+  (the API limits of ``AIClientManager`` apply on top),
+- the last fully processed ticket id is written to a checkpoint file, so an
+  interrupted run continues where it stopped. Tickets whose response failed
+  are retried on the next run.
+
+Used by ``manage.py ai_triage_backlog`` and the ``ai_triage_backlog`` Celery task.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+from .ai_service import ai_service
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+
+
+def default_checkpoint_path():
+    return Path(settings.BASE_DIR) / 'logs' / 'ai_triage_checkpoint.json'
+
+
+def read_checkpoint(path):
+    """Return the last processed ticket id stored in ``path`` (0 if none)"""
+    try:
+        return int(json.loads(Path(path).read_text())['last_ticket_id'])
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def write_checkpoint(path, ticket_id):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'last_ticket_id': ticket_id, 'updated': time.time()}))
+    tmp.replace(path)  # atomic, a crash never leaves a half-written checkpoint
+
+
+def _respond(ticket):
+    try:
+        comment = ai_service.post_auto_comment(ticket)
+        return ticket.pk, comment
+    except Exception as e:
+        logger.exception(f"AI triage failed for ticket {ticket.pk}: {e}")
+        return ticket.pk, None
+    finally:
+        # Worker threads have their own database connections
+        connection.close()
+
+
+def run_triage(batch_size=BATCH_SIZE, workers=None, limit=None, dry_run=False,
+               checkpoint_path=None, progress=None):
+    """
+    Generate auto-responses for all backlog tickets that qualify.
+
+    ``progress`` is called with the stats dictionary after every batch.
+    Returns the final stats: scanned, responded, solutions, failed, elapsed,
+    per_second, last_ticket_id.
+    """
+    workers = workers or settings.CLAUDE_MAX_CONCURRENCY
+    checkpoint_path = checkpoint_path or default_checkpoint_path()
+    last_id = read_checkpoint(checkpoint_path)
+    # Never move the checkpoint past a ticket whose response failed
+    checkpoint_frozen = False
+
+    stats = {'scanned': 0, 'responded': 0, 'solutions': 0, 'failed': 0,
+             'elapsed': 0.0, 'per_second': 0.0, 'last_ticket_id': last_id}
+    start = time.monotonic()
+
+    executor = None if dry_run else ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-triage')
+    try:
+        while limit is None or stats['scanned'] < limit:
+            if not dry_run and not ai_service.is_available():
+                logger.warning("AI triage stopped: AI service not available")
+                break
+
+            size = batch_size if limit is None else min(batch_size, limit - stats['scanned'])
+            batch = list(
+                ai_service.auto_respond_candidates()
+                .filter(pk__gt=last_id)
+                .select_related('created_by', 'category')
+                .order_by('pk')[:size]
+            )
+            if not batch:
+                break
+            stats['scanned'] += len(batch)
+            last_id = batch[-1].pk
+
+            if dry_run:
+                stats['last_ticket_id'] = last_id
+            else:
+                failed_ids = []
+                for ticket_id, comment in executor.map(_respond, batch):
+                    if comment is None:
+                        failed_ids.append(ticket_id)
+                    else:
+                        stats['responded'] += 1
+                stats['solutions'] += sum(1 for ticket in batch if ticket.status == 'pending')
+                stats['failed'] += len(failed_ids)
+
+                if failed_ids and not checkpoint_frozen:
+                    checkpoint_frozen = True
+                    stats['last_ticket_id'] = min(failed_ids) - 1
+                    write_checkpoint(checkpoint_path, stats['last_ticket_id'])
+                elif not checkpoint_frozen:
+                    stats['last_ticket_id'] = last_id
+                    write_checkpoint(checkpoint_path, last_id)
+
+            stats['elapsed'] = time.monotonic() - start
+            stats['per_second'] = stats['scanned'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            if progress:
+                progress(dict(stats))
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    stats['elapsed'] = time.monotonic() - start
+    stats['per_second'] = stats['scanned'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    logger.info(f"AI triage finished: {stats}")
+    return stats
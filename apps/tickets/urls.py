@@ -7,9 +7,15 @@ urlpatterns = [
     path('', views.ticket_list, name='list'),
     path('create/', views.ticket_create, name='create'),
     path('statistics/', views.statistics_dashboard, name='statistics'),
+    path('api/tickets/', views.ticket_list_api, name='list_api'),
     path('api/search-customers/', views.search_customers_api, name='search_customers_api'),
+    path('api/similar-tickets/', views.similar_tickets_api, name='similar_tickets_api'),
+    path('api/ai-metrics/', views.ai_metrics_api, name='ai_metrics_api'),
     path('<int:pk>/', views.ticket_detail, name='detail'),
+    path('<int:pk>/api/comments/', views.ticket_comments_api, name='comments_api'),
     path('<int:pk>/assign/', views.ticket_assign, name='assign'),
     path('<int:pk>/escalate/', views.ticket_escalate, name='escalate'),
     path('<int:pk>/close/', views.ticket_close, name='close'),
+    path('attachments/<int:pk>/', views.attachment_download, name='attachment_download'),
+    path('attachments/<int:pk>/<str:variant>/', views.attachment_download, name='attachment_derivative'),
 ]
@@ -3,13 +3,20 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponseForbidden
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
+from django.urls import reverse
 from django.db import models
-from .models import Ticket, TicketComment, Category
+from .models import Ticket, TicketComment, TicketAttachment, Category
 from .forms import TicketCreateForm, TicketCommentForm, AgentTicketCreateForm
 from .ai_service import ai_service
+from .attachments import store_attachments, streaming_uploads
+from .downloads import serve_attachment
+from .digest import queue_events
+from .email_threading import send_ticket_mail
+from .teams import teams_notifier
 from apps.accounts.models import User
+from apps.main.responses import FastJsonResponse, StreamingJsonArrayResponse
+from helpdesk.replicas import read_only_view
 
 
 def notify_agents_new_ticket(ticket):
@@ -28,7 +35,11 @@ def notify_agents_new_ticket(ticket):
         support_level__in=[1, 2]  # Only Level 1 and Level 2 support agents
     ).exclude(id=ticket.created_by.id)
 
-    if not agents.exists():
+    # Agents in digest mode get the ticket with their next digest (apps.tickets.digest)
+    agents = list(agents)
+    queue_events([agent for agent in agents if agent.digest_minutes], ticket)
+    agents = [agent for agent in agents if not agent.digest_minutes]
+    if not agents:
         return
 
     # Build ticket URL using SITE_URL setting
@@ -61,12 +72,13 @@ Diese Email wurde automatisch vom ML Gruppe Helpdesk System gesendet.
     recipient_list = [agent.email for agent in agents]
 
     try:
-        send_mail(
+        send_ticket_mail(
+            ticket,
             subject=subject,
             message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=recipient_list,
             fail_silently=True,  # Don't break ticket creation if email fails
+            internal=True,  # Agents only: replies become internal notes
         )
     except Exception as e:
         print(f"Failed to send notification email: {e}")
@@ -140,29 +152,35 @@ Diese Email wurde automatisch vom ML Gruppe Helpdesk System gesendet.
 """
 
     try:
-        send_mail(
+        send_ticket_mail(
+            ticket,
             subject=subject,
             message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[escalated_to_agent.email],
             fail_silently=True,  # Don't break escalation if email fails
+            internal=True,  # Agents only: replies become internal notes
         )
     except Exception as e:
         print(f"Failed to send escalation notification email: {e}")
 
 
-@login_required
-def ticket_list(request):
-    """List tickets based on user role"""
-    if request.user.role == 'customer':
+def visible_tickets(user):
+    """The tickets ``user`` may see in the ticket list, newest first"""
+    if user.role == 'customer':
         # Customers only see their own tickets (including closed)
-        tickets = Ticket.objects.filter(created_by=request.user).order_by('-created_at')
-    elif request.user.role == 'support_agent':
+        return Ticket.objects.filter(created_by=user).order_by('-created_at')
+    elif user.role == 'support_agent':
         # Agents see all tickets (assigned, unassigned, and closed)
-        tickets = Ticket.objects.all().order_by('-created_at')
+        return Ticket.objects.all().order_by('-created_at')
     else:  # admin
         # Admins see all tickets
-        tickets = Ticket.objects.all().order_by('-created_at')
+        return Ticket.objects.all().order_by('-created_at')
+
+
+@login_required
+def ticket_list(request):
+    """List tickets based on user role"""
+    tickets = visible_tickets(request.user)
 
     context = {
         'tickets': tickets,
@@ -171,7 +189,15 @@ def ticket_list(request):
     return render(request, 'tickets/list.html', context)
 
 
+def save_uploaded_attachments(request, ticket):
+    """Store the files of the ``attachments`` field and report rejected ones"""
+    store_attachments(ticket, request.FILES.getlist('attachments'), request.user)
+    for error in getattr(request, 'upload_errors', []):
+        messages.warning(request, f'Anhang nicht gespeichert: {error}')
+
+
 @login_required
+@streaming_uploads
 def ticket_create(request):
     """Create a new ticket - customers create for themselves, agents can create for customers"""
     if request.user.role not in ['customer', 'support_agent', 'admin']:
@@ -222,37 +248,17 @@ def ticket_create(request):
                         )
                         return render(request, 'tickets/create_agent.html', {'form': form})
 
-                    # Generate email from name if not provided
-                    if not customer_email:
-                        customer_email = f"{customer_first_name.lower()}.{customer_last_name.lower()}@example.com"
-                        # Ensure email is unique by appending counter if needed
-                        base_email = customer_email
-                        counter = 1
-                        while User.objects.filter(email=customer_email).exists():
-                            customer_email = f"{customer_first_name.lower()}.{customer_last_name.lower()}{counter}@example.com"
-                            counter += 1
-
-                    # Generate username from email (remove domain part)
-                    username = customer_email.split('@')[0]
-
-                    # Ensure username is unique by appending counter if needed
-                    base_username = username
-                    counter = 1
-                    while User.objects.filter(username=username).exists():
-                        username = f"{base_username}{counter}"
-                        counter += 1
-
                     try:
-                        # Create new customer user with initial password
+                        # Create new customer user with initial password.
+                        # Email (if not provided) and username are generated
+                        # from the name with a free numeric suffix.
                         INITIAL_PASSWORD = 'P@ssw0rd123'
-                        customer = User.objects.create_user(
-                            email=customer_email,
-                            username=username,
-                            password=INITIAL_PASSWORD,
+                        customer = User.objects.create_customer(
                             first_name=customer_first_name,
                             last_name=customer_last_name,
+                            email=customer_email or None,
+                            password=INITIAL_PASSWORD,
                             phone=customer_phone,  # Add phone number
-                            role='customer',
                             force_password_change=True  # Force password change on first login
                         )
                         messages.info(
@@ -273,6 +279,8 @@ def ticket_create(request):
                 ticket.set_priority_based_sla()
                 ticket.save()
 
+                save_uploaded_attachments(request, ticket)
+
                 # Add internal note that agent created this
                 TicketComment.objects.create(
                     ticket=ticket,
@@ -296,14 +304,21 @@ def ticket_create(request):
         if request.method == 'POST':
             form = TicketCreateForm(request.POST, request.FILES)
             if form.is_valid():
+                from .classifier import ticket_classifier
+
                 ticket = form.save(commit=False)
                 ticket.created_by = request.user
+
+                # Correct category and priority if the classifier is confident
+                classification_changes = ticket_classifier.apply(ticket)
                 ticket.save()
 
                 # Set SLA based on priority
                 ticket.set_priority_based_sla()
                 ticket.save()
 
+                save_uploaded_attachments(request, ticket)
+
                 # Send notification emails to all agents
                 notify_agents_new_ticket(ticket)
 
@@ -320,6 +335,18 @@ def ticket_create(request):
                 else:
                     messages.success(request, f'Ticket {ticket.ticket_number} wurde erfolgreich erstellt!')
 
+                # Document the correction for agents (after the auto-response,
+                # which is only given to tickets without comments)
+                if classification_changes:
+                    TicketComment.objects.create(
+                        ticket=ticket,
+                        author=User.objects.system_user(),
+                        content='Automatisch eingeordnet: ' + ', '.join(
+                            f'{label} {old} → {new}' for label, old, new in classification_changes
+                        ),
+                        is_internal=True
+                    )
+
                 return redirect('tickets:detail', pk=ticket.pk)
         else:
             form = TicketCreateForm()
@@ -357,9 +384,9 @@ def ticket_detail(request, pk):
 
     # Get comments (hide internal from customers)
     if request.user.role == 'customer':
-        comments = ticket.comments.filter(is_internal=False)
+        comments = ticket.comments.filter(is_internal=False).select_related('author')
     else:
-        comments = ticket.comments.all()
+        comments = ticket.comments.select_related('author')
 
     # Get available agents for team lead assignment
     team_agents = User.objects.filter(
@@ -367,15 +394,39 @@ def ticket_detail(request, pk):
         is_active=True
     ).exclude(id=request.user.id).order_by('first_name', 'last_name')
 
+    # Possible duplicates of this ticket (agents only)
+    similar_tickets = []
+    if request.user.role in ['support_agent', 'admin']:
+        from .similarity import similar_ticket_service
+        similar_tickets = similar_ticket_service.similar_tickets(
+            ticket.title, ticket.description, limit=5, exclude=ticket.pk
+        )
+
     context = {
         'ticket': ticket,
         'comments': comments.order_by('created_at'),
         'form': form,
         'team_agents': team_agents,
+        'similar_tickets': similar_tickets,
+        'attachments': ticket.attachments.order_by('uploaded_at'),
     }
     return render(request, 'tickets/detail.html', context)
 
 
+@login_required
+def attachment_download(request, pk, variant=None):
+    """
+    Download an attachment or its thumbnail/preview (permission-checked,
+    transfer via the front proxy if configured)
+    """
+    attachment = get_object_or_404(TicketAttachment.objects.select_related('ticket'), pk=pk)
+
+    if not request.user.can_access_ticket(attachment.ticket):
+        return HttpResponseForbidden('Sie haben keine Berechtigung, diesen Anhang zu sehen.')
+
+    return serve_attachment(request, attachment, variant)
+
+
 @login_required
 def ticket_assign(request, pk):
     """Assign ticket to an agent - for self-assignment and team leads"""
@@ -474,6 +525,7 @@ def ticket_escalate(request, pk):
 
             # Send email notification to escalated agent with urgency
             notify_agent_ticket_escalation(ticket, old_agent, new_agent, reason)
+            teams_notifier.notify('escalation', ticket, detail=f'an {new_agent.full_name}' + (f': {reason}' if reason else ''))
 
             messages.success(request, f'Ticket wurde eskaliert an {new_agent.full_name} und Email wurde versendet')
 
@@ -526,10 +578,10 @@ def ticket_close(request, pk):
             # Send ticket history to customer via email
             try:
                 history_text = ticket.get_history_as_text()
-                send_mail(
+                send_ticket_mail(
+                    ticket,
                     subject=f'Ticket {ticket.ticket_number} wurde geschlossen - Zusammenfassung',
                     message=history_text,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
                     recipient_list=[ticket.created_by.email],
                     fail_silently=False,
                 )
@@ -544,6 +596,7 @@ def ticket_close(request, pk):
 
 
 @login_required
+@read_only_view
 def statistics_dashboard(request):
     """Statistics dashboard for trainers/customers and classroom issues"""
     # Only support agents can view statistics
@@ -756,25 +809,19 @@ def search_customers_api(request):
     """
     API endpoint to search customers by name or email.
     Returns JSON list of matching customers.
+
+    Matching is done by token prefix on the indexed search tokens
+    (see apps.accounts.search), e.g. "max mu" finds "Max Müller".
     """
-    from django.http import JsonResponse
-    from django.db.models import Q
-    
+    from apps.accounts.search import search_customers
+
     query = request.GET.get('q', '').strip()
-    
+
     if len(query) < 2:
-        return JsonResponse({'results': []})
-    
-    # Search by first name, last name, or email
-    customers = User.objects.filter(
-        role='customer',
-        is_active=True
-    ).filter(
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(email__icontains=query)
-    ).values('id', 'first_name', 'last_name', 'email', 'phone')[:10]
-    
+        return FastJsonResponse({'results': []})
+
+    customers = search_customers(query, limit=10)
+
     results = []
     for customer in customers:
         full_name = f"{customer['first_name']} {customer['last_name']}".strip()
@@ -788,4 +835,144 @@ def search_customers_api(request):
             'display': f"{full_name} ({customer['email']})"
         })
 
-    return JsonResponse({'results': results})
+    return FastJsonResponse({'results': results})
+
+
+@login_required
+def similar_tickets_api(request):
+    """
+    API endpoint returning tickets similar to a title/description being entered.
+    Used by the agent ticket form to point out possible duplicates.
+    """
+    from .similarity import similar_ticket_service
+
+    if request.user.role not in ['support_agent', 'admin']:
+        return HttpResponseForbidden('Keine Berechtigung')
+
+    title = request.GET.get('title', '').strip()
+    description = request.GET.get('description', '').strip()
+
+    if len(title) + len(description) < 5:
+        return FastJsonResponse({'results': []})
+
+    tickets = similar_ticket_service.similar_tickets(title, description, limit=5)
+
+    results = [{
+        'id': ticket.id,
+        'ticket_number': ticket.ticket_number,
+        'title': ticket.title,
+        'status': ticket.status,
+        'status_display': ticket.get_status_display(),
+        'customer': ticket.created_by.full_name,
+        'created_at': ticket.created_at,
+        'similarity': ticket.similarity,
+        'url': reverse('tickets:detail', args=[ticket.pk]),
+    } for ticket in tickets]
+
+    return FastJsonResponse({'results': results})
+
+
+@login_required
+def ticket_list_api(request):
+    """
+    API endpoint returning the ticket list of the user as JSON.
+
+    Same tickets as ``ticket_list``, serialized like ``Ticket.to_dict()`` by
+    the batch serializer. Agents see every ticket, so the array is streamed
+    in chunks instead of being built in memory. Customers do not get the
+    agents' contact data.
+    """
+    from .serialization import iter_serialized_tickets
+
+    tickets = iter_serialized_tickets(visible_tickets(request.user),
+                                      public_users=request.user.role == 'customer')
+    return StreamingJsonArrayResponse(tickets, key='tickets')
+
+
+@login_required
+def ai_metrics_api(request):
+    """API endpoint with AI client and response cache metrics (admins only)"""
+    from .ai_cache import cache_stats
+
+    if request.user.role != 'admin':
+        return HttpResponseForbidden('Keine Berechtigung')
+
+    return FastJsonResponse({
+        'available': ai_service.is_available(),
+        'client': ai_service.metrics(),
+        'response_cache': cache_stats(),
+    })
+
+
+@login_required
+def ticket_comments_api(request, pk):
+    """
+    API endpoint returning only the comments newer than a cursor.
+
+    The cursor is the ``created_at``/``id`` pair of the last comment the
+    client already has (``?since=<iso datetime>&after=<id>``). Without a
+    cursor the first page of the thread is returned. The response contains
+    the ``cursor`` to send with the next poll.
+    """
+    from django.db.models import Q
+    from django.utils.dateparse import parse_datetime
+    from .serialization import public_user_dict
+
+    ticket = get_object_or_404(Ticket, pk=pk)
+
+    if not request.user.can_access_ticket(ticket):
+        return HttpResponseForbidden('Sie haben keine Berechtigung, dieses Ticket zu sehen.')
+
+    comments = ticket.comments.select_related('author')
+
+    # Hide internal notes from customers
+    if request.user.role == 'customer':
+        comments = comments.filter(is_internal=False)
+
+    since = request.GET.get('since', '').strip()
+    after = request.GET.get('after', '').strip()
+
+    if since:
+        try:
+            since_dt = parse_datetime(since)
+        except ValueError:  # Well-formed but invalid, e.g. month 13
+            since_dt = None
+        if since_dt is None:
+            return FastJsonResponse({'error': 'Ungültiger Cursor (since).'}, status=400)
+        if timezone.is_naive(since_dt):
+            since_dt = timezone.make_aware(since_dt)
+
+        cursor_filter = Q(created_at__gt=since_dt)
+        if after.isdigit():
+            cursor_filter |= Q(created_at=since_dt, id__gt=int(after))
+        comments = comments.filter(cursor_filter)
+    elif after.isdigit():
+        comments = comments.filter(id__gt=int(after))
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        limit = 50
+
+    # Fetch one extra row to know whether the client has to poll again right away
+    page = list(comments.order_by('created_at', 'id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if page:
+        last = page[-1]
+        cursor = {'since': last.created_at.isoformat(), 'after': last.id}
+    else:
+        cursor = {'since': since or None, 'after': int(after) if after.isdigit() else None}
+
+    comments = [comment.to_dict() for comment in page]
+    if request.user.role == 'customer':
+        # Customers do not get the agents' contact data
+        for comment in comments:
+            comment['author'] = public_user_dict(comment['author'])
+
+    return FastJsonResponse({
+        'comments': comments,
+        'cursor': cursor,
+        'has_more': has_more,
+    })
@@ -0,0 +1,222 @@
+"""
+Read replicas for reporting and list views.
+
+Replicas are configured with ``DATABASE_REPLICA_URLS`` (comma-separated) and
+become the database aliases ``replica1``, ``replica2``, ... Reads only go to
+a replica inside ``read_only_view``/``replica_reads()``; everything else,
+and every write, stays on the primary.
+
+- Read-your-writes: a request that writes sets a cookie that keeps the
+  user's reads on the primary for ``DB_REPLICA_STICKY_SECONDS``, so the
+  statistics or the article list never miss what the user just saved.
+  Reads after a write in the same request use the primary as well.
+- Lag and failures: each process checks a replica at most every
+  ``DB_REPLICA_CHECK_INTERVAL`` seconds (replication lag on MySQL and
+  PostgreSQL, a plain query otherwise). Replicas that lag more than
+  ``DB_REPLICA_MAX_LAG`` seconds or cannot be reached are skipped. A view
+  that fails on a replica is marked down and run again on the primary.
+
+Locally two SQLite files stand in for primary and replica, see
+``manage.py check_db_replicas``.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError, connections
+from django.template.response import SimpleTemplateResponse
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary_until'
+
+_PG_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_state = ContextVar('replica_state', default=None)
+_health = {}  # alias -> (checked at, healthy)
+_health_lock = threading.Lock()
+
+
+class _RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned  # Reads must see the primary (recent write)
+        self.wrote = False
+        self.depth = 0  # Nesting of replica_reads()
+        self.replica = None
+        self.chosen = False
+
+
+def replica_lag(alias):
+    """Replication lag of ``alias`` in seconds; None if replication is stopped"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(_PG_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+        if connection.vendor == 'mysql':
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+            except DatabaseError:
+                cursor.execute('SHOW SLAVE STATUS')  # MySQL < 8.0.22, MariaDB
+            row = cursor.fetchone()
+            if row is None:
+                return 0.0  # Not a replica itself (e.g. a proxy in front of the replicas)
+            status = dict(zip([column[0] for column in cursor.description], row))
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            return None if lag is None else float(lag)
+        # No replication status (SQLite): reachable is good enough
+        cursor.execute('SELECT 1')
+        return 0.0
+
+
+def mark_down(alias, error=None):
+    """Skip ``alias`` until its next health check"""
+    with _health_lock:
+        _health[alias] = (time.monotonic(), False)
+    logger.warning(f"Database replica {alias} skipped: {error}")
+    connections[alias].close()
+
+
+def reset_health_checks():
+    """Forget the health of all replicas (they are checked again on the next read)"""
+    with _health_lock:
+        _health.clear()
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    checked_at, healthy = _health.get(alias, (None, True))
+    if checked_at is not None and now - checked_at < settings.DB_REPLICA_CHECK_INTERVAL:
+        return healthy
+
+    with _health_lock:
+        # Whoever gets here first checks; the others keep using the old result meanwhile
+        _health[alias] = (now, healthy)
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError as e:
+        mark_down(alias, e)
+        return False
+    if lag is None or lag > settings.DB_REPLICA_MAX_LAG:
+        mark_down(alias, 'replication stopped' if lag is None else f'{lag:.1f}s behind')
+        return False
+    if not healthy:
+        logger.info(f"Database replica {alias} is back ({lag:.1f}s behind)")
+    with _health_lock:
+        _health[alias] = (time.monotonic(), True)
+    return True
+
+
+def _choose_replica(state):
+    # One replica per request, so all reads of a page see the same state
+    if not state.chosen:
+        healthy = [alias for alias in settings.DATABASE_REPLICAS if is_healthy(alias)]
+        state.replica = random.choice(healthy) if healthy else None
+        state.chosen = True
+    return state.replica
+
+
+class ReplicaRouter:
+    """Sends reads inside ``replica_reads()`` to a replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.depth == 0 or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return _choose_replica(state) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+@contextmanager
+def replica_reads():
+    """Let the reads in this block use a replica (unless the current user just wrote)"""
+    state = _state.get()
+    token = None
+    if state is None:
+        state = _RequestState()
+        token = _state.set(state)
+    state.depth += 1
+    try:
+        yield state
+    finally:
+        state.depth -= 1
+        if token is not None:
+            _state.reset(token)
+
+
+def _render(view, request, args, kwargs):
+    response = view(request, *args, **kwargs)
+    # A TemplateResponse (class-based views) renders after the view returned,
+    # outside replica_reads() and the fallback: render it here. Template
+    # response middleware then sees a rendered response.
+    if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+        response.render()
+    return response
+
+
+def read_only_view(view):
+    """Run a view that does not write on a replica, falling back to the primary if it fails there"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads() as state:
+            try:
+                return _render(view, request, args, kwargs)
+            except (OperationalError, InterfaceError) as e:
+                if state.replica is None or state.pinned:
+                    raise
+                mark_down(state.replica, e)
+                state.pinned = True
+                return _render(view, request, args, kwargs)
+
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """Keeps the reads of a user on the primary for a while after the user wrote"""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state = _RequestState(pinned=pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote:
+            sticky = settings.DB_REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + sticky)), max_age=sticky, httponly=True,
+                                samesite='Lax', secure=settings.SESSION_COOKIE_SECURE)
+        return response